@@ -0,0 +1,110 @@
+import requests
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Set, Tuple
+import config
+from ticket import format_iso
+
+FetchJanela = Callable[[datetime, datetime], pd.DataFrame]
+
+
+def fetch_com_bisseccao(fetch: FetchJanela,
+                        start: datetime,
+                        end: datetime,
+                        min_delta: timedelta = timedelta(hours=1)) -> pd.DataFrame:
+    """
+    Executa `fetch(start, end)` e, se a API responder 5xx, divide a janela ao
+    meio e tenta cada metade (mesma ideia de `fetch_tickets_with_split`).
+    Janelas menores que `min_delta` que ainda falham são puladas.
+    """
+    try:
+        return fetch(start, end)
+    except requests.exceptions.HTTPError as err:
+        code = err.response.status_code if err.response is not None else None
+        if code and 500 <= code < 600 and (end - start) > min_delta:
+            mid   = start + (end - start) / 2
+            left  = fetch_com_bisseccao(fetch, start, mid, min_delta)
+            right = fetch_com_bisseccao(fetch, mid,   end, min_delta)
+            return pd.concat([left, right], ignore_index=True)
+        print(f"Pulando janela {format_iso(start)}→{format_iso(end)}: {err}")
+        return pd.DataFrame()
+
+
+def juntar_janelas(partes: List[pd.DataFrame], chave: str = "id") -> pd.DataFrame:
+    """
+    Concatena os resultados das janelas removendo os registros repetidos nas
+    bordas (os filtros usam ge/le, então o limite entre janelas aparece duas vezes).
+    """
+    partes = [p for p in partes if not p.empty]
+    if not partes:
+        return pd.DataFrame()
+
+    df = pd.concat(partes, ignore_index=True)
+    if chave in df.columns:
+        df = df.drop_duplicates(subset=chave, keep="first")
+    if "createdAt" in df.columns:
+        df = df.sort_values("createdAt", kind="stable")
+    return df.reset_index(drop=True)
+
+
+def fetch_backfill(windows: List[Tuple[datetime, datetime]],
+                   fetch_tickets: FetchJanela,
+                   fetch_chats: FetchJanela,
+                   workers: Optional[int] = None,
+                   min_delta: timedelta = timedelta(hours=1)) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Busca tickets e chats de cada janela em paralelo e devolve
+    (df_ticket, df_chat) já consolidados e sem duplicidade nas bordas.
+    """
+    workers = max(1, workers or config.OCTA_BACKFILL_WORKERS)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futs_ticket = [pool.submit(fetch_com_bisseccao, fetch_tickets, s, e, min_delta) for s, e in windows]
+        futs_chat   = [pool.submit(fetch_com_bisseccao, fetch_chats,   s, e, min_delta) for s, e in windows]
+
+        partes_ticket = [f.result() for f in futs_ticket]
+        partes_chat   = [f.result() for f in futs_chat]
+
+    print(f"Backfill: {len(windows)} janelas processadas")
+    return juntar_janelas(partes_ticket), juntar_janelas(partes_chat)
+
+
+
+def paginas_em_janelas(iterar: Callable[[datetime, datetime], Iterable[list]],
+                       windows: List[Tuple[datetime, datetime]],
+                       min_delta: timedelta = timedelta(hours=1)) -> Iterator[list]:
+    """
+    Versão página a página do backfill, para o modo streaming: percorre as
+    janelas em sequência entregando as páginas de `iterar(inicio, fim)`.
+    Uma janela que falha com 5xx é dividida ao meio, como em
+    fetch_com_bisseccao. Registros repetidos (na borda entre janelas ou já
+    entregues antes de uma divisão) são descartados pelo id.
+    """
+    vistos: Set[Any] = set()
+    ultima: List[Any] = []
+
+    def paginas(start: datetime, end: datetime) -> Iterator[list]:
+        nonlocal ultima
+        try:
+            for pagina in iterar(start, end):
+                novos = [r for r in pagina if r.get("id") not in vistos]
+                vistos.update(r.get("id") for r in novos)
+                if novos:
+                    ultima = [r.get("id") for r in novos]
+                    yield novos
+        except requests.exceptions.HTTPError as err:
+            code = err.response.status_code if err.response is not None else None
+            if code and 500 <= code < 600 and (end - start) > min_delta:
+                mid = start + (end - start) / 2
+                yield from paginas(start, mid)
+                yield from paginas(mid, end)
+                return
+            print(f"Pulando janela {format_iso(start)}→{format_iso(end)}: {err}")
+
+    for start, end in windows:
+        yield from paginas(start, end)
+        # Só a última página (createdAt asc) pode se repetir na janela seguinte:
+        # os ids guardados ficam limitados a uma janela por vez
+        vistos.clear()
+        vistos.update(ultima)
@@ -0,0 +1,209 @@
+"""
+Benchmark dos fetchers contra a API Octadesk falsa (fake_octadesk.py).
+
+Cada caso roda num processo separado (cache, estado e destino em diretório
+temporário), apontado para o servidor falso pelo OCTA_BASE_URL. Mede tempo
+total, requisições/s, linhas/s e pico de RSS, e grava o resultado em
+.bench/resultados.jsonl junto com o commit atual, para comparar versões.
+
+    python benchmark.py --tickets 5000 --chats 5000
+    python benchmark.py --casos tickets status --taxa-500 0.02 --atraso-pagina 0.05
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from fake_octadesk import gerar_dados, servidor_fake
+
+CASOS = ["tickets", "conversas", "coleta_chat", "status"]
+RESULTADOS_PATH = Path(__file__).parent / ".bench" / "resultados.jsonl"
+
+
+def _commit_atual() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=Path(__file__).parent,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _executar_caso(caso: str) -> Dict[str, Any]:
+    """Roda `caso` neste processo (já configurado pelo ambiente) e devolve as métricas."""
+    import resource
+    import pandas as pd
+
+    inicio = datetime.fromisoformat(os.environ["BENCH_INICIO"])
+    fim = datetime.fromisoformat(os.environ["BENCH_FIM"])
+    with open(os.environ["BENCH_DADOS"], encoding="utf-8") as f:
+        dados = json.load(f)
+
+    t0 = time.perf_counter()
+    if caso == "tickets":
+        from ticket import fetch_all_tickets
+        linhas = len(fetch_all_tickets(inicio, fim, raise_on_error=True))
+    elif caso == "conversas":
+        from chat import fetch_all_conversations
+        linhas = len(fetch_all_conversations(inicio, fim))
+    elif caso == "coleta_chat":
+        from chat import coleta_chat
+        linhas = len(coleta_chat(pd.DataFrame(dados["chats"])))
+    elif caso == "status":
+        from ticket import atualizar_status_em_lote
+        from sink import LocalSink
+        mensagens = atualizar_status_em_lote(dados["tickets_abertos"], sink=LocalSink())
+        linhas = sum(1 for m in mensagens if not m.startswith("Erro"))
+    else:
+        raise RuntimeError(f"Caso de benchmark desconhecido: {caso}")
+    segundos = time.perf_counter() - t0
+
+    from octadesk import obter_cliente
+    limitador = obter_cliente().limitador
+    return {
+        "linhas": linhas,
+        "segundos": segundos,
+        # ru_maxrss vem em KB no Linux
+        "pico_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "tempo_throttled": limitador.tempo_throttled,
+        "reducoes_taxa": limitador.reducoes,
+    }
+
+
+def _ultimo_resultado(caso: str, parametros: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    if not RESULTADOS_PATH.exists():
+        return None
+    ultimo = None
+    with open(RESULTADOS_PATH, encoding="utf-8") as f:
+        for linha in f:
+            registro = json.loads(linha)
+            if registro["caso"] == caso and registro["parametros"] == parametros:
+                ultimo = registro
+    return ultimo
+
+
+def rodar(casos: List[str], parametros: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Sobe o servidor falso e roda cada caso num subprocesso, gravando os resultados."""
+    fim = datetime(2025, 1, 31, tzinfo=timezone.utc)
+    inicio = fim - timedelta(days=30)
+    dados = gerar_dados(parametros["tickets"], parametros["chats"], inicio, fim)
+
+    opcoes_servidor = {
+        "taxa_500": parametros["taxa_500"],
+        "taxa_409": parametros["taxa_409"],
+        "taxa_429": parametros["taxa_429"],
+        "atraso_pagina": parametros["atraso_pagina"],
+        "atraso_detalhe": parametros["atraso_detalhe"],
+    }
+    commit = _commit_atual()
+    registros = []
+
+    with tempfile.TemporaryDirectory(prefix="octa-bench-") as tmp, \
+            servidor_fake(dados, **opcoes_servidor) as servidor:
+        tmp = Path(tmp)
+        with open(tmp / "dados.json", "w", encoding="utf-8") as f:
+            json.dump({
+                "chats": [{"number": c["number"], "id": c["id"]} for c in dados["chats"]],
+                "tickets_abertos": [str(t["number"]) for t in dados["tickets"]
+                                    if t["status"]["name"] != "Resolvido"],
+            }, f)
+
+        for caso in casos:
+            dir_caso = tmp / caso
+            env = {
+                **os.environ,
+                "OCTA_BASE_URL": servidor.base_url,
+                "OCTA_API_KEY": "benchmark",
+                "OCTA_AGENT_EMAIL": "benchmark@localhost",
+                "OCTA_RPS": str(parametros["rps"]),
+                "OCTA_RPS_MAX": str(parametros["rps"]),
+                "OCTA_CACHE_PATH": str(dir_caso / "cache.sqlite"),
+                "PIPELINE_ESTADO_PATH": str(dir_caso / "estado.json"),
+                "PIPELINE_INDICE_PATH": str(dir_caso / "indice_ids.npz"),
+                "PIPELINE_ABERTOS_PATH": str(dir_caso / "tickets_abertos.json"),
+                "PIPELINE_STAGING_DIR": str(dir_caso / "staging"),
+                "PIPELINE_CHECKPOINT_DIR": str(dir_caso / "checkpoints"),
+                "PIPELINE_SINK": "local",
+                "PIPELINE_LOCAL_DB": str(dir_caso / "destino.sqlite"),
+                "BENCH_INICIO": inicio.isoformat(),
+                "BENCH_FIM": fim.isoformat(),
+                "BENCH_DADOS": str(tmp / "dados.json"),
+            }
+            antes = servidor.requisicoes
+            t0 = time.perf_counter()
+            proc = subprocess.run([sys.executable, __file__, "--interno", caso],
+                                  env=env, capture_output=True, text=True)
+            parede = time.perf_counter() - t0
+            if proc.returncode != 0:
+                print(f"❌ {caso} falhou:\n{proc.stderr}")
+                continue
+
+            metricas = json.loads(proc.stdout.strip().splitlines()[-1])
+            requisicoes = servidor.requisicoes - antes
+            segundos = metricas["segundos"]
+            registro = {
+                "data": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "commit": commit,
+                "caso": caso,
+                "parametros": parametros,
+                **metricas,
+                "parede_s": parede,
+                "requisicoes": requisicoes,
+                "req_por_s": requisicoes / segundos if segundos else None,
+                "linhas_por_s": metricas["linhas"] / segundos if segundos else None,
+            }
+            anterior = _ultimo_resultado(caso, parametros)
+            registros.append(registro)
+            _imprimir(registro, anterior)
+
+            RESULTADOS_PATH.parent.mkdir(parents=True, exist_ok=True)
+            with open(RESULTADOS_PATH, "a", encoding="utf-8") as f:
+                f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+
+    return registros
+
+
+def _imprimir(registro: Dict[str, Any], anterior: Optional[Dict[str, Any]]) -> None:
+    linha = (f"{registro['caso']:<12} {registro['linhas']:>7} linhas  {registro['segundos']:7.2f}s  "
+             f"{registro['req_por_s']:8.1f} req/s  {registro['linhas_por_s']:9.1f} linhas/s  "
+             f"pico RSS {registro['pico_rss_mb']:6.1f} MB")
+    if anterior and anterior.get("linhas_por_s"):
+        variacao = (registro["linhas_por_s"] / anterior["linhas_por_s"] - 1) * 100
+        linha += f"  ({variacao:+.1f}% vs {anterior.get('commit') or anterior['data']})"
+    print(linha)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark dos fetchers contra a API Octadesk falsa")
+    parser.add_argument("--interno", help=argparse.SUPPRESS)
+    parser.add_argument("--casos", nargs="+", choices=CASOS, default=CASOS)
+    parser.add_argument("--tickets", type=int, default=2000, help="Tickets sintéticos")
+    parser.add_argument("--chats", type=int, default=2000, help="Chats sintéticos")
+    parser.add_argument("--rps", type=float, default=1000, help="Orçamento de req/s do cliente")
+    parser.add_argument("--taxa-500", type=float, default=0.0)
+    parser.add_argument("--taxa-409", type=float, default=0.0)
+    parser.add_argument("--taxa-429", type=float, default=0.0)
+    parser.add_argument("--atraso-pagina", type=float, default=0.0, help="Atraso (s) por página de listagem")
+    parser.add_argument("--atraso-detalhe", type=float, default=0.0, help="Atraso (s) por GET de detalhe")
+    args = parser.parse_args()
+
+    if args.interno:
+        print(json.dumps(_executar_caso(args.interno)))
+        sys.exit(0)
+
+    rodar(args.casos, {
+        "tickets": args.tickets,
+        "chats": args.chats,
+        "rps": args.rps,
+        "taxa_500": args.taxa_500,
+        "taxa_409": args.taxa_409,
+        "taxa_429": args.taxa_429,
+        "atraso_pagina": args.atraso_pagina,
+        "atraso_detalhe": args.atraso_detalhe,
+    })
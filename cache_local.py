@@ -0,0 +1,144 @@
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+import config
+
+# Validade (segundos) de cada tipo de recurso; None = nunca expira
+TTL_RECURSO: Dict[str, Optional[int]] = {
+    "chat_id": None,          # number → id de um chat não muda
+    "chat":    6 * 3600,      # chats em aberto; encerrados são gravados sem expiração
+    "eventos": 6 * 3600,      # idem, eventos de chats encerrados não mudam
+    "ticket":  1 * 3600,      # detalhe de ticket usado na atualização de status
+}
+
+# A soma dos tamanhos é recalculada a cada N gravações
+_VERIFICAR_TAMANHO_A_CADA = 200
+
+
+class CacheRespostas:
+    """
+    Cache persistente de respostas da API Octadesk em SQLite.
+
+    Cada entrada é indexada por (recurso, chave), guarda o JSON comprimido com
+    zlib e tem validade definida por TTL_RECURSO. Quando o arquivo passa de
+    `max_bytes`, as entradas acessadas há mais tempo são removidas (LRU).
+    """
+
+    def __init__(self, caminho: Path, max_bytes: int):
+        caminho.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._gravacoes = 0
+        self._conn = sqlite3.connect(str(caminho), check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS respostas (
+                recurso    TEXT NOT NULL,
+                chave      TEXT NOT NULL,
+                valor      BLOB NOT NULL,
+                tamanho    INTEGER NOT NULL,
+                expira_em  REAL,
+                acessado_em REAL NOT NULL,
+                PRIMARY KEY (recurso, chave)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_acesso ON respostas (acessado_em)")
+        self._conn.commit()
+
+    def obter(self, recurso: str, chave: str) -> Tuple[bool, Any]:
+        agora = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT valor, expira_em FROM respostas WHERE recurso = ? AND chave = ?",
+                (recurso, str(chave))
+            ).fetchone()
+            if row is None or (row[1] is not None and row[1] < agora):
+                self.misses += 1
+                return False, None
+            self._conn.execute(
+                "UPDATE respostas SET acessado_em = ? WHERE recurso = ? AND chave = ?",
+                (agora, recurso, str(chave))
+            )
+            self.hits += 1
+        return True, json.loads(zlib.decompress(row[0]))
+
+    def gravar(self, recurso: str, chave: str, valor: Any, permanente: bool = False) -> None:
+        agora = time.time()
+        ttl = None if permanente else TTL_RECURSO.get(recurso)
+        blob = zlib.compress(json.dumps(valor).encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO respostas VALUES (?, ?, ?, ?, ?, ?)",
+                (recurso, str(chave), blob, len(blob),
+                 agora + ttl if ttl is not None else None, agora)
+            )
+            self._conn.commit()
+            self._gravacoes += 1
+            if self._gravacoes % _VERIFICAR_TAMANHO_A_CADA == 0:
+                self._despejar()
+
+    def invalidar(self, recurso: str, chave: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM respostas WHERE recurso = ? AND chave = ?", (recurso, str(chave))
+            )
+            self._conn.commit()
+
+    def buscar(self, recurso: str, chave: str,
+               carregar: Callable[[], Any],
+               permanente: Optional[Callable[[Any], bool]] = None) -> Any:
+        """
+        Retorna o valor em cache ou chama `carregar()` e grava o resultado.
+        `permanente(valor)` indica se a entrada deve ficar sem expiração.
+        Resultados None (ex.: chat não encontrado) não são gravados.
+        """
+        achou, valor = self.obter(recurso, chave)
+        if achou:
+            return valor
+        valor = carregar()
+        if valor is None:
+            return valor
+        self.gravar(recurso, chave, valor, permanente=bool(permanente and permanente(valor)))
+        return valor
+
+    def _despejar(self) -> None:
+        # Chamado com o lock já adquirido
+        agora = time.time()
+        self._conn.execute("DELETE FROM respostas WHERE expira_em IS NOT NULL AND expira_em < ?", (agora,))
+        total = self._conn.execute("SELECT COALESCE(SUM(tamanho), 0) FROM respostas").fetchone()[0]
+        if total > self.max_bytes:
+            excesso = total - int(self.max_bytes * 0.9)
+            removidos = 0
+            for recurso, chave, tamanho in self._conn.execute(
+                "SELECT recurso, chave, tamanho FROM respostas ORDER BY acessado_em"
+            ).fetchall():
+                if removidos >= excesso:
+                    break
+                self._conn.execute(
+                    "DELETE FROM respostas WHERE recurso = ? AND chave = ?", (recurso, chave)
+                )
+                removidos += tamanho
+        self._conn.commit()
+
+    def resumo(self) -> str:
+        total = self.hits + self.misses
+        taxa = (self.hits / total * 100) if total else 0.0
+        return f"Cache Octadesk: {self.hits} hits, {self.misses} misses ({taxa:.1f}% de acerto)"
+
+
+_cache: Optional[CacheRespostas] = None
+_cache_lock = threading.Lock()
+
+
+def obter_cache() -> CacheRespostas:
+    """Instância única do cache, criada no primeiro uso."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = CacheRespostas(config.OCTA_CACHE_PATH, config.OCTA_CACHE_MAX_MB * 1024 * 1024)
+        return _cache
@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, Optional, Sequence
+from importacao import sob_demanda
+
+pd = sob_demanda("pandas")
+
+
+def expandir_campos_custom(serie: pd.Series,
+                           prefixo: str = "",
+                           chaves: Optional[Iterable[str]] = None,
+                           campos_nome: Sequence[str] = ("key",)) -> pd.DataFrame:
+    """
+    Transforma uma coluna de listas [{key, value}, ...] (customField da
+    Octadesk) em uma coluna por chave, numa passada só pela coluna e com um
+    único DataFrame no final.
+
+    - Linhas com NaN/None ou qualquer valor que não seja lista ficam vazias.
+    - `chaves` restringe as chaves aproveitadas (consulta em set);
+      `campos_nome` define de onde vem o nome do campo, na ordem de
+      preferência (ex.: ("name", "key") para os customFields do chat).
+    - Chave repetida na mesma linha fica com o último valor.
+
+    O resultado tem o mesmo índice de `serie` e colunas `prefixo + chave`,
+    na ordem em que as chaves aparecem.
+    """
+    filtro = set(chaves) if chaves is not None else None
+    primeiro, resto = campos_nome[0], campos_nome[1:]
+
+    def registro(lista: Any) -> Dict[str, Any]:
+        if not isinstance(lista, list):
+            return {}
+        saida = {}
+        for item in lista:
+            if not isinstance(item, dict):
+                continue
+            nome = item.get(primeiro)
+            for campo in resto:
+                if nome:
+                    break
+                nome = item.get(campo)
+            if nome and (filtro is None or nome in filtro):
+                saida[nome] = item.get("value")
+        return saida
+
+    df = pd.DataFrame([registro(v) for v in serie.tolist()], index=serie.index)
+    df.columns = [f"{prefixo}{c}" for c in df.columns]
+    return df
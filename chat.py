@@ -1,27 +1,34 @@
+from __future__ import annotations
+
 import requests
-import pandas as pd
 import logging
 import re
-from typing import Optional, Dict, Any, List
+from functools import lru_cache
+from typing import Optional, Dict, Any, Iterator, List
 from datetime import datetime
-from requests.exceptions import HTTPError
-from time import sleep
-from config import OCTA_BASE_URL, OCTA_API_KEY, OCTA_AGENT_EMAIL
+from concurrent.futures import ThreadPoolExecutor
+import config
+from octadesk import OctadeskClient, obter_cliente, resultados
+from paginacao import iterar_paginas
+from checkpoint import obter_checkpoint
+from campos_custom import expandir_campos_custom
+from cache_local import obter_cache
+from metricas import medido
+from importacao import sob_demanda
 
+pd = sob_demanda("pandas")
 
-octa_base_url = OCTA_BASE_URL
-octa_headers = {
-    "Content-Type":      "application/json",
-    "Accept":            "application/json",
-    "x-api-key":         OCTA_API_KEY,
-    "octa-agent-email":  OCTA_AGENT_EMAIL,
-}
 
 #Padronizar colunas _________________________________________
+_CARACTERES_INVALIDOS = re.compile(r'[^0-9A-Za-z_]')
+
+
+# Os mesmos nomes se repetem a cada página/bucket: o resultado fica guardado
+@lru_cache(maxsize=None)
 def formatar_coluna2(name: str) -> str:
-   
-    clean = re.sub(r'[^0-9A-Za-z_]', '_', name)
-    if re.match(r'^[0-9]', clean):
+
+    clean = _CARACTERES_INVALIDOS.sub('_', name)
+    if clean[:1].isdigit():
         clean = '_' + clean
     return clean[:300]
 
@@ -30,39 +37,33 @@ def formatar_coluna1(df: pd.DataFrame) -> pd.DataFrame:
     new_cols = {col: formatar_coluna2(col) for col in df.columns}
     return df.rename(columns=new_cols)
 
+# Nome usado pelo main.py
+padronizar_col = formatar_coluna1
+
 #_________________________________________________________________
-def fetch_all_conversations(
+def iterar_conversas(
     start_dt: datetime,
     end_dt: datetime,
-    base_url: str,
-    headers: dict,
+    base_url: Optional[str] = None,
+    headers: Optional[dict] = None,
     limit: int = 100,
-    max_retries: int = 3
-) -> pd.DataFrame:
+    max_retries: int = 3,
+    concorrencia: Optional[int] = None
+) -> Iterator[List[Dict[str, Any]]]:
     """
-    Busca todas as conversas no intervalo [start_dt, end_dt] paginando resultados.
-
-    Parâmetros:
-    - start_dt: datetime de início.
-    - end_dt: datetime de término.
-    - base_url: URL base da API OctaDesk.
-    - headers: headers HTTP para autenticação.
-    - limit: número máximo de registros por página (até 100).
-    - max_retries: número de tentativas em erros 409/500.
-
-    Retorna:
-    - DataFrame pandas com todas as conversas normalizadas.
+    Pagina /chat no intervalo [start_dt, end_dt] (createdAt asc), entregando
+    uma página de conversas por vez. Parâmetros como em fetch_all_conversations.
+    As páginas ficam num checkpoint em disco, de modo que rodar de novo o
+    mesmo intervalo depois de uma falha continua da página seguinte.
     """
     start_iso = start_dt.replace(microsecond=0).isoformat(timespec='seconds')
     end_iso = end_dt.replace(microsecond=0).isoformat(timespec='seconds')
 
     # garante que não passe de 100
     limit = min(limit, 100)
+    cliente = obter_cliente(base_url, headers)
 
-    all_chats = []
-    page = 1
-
-    while True:
+    def buscar_pagina(page: int) -> list:
         params = {
             "filters[0][property]":  "createdAt",
             "filters[0][operator]":  "ge",
@@ -76,44 +77,59 @@ def fetch_all_conversations(
             "sort[direction]":       "asc"
         }
 
-        # tenta até max_retries
-        for attempt in range(1, max_retries + 1):
-            resp = requests.get(f"{base_url}/chat", headers=headers, params=params)
-            if resp.status_code in (409, 500):
-                backoff = 2 ** (attempt - 1)
-                print(f"⚠️ {resp.status_code} na página {page}, retry em {backoff}s (tentativa {attempt})")
-                sleep(backoff)
-                continue
-            resp.raise_for_status()
-            break
-
-        data = resp.json()
-        if isinstance(data, dict):
-            chats = data.get("results", [])
-        elif isinstance(data, list):
-            chats = data
-        else:
-            chats = []
-
-        if not chats:
-            break
-
-        all_chats.extend(chats)
-        page += 1
-
-    # enriquece com campos customizados
-    enriched = []
-    for chat in all_chats:
-        rec = chat.copy()
-        for fld in rec.get("customFields", []):
-            name = fld.get("name") or fld.get("key")
-            value = fld.get("value")
-            if name:
-                rec[f"cf_chat_{name}"] = value
-        enriched.append(rec)
-
-    # normaliza em DataFrame
-    return pd.json_normalize(enriched)
+        # retry/backoff em 409/500 fica a cargo do cliente
+        return resultados(cliente.get_json("/chat", params=params, max_retries=max_retries))
+
+    checkpoint = obter_checkpoint("chats", {"base_url": cliente.base_url, "limit": limit,
+                                            "inicio": start_iso, "fim": end_iso})
+    return iterar_paginas(buscar_pagina, limit, concorrencia, checkpoint=checkpoint)
+
+
+@medido("normalizar_conversas")
+def normalizar_conversas(chats: List[Dict[str, Any]]) -> pd.DataFrame:
+    """Normaliza as conversas em DataFrame e achata os customFields em colunas cf_chat_*."""
+    df = pd.json_normalize(chats)
+    if "customFields" not in df.columns:
+        return df
+
+    campos = expandir_campos_custom(df["customFields"], prefixo="cf_chat_", campos_nome=("name", "key"))
+    return pd.concat([df, campos[[c for c in campos.columns if c not in df.columns]]], axis=1)
+
+
+@medido("fetch_all_conversations")
+def fetch_all_conversations(
+    start_dt: datetime,
+    end_dt: datetime,
+    base_url: Optional[str] = None,
+    headers: Optional[dict] = None,
+    limit: int = 100,
+    max_retries: int = 3,
+    concorrencia: Optional[int] = None
+) -> pd.DataFrame:
+    """
+    Busca todas as conversas no intervalo [start_dt, end_dt] paginando resultados.
+
+    Parâmetros:
+    - start_dt: datetime de início.
+    - end_dt: datetime de término.
+    - base_url: URL base da API OctaDesk (padrão: a do .env).
+    - headers: headers HTTP para autenticação (padrão: config.OCTA_HEADERS).
+    - limit: número máximo de registros por página (até 100).
+    - max_retries: número de tentativas em erros 409/500.
+    - concorrencia: páginas buscadas em paralelo (padrão OCTA_CONCORRENCIA).
+
+    Retorna:
+    - DataFrame pandas com todas as conversas normalizadas.
+    """
+    all_chats = [
+        chat
+        for pagina in iterar_conversas(start_dt, end_dt, base_url, headers,
+                                       limit, max_retries, concorrencia)
+        for chat in pagina
+    ]
+
+    # enriquece com campos customizados e normaliza em DataFrame
+    return normalizar_conversas(all_chats)
 
 # merge basico ticket e chat
 def merge_ou_concat_campo_ticket(
@@ -134,33 +150,24 @@ def merge_ou_concat_campo_ticket(
     #Abaixo logica para captura de ticket number baseado em chat_id
 
 def get_chat_id_from_number(chat_number: str) -> Optional[str]:
-    
-    params = {
-        "filters[0][property]": "number",
-        "filters[0][operator]": "eq",
-        "filters[0][value]":    chat_number,
-        "limit": 1
-    }
     try:
-        resp = requests.get(f"{octa_base_url}/chat",
-                            headers=octa_headers,
-                            params=params)
-        resp.raise_for_status()
-        data = resp.json()
-        chats = data.get("results", data) if isinstance(data, dict) else data
-        if chats:
-            return chats[0].get("id")
+        return obter_cache().buscar(
+            "chat_id", chat_number,
+            lambda: _buscar_id_chat(chat_number, obter_cliente())
+        )
     except requests.RequestException as e:
         print()
     return None
 
+def _buscar_eventos(chat_id: str, cliente: OctadeskClient) -> List[Dict[str, Any]]:
+    return resultados(cliente.get_json(f"/chat/{chat_id}/events"))
+
 def get_ticket_number_from_chat_id(chat_id: str) -> Optional[int]:
     try:
-        resp = requests.get(f"{octa_base_url}/chat/{chat_id}/events",
-                            headers=octa_headers)
-        resp.raise_for_status()
-        data = resp.json()
-        events = data.get("results", data) if isinstance(data, dict) else data
+        events = obter_cache().buscar(
+            "eventos", chat_id,
+            lambda: _buscar_eventos(chat_id, obter_cliente())
+        )
 
         for ev in events:
             if ev.get("type") == "ticket":
@@ -192,104 +199,190 @@ def find_ticket(df_conversas: pd.DataFrame) -> pd.DataFrame:
     })
 # Busca completa do chat abaixo ( Utiliza dados de dataframes anteriores para conferencia e agrupamento)
 
+def _buscar_id_chat(num: Any, cliente: OctadeskClient) -> Optional[str]:
+    data = cliente.get_json(
+        "/chat",
+        params={
+            "filters[0][property]": "number",
+            "filters[0][operator]": "eq",
+            "filters[0][value]": str(num),
+            "limit": 1
+        }
+    )
+    results = resultados(data)
+    return results[0].get("id") if results else None
+
+
+def _buscar_detalhe_chat(chat_id: str, cliente: OctadeskClient) -> Dict[str, Any]:
+    return cliente.get_json(f"/chat/{chat_id}")
+
+
+def _chat_encerrado(chat_data: Dict[str, Any]) -> bool:
+    status = str(chat_data.get("status") or "").lower()
+    return bool(chat_data.get("closedAt") or chat_data.get("ClosedAt")) or status == "closed"
+
+
+def _coleta_um_chat(
+    num: Any,
+    chat_id: Optional[str],
+    cliente: OctadeskClient
+) -> Dict[str, Any]:
+    rec: Dict[str, Any] = {'number': num}
+    cache = obter_cache()
+
+    try:
+        # 1) Buscar ID interno do chat (só quando a listagem não trouxe)
+        if not chat_id:
+            chat_id = cache.buscar("chat_id", num, lambda: _buscar_id_chat(num, cliente))
+            if not chat_id:
+                rec['error'] = 'chat not found'
+                return rec
+        rec['chat_id'] = chat_id
+
+        # 2) Detalhes do chat e dados de contato
+        # Chats encerrados ficam no cache sem expiração
+        chat_data = cache.buscar(
+            "chat", chat_id,
+            lambda: _buscar_detalhe_chat(chat_id, cliente),
+            permanente=_chat_encerrado
+        )
+        encerrado = _chat_encerrado(chat_data)
+
+        rec.update({
+            "status": chat_data.get("status"),
+            "created_at": chat_data.get("createdAt"),
+            "closed_at": chat_data.get("ClosedAt"),
+            "channel": chat_data.get("channel"),
+            "department": chat_data.get("department"),
+            "agent_name": chat_data.get("agent", {}).get("name"),
+            "origin": chat_data.get("origin"),
+            "Regiao": chat_data.get("Regiao"),
+            "bairro": chat_data.get("bairro"),
+            "satisfacao": chat_data.get("satisfacao")
+        })
+
+        for fld in chat_data.get("customFields", []):
+            key = fld.get("key") or fld.get("name")
+            rec[f"chat_cf_{key}"] = fld.get("value")
+
+        contact = chat_data.get("contact", {})
+        rec.update({
+            "contact_id": contact.get("id"),
+            "contact_name": contact.get("name"),
+            "contact_email": contact.get("email"),
+            "contact_phone": contact.get("phone")
+        })
+        for fld in contact.get("customFields", []):
+            key = fld.get("key") or fld.get("name")
+            rec[f"contact_cf_{key}"] = fld.get("value")
+
+        # 3) Eventos do chat (ticket, satisfaction etc.)
+        evlist = cache.buscar(
+            "eventos", chat_id,
+            lambda: _buscar_eventos(chat_id, cliente),
+            permanente=lambda _: encerrado
+        )
+
+        for ev in evlist:
+            t = ev.get("type")
+            data_ev = ev.get("data") or {}
+            rec[f"evt_{t}"] = True
+            if isinstance(data_ev, dict):
+                for k, v in data_ev.items():
+                    rec[f"evt_{t}_{k}"] = v
+            else:
+                rec[f"evt_{t}_raw"] = data_ev
+
+    except requests.RequestException as e:
+        rec['error'] = True
+        rec['error_detail'] = str(e)
+
+    return rec
+
+
+@medido("coleta_chat")
 def coleta_chat(
     df_numbers: pd.DataFrame,
-    base_url: str,
-    headers: Dict[str, str]
+    base_url: Optional[str] = None,
+    headers: Optional[Dict[str, str]] = None,
+    max_workers: Optional[int] = None
 ) -> pd.DataFrame:
     """
     Para cada número em df_numbers['number']:
       1) Obtém o ID interno do chat via GET /chat?filters[number]=eq
+         (pulado quando df_numbers já traz a coluna 'id' da listagem)
       2) Chama GET /chat/{chat_id} para detalhes do chat e dados de contato
       3) Chama GET /chat/{chat_id}/events para todos os eventos (ticket, satisfaction etc.)
       4) Normaliza e retorna um DataFrame com todas as colunas, inclusive todos os customFields de chat e de contato de forma dinâmica.
-    """
-    records: List[Dict[str, Any]] = []
-
-    for num in df_numbers['number']:
-        rec: Dict[str, Any] = {'number': num}
-
-        try:
-            # 1) Buscar ID interno do chat
-            resp = requests.get(
-                f"{base_url}/chat",
-                headers=headers,
-                params={
-                    "filters[0][property]": "number",
-                    "filters[0][operator]": "eq",
-                    "filters[0][value]": str(num),
-                    "limit": 1
-                }
-            )
-            resp.raise_for_status()
-            data = resp.json()
-
-            # Extrair lista de resultados, tratando dict ou list
-            if isinstance(data, dict):
-                results = data.get("results", [])
-            else:
-                results = data if isinstance(data, list) else []
 
-            if not results:
-                rec['error'] = 'chat not found'
-                records.append(rec)
-                continue
-
-            chat_id = results[0].get("id")
-            rec['chat_id'] = chat_id
-
-            # 2) Detalhes do chat e dados de contato
-            resp_chat = requests.get(f"{base_url}/chat/{chat_id}", headers=headers)
-            resp_chat.raise_for_status()
-            chat_data = resp_chat.json()
-
-            rec.update({
-                "status": chat_data.get("status"),
-                "created_at": chat_data.get("createdAt"),
-                "closed_at": chat_data.get("ClosedAt"),
-                "channel": chat_data.get("channel"),
-                "department": chat_data.get("department"),
-                "agent_name": chat_data.get("agent", {}).get("name"),
-                "origin": chat_data.get("origin"),
-                "Regiao": chat_data.get("Regiao"),
-                "bairro": chat_data.get("bairro"),
-                "satisfacao": chat_data.get("satisfacao")
-            })
-
-            for fld in chat_data.get("customFields", []):
-                key = fld.get("key") or fld.get("name")
-                rec[f"chat_cf_{key}"] = fld.get("value")
-
-            contact = chat_data.get("contact", {})
-            rec.update({
-                "contact_id": contact.get("id"),
-                "contact_name": contact.get("name"),
-                "contact_email": contact.get("email"),
-                "contact_phone": contact.get("phone")
-            })
-            for fld in contact.get("customFields", []):
-                key = fld.get("key") or fld.get("name")
-                rec[f"contact_cf_{key}"] = fld.get("value")
-
-            resp_evt = requests.get(f"{base_url}/chat/{chat_id}/events", headers=headers)
-            resp_evt.raise_for_status()
-            evdata = resp_evt.json()
-            evlist = evdata.get("results", []) if isinstance(evdata, dict) else (evdata if isinstance(evdata, list) else [])
-
-            for ev in evlist:
-                t = ev.get("type")
-                data_ev = ev.get("data") or {}
-                rec[f"evt_{t}"] = True
-                if isinstance(data_ev, dict):
-                    for k, v in data_ev.items():
-                        rec[f"evt_{t}_{k}"] = v
-                else:
-                    rec[f"evt_{t}_raw"] = data_ev
-
-        except requests.RequestException as e:
-            rec['error'] = True
-            rec['error_detail'] = str(e)
-
-        records.append(rec)
+    Os chats são processados em paralelo por até `max_workers` threads
+    (padrão OCTA_ENRIQUECIMENTO_WORKERS); a ordem das linhas segue df_numbers.
+    """
+    numeros = df_numbers['number'].tolist()
+    if 'id' in df_numbers.columns:
+        ids = [i if isinstance(i, str) and i else None for i in df_numbers['id']]
+    else:
+        ids = [None] * len(numeros)
+
+    if not numeros:
+        return pd.DataFrame()
+
+    cliente = obter_cliente(base_url, headers)
+    workers = max(1, max_workers or config.OCTA_ENRIQUECIMENTO_WORKERS)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        records: List[Dict[str, Any]] = list(pool.map(
+            lambda par: _coleta_um_chat(par[0], par[1], cliente),
+            zip(numeros, ids)
+        ))
 
     return pd.json_normalize(records)
+
+
+def fetch_all_chats(
+    start_dt: datetime,
+    end_dt: datetime,
+    base_url: Optional[str] = None,
+    headers: Optional[dict] = None,
+    limit: int = 100,
+    max_retries: int = 3,
+    max_workers: Optional[int] = None
+) -> pd.DataFrame:
+    """
+    Lista as conversas do período (fetch_all_conversations) e as enriquece com
+    detalhes, contato e eventos (coleta_chat), reaproveitando o id da listagem.
+    Colunas presentes nas duas etapas mantêm o valor da listagem.
+    """
+    df_conversas = fetch_all_conversations(
+        start_dt, end_dt, base_url, headers, limit=limit, max_retries=max_retries
+    )
+    if df_conversas.empty:
+        return df_conversas
+
+    return enriquecer_conversas(df_conversas, base_url, headers, max_workers)
+
+
+def enriquecer_conversas(
+    df_conversas: pd.DataFrame,
+    base_url: Optional[str] = None,
+    headers: Optional[dict] = None,
+    max_workers: Optional[int] = None
+) -> pd.DataFrame:
+    """Acrescenta às conversas da listagem as colunas novas vindas de coleta_chat."""
+    df_conversas = df_conversas.reset_index(drop=True)
+    df_detalhes = coleta_chat(df_conversas, base_url, headers, max_workers=max_workers)
+    novas = [c for c in df_detalhes.columns if c not in df_conversas.columns]
+    return pd.concat([df_conversas, df_detalhes[novas]], axis=1)
+
+
+def iterar_chats(
+    start_dt: datetime,
+    end_dt: datetime,
+    base_url: Optional[str] = None,
+    headers: Optional[dict] = None,
+    limit: int = 100,
+    max_retries: int = 3,
+    max_workers: Optional[int] = None
+) -> Iterator[pd.DataFrame]:
+    """Versão página a página de fetch_all_chats: cada item já vem normalizado e enriquecido."""
+    for pagina in iterar_conversas(start_dt, end_dt, base_url, headers, limit, max_retries):
+        yield enriquecer_conversas(normalizar_conversas(pagina), base_url, headers, max_workers)
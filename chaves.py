@@ -0,0 +1,64 @@
+"""
+Chaves determinísticas de linha e de lote.
+
+A chave da linha é um hash de 128 bits das colunas que a identificam (na
+tabela final, number do chat + n_ticket), calculado de uma vez para a
+coluna inteira com pd.util.hash_pandas_object. Os hash_key são fixos: a
+mesma linha tem a mesma chave em qualquer execução, o que permite o upsert
+(Sink.upsert) no lugar do append + verificação de duplicidade.
+"""
+
+import hashlib
+from typing import Any, Sequence
+import numpy as np
+import pandas as pd
+from esquema import converter
+
+# Colunas que identificam uma linha da tabela final (chat × ticket)
+COLUNAS_LINHA = ("number", "n_ticket")
+
+# Duas chaves de 16 bytes do SipHash → 128 bits por linha
+_HASH_KEYS = ("octadesk-linha-1", "octadesk-linha-2")
+_HEX = np.frombuffer(b"0123456789abcdef", dtype="S1")
+
+
+def _hex(valores: np.ndarray) -> np.ndarray:
+    """uint64 → texto hexadecimal de 16 dígitos, sem laço em Python."""
+    octetos = valores.astype(">u8").view(np.uint8).reshape(-1, 8)
+    digitos = np.stack([_HEX[octetos >> 4], _HEX[octetos & 15]], axis=2).reshape(-1, 16)
+    return digitos.view("S16").ravel().astype(str)
+
+
+def _texto_chave(df: pd.DataFrame, coluna: str) -> Any:
+    if coluna not in df.columns:
+        return ""
+    serie = df[coluna]
+    # Colunas "chave" que já passaram pelo esquema (dtype string) não são convertidas de novo
+    if not isinstance(serie.dtype, pd.StringDtype):
+        serie = converter(serie, "chave")
+    return serie.fillna("")
+
+
+def chave_linha(df: pd.DataFrame, colunas: Sequence[str]) -> pd.Series:
+    """
+    Chave (32 dígitos hexa) de cada linha a partir de `colunas`. Os valores
+    entram normalizados como o tipo "chave" do esquema e nulos viram "",
+    então 123, "123" e 123.0 dão a mesma chave; colunas ausentes contam
+    como nulas.
+    """
+    partes = pd.DataFrame({coluna: _texto_chave(df, coluna) for coluna in colunas}, index=df.index)
+    metades = [
+        _hex(pd.util.hash_pandas_object(partes, index=False, hash_key=chave).to_numpy())
+        for chave in _HASH_KEYS
+    ]
+    return pd.Series(np.char.add(*metades), index=df.index, dtype="string")
+
+
+def como_uuid(chaves: pd.Series) -> pd.Series:
+    """Formata chaves de 32 dígitos como UUID (8-4-4-4-12)."""
+    return chaves.str[:8] + "-" + chaves.str[8:12] + "-" + chaves.str[12:16] + "-" + chaves.str[16:20] + "-" + chaves.str[20:]
+
+
+def id_lote(chaves: pd.Series) -> str:
+    """Id do lote derivado das chaves das suas linhas: repetir o mesmo lote dá o mesmo id."""
+    return hashlib.sha1("\n".join(sorted(chaves.astype(str))).encode()).hexdigest()[:16]
@@ -0,0 +1,119 @@
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+import config
+
+_abertos: Dict[str, "CheckpointPaginas"] = {}
+_abertos_lock = threading.Lock()
+
+
+class CheckpointPaginas:
+    """
+    Páginas já baixadas de uma listagem, guardadas em disco para retomar a
+    extração depois de uma falha.
+
+    Cada listagem (entidade + filtros + intervalo + tamanho de página) tem um
+    diretório próprio com as páginas brutas (`pagina-NNNNN.json.gz`) e um
+    manifesto com a última página gravada e se a listagem chegou ao fim.
+    Rodar de novo o mesmo intervalo relê as páginas gravadas do disco e
+    continua da página seguinte; janelas de backfill já concluídas não fazem
+    nenhuma requisição.
+    """
+
+    def __init__(self, entidade: str, parametros: Dict[str, Any]):
+        self.entidade = entidade
+        self.parametros = parametros
+        assinatura = json.dumps(parametros, sort_keys=True, default=str)
+        self.chave = f"{entidade}-{hashlib.sha1(assinatura.encode('utf-8')).hexdigest()[:16]}"
+        self.dir = config.PIPELINE_CHECKPOINT_DIR / self.chave
+        self._manifesto = self._ler_manifesto()
+
+    def _ler_manifesto(self) -> Dict[str, Any]:
+        caminho = self.dir / "manifesto.json"
+        if caminho.exists():
+            with open(caminho, "r", encoding="utf-8") as f:
+                return json.load(f)
+        return {"entidade": self.entidade, "parametros": self.parametros,
+                "paginas": 0, "concluido": False}
+
+    def _gravar_manifesto(self) -> None:
+        caminho = self.dir / "manifesto.json"
+        tmp = caminho.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._manifesto, f, ensure_ascii=False, default=str)
+        os.replace(tmp, caminho)
+
+    def _caminho_pagina(self, pagina: int) -> Path:
+        return self.dir / f"pagina-{pagina:05d}.json.gz"
+
+    @property
+    def paginas(self) -> int:
+        """Quantidade de páginas já gravadas (a próxima a buscar é paginas + 1)."""
+        return self._manifesto["paginas"]
+
+    @property
+    def concluido(self) -> bool:
+        return self._manifesto["concluido"]
+
+    def paginas_gravadas(self) -> Iterator[List[Any]]:
+        """Relê as páginas gravadas, na ordem."""
+        for pagina in range(1, self.paginas + 1):
+            with gzip.open(self._caminho_pagina(pagina), "rt", encoding="utf-8") as f:
+                yield json.load(f)
+
+    def gravar_pagina(self, pagina: int, dados: List[Any]) -> None:
+        """Grava a página `pagina` (sempre a seguinte à última gravada)."""
+        if pagina != self.paginas + 1:
+            raise ValueError(f"Checkpoint {self.chave}: página {pagina} fora de ordem "
+                             f"(última gravada: {self.paginas})")
+        self.dir.mkdir(parents=True, exist_ok=True)
+        caminho = self._caminho_pagina(pagina)
+        tmp = caminho.with_suffix(".tmp")
+        with gzip.open(tmp, "wt", encoding="utf-8") as f:
+            json.dump(dados, f, ensure_ascii=False)
+        os.replace(tmp, caminho)
+        self._manifesto["paginas"] = pagina
+        self._gravar_manifesto()
+
+    def concluir(self) -> None:
+        """Marca a listagem como completa (não há páginas depois da última gravada)."""
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self._manifesto["concluido"] = True
+        self._gravar_manifesto()
+
+    def remover(self) -> None:
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+
+def obter_checkpoint(entidade: str, parametros: Dict[str, Any]) -> Optional[CheckpointPaginas]:
+    """
+    Checkpoint da listagem descrita por `parametros`, ou None se o
+    checkpoint estiver desligado (PIPELINE_CHECKPOINT=0).
+    """
+    if not config.PIPELINE_CHECKPOINT:
+        return None
+    checkpoint = CheckpointPaginas(entidade, parametros)
+    with _abertos_lock:
+        _abertos.setdefault(checkpoint.chave, checkpoint)
+    if checkpoint.paginas or checkpoint.concluido:
+        situacao = "completa" if checkpoint.concluido else f"continuando da página {checkpoint.paginas + 1}"
+        print(f"Checkpoint {entidade}: {checkpoint.paginas} páginas em disco, {situacao}")
+    return checkpoint
+
+
+def limpar_checkpoints() -> int:
+    """
+    Remove os checkpoints usados por este processo. Chamar depois que os
+    dados foram carregados no destino; devolve quantos foram removidos.
+    """
+    with _abertos_lock:
+        checkpoints = list(_abertos.values())
+        _abertos.clear()
+    for checkpoint in checkpoints:
+        checkpoint.remover()
+    return len(checkpoints)
@@ -1,40 +1,160 @@
-from dotenv import load_dotenv
-from pathlib import Path
-from google.oauth2 import service_account
-from google.cloud import bigquery
+"""
+Configuração do pipeline.
+
+Importar este módulo não tem efeito colateral: o .env só é lido, e cada
+valor só é calculado, no primeiro acesso (`config.OCTA_RPS`,
+`from config import OCTA_RPS`). Os clientes (BigQuery, Octadesk) também
+só são criados no primeiro uso, e o google-cloud-bigquery só é importado aí.
+"""
+
 import os
-import pytz
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, List
+
+if TYPE_CHECKING:
+    from google.cloud import bigquery
 
 dotenv_path = Path(__file__).parent / ".env"
-load_dotenv(dotenv_path=dotenv_path)
+CONFIG_PATH = Path(__file__).parent / "config.json"
 
-OCTA_BASE_URL    = os.getenv("OCTA_BASE_URL", "").rstrip("/")
-OCTA_API_KEY     = os.getenv("OCTA_API_KEY", "")
-OCTA_AGENT_EMAIL = os.getenv("OCTA_AGENT_EMAIL", "")
+_lock = threading.Lock()
+_env_carregado = False
 
-missing = [n for n,v in [
-    ("OCTA_BASE_URL",    OCTA_BASE_URL),
-    ("OCTA_API_KEY",     OCTA_API_KEY),
-    ("OCTA_AGENT_EMAIL", OCTA_AGENT_EMAIL)
-] if not v]
-if missing:
-    raise RuntimeError(f"Faltando variáveis no .env: {missing}")
 
-CONFIG_PATH = Path(__file__).parent / "config.json"
-CREDS       = service_account.Credentials.from_service_account_file(CONFIG_PATH)
-PROJECT     = CREDS.project_id
-
-if PROJECT is None:
-    raise RuntimeError(f"ID do projeto não encontrado nas credenciais.")
-
-BQ = bigquery.Client(credentials=CREDS, project=PROJECT)
-TIMEZONE = pytz.timezone("America/Sao_Paulo")
-SRC_TABLE_SAC_OCTADESK = f"{PROJECT}.DataLake_2025.Octadesk"
-SRC_TABLE_TICKETS_ABERTOS = f"{PROJECT}.DataWareHouse_2025.Sac_TicketsAbertos"
-
-OCTA_HEADERS = {
-    "Content-Type":      "application/json",
-    "Accept":            "application/json",
-    "x-api-key":         OCTA_API_KEY,
-    "octa-agent-email":  OCTA_AGENT_EMAIL,
+def carregar_env() -> None:
+    """Lê o .env uma única vez (variáveis já definidas no ambiente têm prioridade)."""
+    global _env_carregado
+    if _env_carregado:
+        return
+    with _lock:
+        if not _env_carregado:
+            from dotenv import load_dotenv
+            load_dotenv(dotenv_path=dotenv_path)
+            _env_carregado = True
+
+
+def _env(nome: str, padrao: Any = "") -> str:
+    carregar_env()
+    return os.getenv(nome, padrao)
+
+
+def _fuso() -> Any:
+    import pytz
+    return pytz.timezone("America/Sao_Paulo")
+
+
+def _headers() -> Dict[str, str]:
+    return {
+        "Content-Type":      "application/json",
+        "Accept":            "application/json",
+        "x-api-key":         _valor("OCTA_API_KEY"),
+        "octa-agent-email":  _valor("OCTA_AGENT_EMAIL"),
+    }
+
+
+# Cada configuração é calculada no primeiro acesso e guardada no módulo
+_CONFIGURACOES: Dict[str, Callable[[], Any]] = {
+    "OCTA_BASE_URL":    lambda: _env("OCTA_BASE_URL").rstrip("/"),
+    "OCTA_API_KEY":     lambda: _env("OCTA_API_KEY"),
+    "OCTA_AGENT_EMAIL": lambda: _env("OCTA_AGENT_EMAIL"),
+    # Quantidade de páginas buscadas em paralelo nas listagens paginadas
+    "OCTA_CONCORRENCIA": lambda: int(_env("OCTA_CONCORRENCIA", "4")),
+    # Janelas de tempo processadas em paralelo no modo backfill
+    "OCTA_BACKFILL_WORKERS": lambda: int(_env("OCTA_BACKFILL_WORKERS", "2")),
+    # Chats enriquecidos (detalhes + eventos) em paralelo no coleta_chat
+    "OCTA_ENRIQUECIMENTO_WORKERS": lambda: int(_env("OCTA_ENRIQUECIMENTO_WORKERS", "8")),
+    # Conexões HTTP reaproveitadas e timeouts (segundos) das chamadas à Octadesk
+    "OCTA_POOL_SIZE":       lambda: int(_env("OCTA_POOL_SIZE", "32")),
+    "OCTA_TIMEOUT_CONNECT": lambda: float(_env("OCTA_TIMEOUT_CONNECT", "10")),
+    "OCTA_TIMEOUT_READ":    lambda: float(_env("OCTA_TIMEOUT_READ", "60")),
+    # Orçamento de requisições por segundo (ajustado em 429/409)
+    "OCTA_RPS":     lambda: float(_env("OCTA_RPS", "5")),
+    "OCTA_RPS_MIN": lambda: float(_env("OCTA_RPS_MIN", "0.5")),
+    "OCTA_RPS_MAX": lambda: float(_env("OCTA_RPS_MAX", "10")),
+    # Atualização de status lendo tickets em lote pela listagem por faixa de número
+    "OCTA_STATUS_POR_FAIXA": lambda: _env("OCTA_STATUS_POR_FAIXA", "1") != "0",
+    # Estado local do pipeline (watermarks do modo incremental)
+    "PIPELINE_ESTADO_PATH":        lambda: Path(_env("PIPELINE_ESTADO_PATH", Path(__file__).parent / ".estado" / "estado.json")),
+    "PIPELINE_SOBREPOSICAO_HORAS": lambda: float(_env("PIPELINE_SOBREPOSICAO_HORAS", "2")),
+    # Índice local de ids já carregados (verificação de duplicidade)
+    "PIPELINE_INDICE_PATH":      lambda: Path(_env("PIPELINE_INDICE_PATH", Path(__file__).parent / ".estado" / "indice_ids.npz")),
+    "PIPELINE_RECONCILIAR_DIAS": lambda: int(_env("PIPELINE_RECONCILIAR_DIAS", "7")),
+    # Tickets não resolvidos do destino (lista de trabalho da atualização de status)
+    "PIPELINE_ABERTOS_PATH": lambda: Path(_env("PIPELINE_ABERTOS_PATH", Path(__file__).parent / ".estado" / "tickets_abertos.json")),
+    # Modo streaming: partes NDJSON em disco e buckets do join ticket × chat
+    "PIPELINE_STAGING_DIR":       lambda: Path(_env("PIPELINE_STAGING_DIR", Path(__file__).parent / ".staging")),
+    "PIPELINE_STREAMING_BUCKETS": lambda: int(_env("PIPELINE_STREAMING_BUCKETS", "16")),
+    # Modo pipeline: itens (páginas/buckets) em espera entre dois estágios
+    "PIPELINE_FILA_MAX": lambda: int(_env("PIPELINE_FILA_MAX", "4")),
+    # Checkpoint das listagens paginadas (retomada depois de falha)
+    "PIPELINE_CHECKPOINT":     lambda: _env("PIPELINE_CHECKPOINT", "1") != "0",
+    "PIPELINE_CHECKPOINT_DIR": lambda: Path(_env("PIPELINE_CHECKPOINT_DIR", Path(__file__).parent / ".estado" / "checkpoints")),
+    # Relatório da execução (JSON), arquivo do Prometheus e perfil das etapas
+    "PIPELINE_RELATORIO_DIR":   lambda: Path(_env("PIPELINE_RELATORIO_DIR", Path(__file__).parent / ".estado" / "relatorios")),
+    "PIPELINE_PROMETHEUS_PATH": lambda: _env("PIPELINE_PROMETHEUS_PATH", ""),
+    "PIPELINE_PERFIL":          lambda: _env("PIPELINE_PERFIL", ""),
+    "PIPELINE_PERFILADOR":      lambda: _env("PIPELINE_PERFILADOR", "cprofile"),
+    # Várias contas Octadesk (multi_contas.py): arquivo das contas e quantas rodam ao mesmo tempo
+    "PIPELINE_CONTAS_PATH":      lambda: Path(_env("PIPELINE_CONTAS_PATH", Path(__file__).parent / "contas.json")),
+    "PIPELINE_CONTAS_PARALELAS": lambda: int(_env("PIPELINE_CONTAS_PARALELAS", "2")),
+    "PIPELINE_CONTAS_DIR":       lambda: Path(_env("PIPELINE_CONTAS_DIR", Path(__file__).parent / ".estado" / "contas")),
+    # Cache local de respostas (detalhes de chat, eventos, tickets)
+    "OCTA_CACHE_PATH":   lambda: Path(_env("OCTA_CACHE_PATH", Path(__file__).parent / ".cache" / "octadesk.sqlite")),
+    "OCTA_CACHE_MAX_MB": lambda: int(_env("OCTA_CACHE_MAX_MB", "256")),
+    # Projeto das tabelas de destino (as credenciais só são lidas quando o BigQuery é usado)
+    "PROJECT": lambda: _env("GCP_PROJECT", "integracoes-infinit"),
+    # Destino do load: 'bigquery' ou 'local' (SQLite em PIPELINE_LOCAL_DB, sem GCP)
+    "PIPELINE_SINK":     lambda: _env("PIPELINE_SINK", "bigquery"),
+    "PIPELINE_LOCAL_DB": lambda: Path(_env("PIPELINE_LOCAL_DB", Path(__file__).parent / ".local" / "octadesk.sqlite")),
+    # Load: 'append' (com verificação de duplicidade) ou 'upsert' (MERGE por chave_linha)
+    "PIPELINE_CARGA": lambda: _env("PIPELINE_CARGA", "append"),
+    # Campos custom e eventos do chat: 'largo' (uma coluna por campo) ou 'longo' (tabelas laterais)
+    "PIPELINE_FORMATO": lambda: _env("PIPELINE_FORMATO", "largo"),
+    "TIMEZONE": _fuso,
+    # Tabela final (cada conta do multi_contas.py pode ter a sua)
+    "SRC_TABLE_SAC_OCTADESK":    lambda: _env("PIPELINE_TABELA", f"{_valor('PROJECT')}.DataLake_2025.Octadesk"),
+    "SRC_TABLE_TICKETS_ABERTOS": lambda: f"{_valor('PROJECT')}.DataWareHouse_2025.Sac_TicketsAbertos",
+    "OCTA_HEADERS": _headers,
 }
+
+
+def _valor(nome: str) -> Any:
+    if nome not in globals():
+        globals()[nome] = _CONFIGURACOES[nome]()
+    return globals()[nome]
+
+
+def __getattr__(nome: str) -> Any:
+    if nome not in _CONFIGURACOES:
+        raise AttributeError(f"module {__name__!r} has no attribute {nome!r}")
+    return _valor(nome)
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(_CONFIGURACOES))
+
+
+def validar_octadesk() -> None:
+    """Falha se faltar alguma variável obrigatória da conta Octadesk."""
+    missing = [n for n in ("OCTA_BASE_URL", "OCTA_API_KEY", "OCTA_AGENT_EMAIL") if not _valor(n)]
+    if missing:
+        raise RuntimeError(f"Faltando variáveis no .env: {missing}")
+
+
+_bq = None
+
+
+def obter_bq() -> "bigquery.Client":
+    """Cliente BigQuery único do processo, criado no primeiro uso a partir do config.json."""
+    global _bq
+    if _bq is None:
+        with _lock:
+            if _bq is None:
+                from google.oauth2 import service_account
+                from google.cloud import bigquery
+                creds = service_account.Credentials.from_service_account_file(CONFIG_PATH)
+                if creds.project_id is None:
+                    raise RuntimeError(f"ID do projeto não encontrado nas credenciais.")
+                _bq = bigquery.Client(credentials=creds, project=creds.project_id)
+    return _bq
@@ -0,0 +1,162 @@
+"""
+Esquema de colunas do pipeline.
+
+Cada coluna conhecida tem um tipo lógico, aplicado uma vez na ingestão
+(preparar_tickets/preparar_chats). Nulos continuam nulos (pd.NA/NaT) em vez
+de virarem o texto "nan", e o tipo do BigQuery sai do dtype, sem inferência
+no load.
+"""
+
+import pandas as pd
+from pandas.api.types import (
+    is_bool_dtype,
+    is_datetime64_any_dtype,
+    is_float_dtype,
+    is_integer_dtype,
+    is_object_dtype,
+    is_string_dtype,
+)
+from typing import Dict, Optional
+
+# Tipos lógicos: dtype no pandas → tipo no BigQuery
+#   chave       número de ticket/chat guardado como texto ("123", nunca "123.0" ou "nan")
+#   texto       string nullable
+#   categoria   poucos valores distintos (status, canal)
+#   inteiro     Int64 nullable
+#   timestamp   datetime64 UTC
+#   lista_texto lista de strings (ARRAY<STRING>), nunca nula
+ESQUEMA_TICKET: Dict[str, str] = {
+    "uuid": "texto",
+    "n_ticket": "chave",
+    "titulo": "texto",
+    "tags_ticket": "lista_texto",
+    "createdAt": "timestamp",
+    "updatedAt": "timestamp",
+    "status_ticket": "categoria",
+    "channel_ticket": "categoria",
+    "autor_ticket": "texto",
+    "email_ticket": "texto",
+    "grupo_responsavel_ticket": "texto",
+    "status_ticket2": "categoria",
+    "ticket_codigo_de_rastreio": "texto",
+    "ticket_cpf": "texto",
+    "ticket_data_de_pagamento": "texto",
+    "ticket_email_do_cliente": "texto",
+    "ticket_motivo_de_contatos": "categoria",
+    "ticket_n_da_nota_fiscal": "texto",
+    "ticket_n_do_pedido": "texto",
+    "ticket_n_do_pedido_bling": "texto",
+    "ticket_produto": "categoria",
+    "ticket_tipo_do_problema": "categoria",
+}
+
+ESQUEMA_CHAT: Dict[str, str] = {
+    "id": "texto",
+    "chat_id": "texto",
+    "number": "chave",
+    "evt_ticket_ticketNumber": "chave",
+    "contact_cf_n_mero_do_ticket": "chave",
+    "createdAt": "timestamp",
+    "status": "categoria",
+    "channel": "categoria",
+    "department": "categoria",
+    "origin": "categoria",
+    "agent_name": "categoria",
+}
+
+# Tabelas laterais do formato longo (formato_longo.py)
+ESQUEMA_LONGO: Dict[str, str] = {
+    "chat_id": "texto",
+    "number": "chave",
+    "origem": "categoria",
+    "tipo": "categoria",
+    "chave": "texto",
+    "valor": "texto",
+    "upload": "timestamp",
+}
+
+
+def _como_chave(serie: pd.Series) -> pd.Series:
+    if is_float_dtype(serie):
+        inteiros = serie.dropna()
+        if (inteiros == inteiros.round()).all():
+            serie = serie.astype("Int64")
+    elif is_object_dtype(serie):
+        # Números vindos do JSON (int ou float inteiro) viram texto sem ".0"
+        serie = serie.map(lambda v: int(v) if isinstance(v, float) and v.is_integer() else v)
+    texto = serie.astype("string").str.strip()
+    return texto.mask(texto.isin(["", "nan", "None", "<NA>"]))
+
+
+def _como_lista_texto(serie: pd.Series) -> pd.Series:
+    return serie.map(lambda v: [str(x) for x in v if x is not None] if isinstance(v, list) else [])
+
+
+def converter(serie: pd.Series, tipo: str) -> pd.Series:
+    """Converte `serie` para o tipo lógico `tipo` (valores inválidos viram nulo)."""
+    if tipo == "chave":
+        return _como_chave(serie)
+    if tipo == "texto":
+        return serie if is_string_dtype(serie) and not is_object_dtype(serie) else serie.astype("string")
+    if tipo == "categoria":
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            return serie
+        return serie.astype("string").astype("category")
+    if tipo == "inteiro":
+        numeros = pd.to_numeric(serie, errors="coerce")
+        return numeros.round().astype("Int64")
+    if tipo == "timestamp":
+        if is_datetime64_any_dtype(serie):
+            return serie.dt.tz_localize("UTC") if serie.dt.tz is None else serie.dt.tz_convert("UTC")
+        return pd.to_datetime(serie, utc=True, errors="coerce", format="ISO8601")
+    if tipo == "lista_texto":
+        return _como_lista_texto(serie)
+    raise ValueError(f"Tipo de coluna desconhecido: {tipo}")
+
+
+def aplicar_esquema(df: pd.DataFrame, esquema: Dict[str, str]) -> pd.DataFrame:
+    """Converte no lugar as colunas de `esquema` presentes em `df` e devolve `df`."""
+    for coluna, tipo in esquema.items():
+        if coluna in df.columns:
+            df[coluna] = converter(df[coluna], tipo)
+    return df
+
+
+def tipo_bigquery(serie: pd.Series) -> Optional[str]:
+    """
+    Tipo do BigQuery correspondente ao dtype de `serie`; "ARRAY<STRING>" para
+    listas de texto e None quando o tipo fica para a inferência do load.
+    """
+    dtype = serie.dtype
+    if isinstance(dtype, pd.CategoricalDtype) or (is_string_dtype(dtype) and not is_object_dtype(dtype)):
+        return "STRING"
+    if is_bool_dtype(dtype):
+        return "BOOL"
+    if is_integer_dtype(dtype):
+        return "INT64"
+    if is_float_dtype(dtype):
+        return "FLOAT64"
+    if is_datetime64_any_dtype(dtype):
+        return "TIMESTAMP"
+    if is_object_dtype(dtype):
+        amostra = serie.dropna()
+        amostra = amostra[amostra.map(lambda v: isinstance(v, list) and len(v) > 0)].head(100)
+        if len(amostra) and amostra.map(lambda v: all(isinstance(x, str) for x in v)).all():
+            return "ARRAY<STRING>"
+    return None
+
+
+def para_tipo_bigquery(serie: pd.Series, tipo: str) -> pd.Series:
+    """Converte `serie` para o tipo de uma coluna já existente no BigQuery."""
+    if tipo == "STRING":
+        if is_datetime64_any_dtype(serie):
+            # Mesmo formato que a API devolve (2024-01-31T12:00:00.000Z)
+            return serie.dt.tz_convert("UTC").dt.strftime("%Y-%m-%dT%H:%M:%S.%f").str[:-3] + "Z"
+        return serie.astype("string")
+    if tipo == "INT64":
+        return converter(serie, "inteiro")
+    if tipo == "FLOAT64":
+        return pd.to_numeric(serie, errors="coerce")
+    if tipo == "TIMESTAMP":
+        return converter(serie, "timestamp")
+    return serie
@@ -0,0 +1,70 @@
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Any, Dict, Optional
+import config
+
+_lock = threading.Lock()
+
+
+def carregar_estado() -> Dict[str, Any]:
+    """Lê o arquivo de estado local (vazio se ainda não existir)."""
+    caminho = config.PIPELINE_ESTADO_PATH
+    if not caminho.exists():
+        return {}
+    with open(caminho, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def atualizar_estado(chave: str, valor: Any) -> None:
+    """Grava `chave` no estado de forma atômica (arquivo temporário + rename)."""
+    with _lock:
+        estado = carregar_estado()
+        estado[chave] = valor
+        caminho = config.PIPELINE_ESTADO_PATH
+        caminho.parent.mkdir(parents=True, exist_ok=True)
+        tmp = caminho.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(estado, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, caminho)
+
+
+def obter_watermark(entidade: str) -> Optional[datetime]:
+    """Maior createdAt já carregado com sucesso para a entidade ('tickets' ou 'chats')."""
+    valor = carregar_estado().get("watermarks", {}).get(entidade)
+    return datetime.fromisoformat(valor) if valor else None
+
+
+def salvar_watermark(entidade: str, valor: datetime) -> None:
+    """Avança o watermark da entidade; nunca volta para uma data anterior."""
+    atual = obter_watermark(entidade)
+    if atual is not None and valor <= atual:
+        return
+    watermarks = carregar_estado().get("watermarks", {})
+    watermarks[entidade] = valor.isoformat()
+    atualizar_estado("watermarks", watermarks)
+
+
+def fim_da_execucao(modo: str, agora: datetime) -> datetime:
+    """
+    Fim do intervalo buscado pela execução do `modo` ('padrao', 'incremental'
+    ou 'backfill'). Se uma execução anterior do mesmo modo não chegou ao load,
+    o fim dela é reaproveitado, para que o intervalo (e portanto a chave dos
+    checkpoints de paginação) seja o mesmo e a extração continue de onde parou.
+    """
+    pendentes = carregar_estado().get("execucoes_pendentes", {})
+    if modo in pendentes:
+        fim = datetime.fromisoformat(pendentes[modo])
+        print(f"Retomando execução {modo} interrompida: fim em {fim}")
+        return fim
+    pendentes[modo] = agora.isoformat()
+    atualizar_estado("execucoes_pendentes", pendentes)
+    return agora
+
+
+def concluir_execucao(modo: str) -> None:
+    """Esquece o fim guardado por fim_da_execucao depois que os dados foram carregados."""
+    pendentes = carregar_estado().get("execucoes_pendentes", {})
+    if pendentes.pop(modo, None) is not None:
+        atualizar_estado("execucoes_pendentes", pendentes)
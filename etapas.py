@@ -0,0 +1,300 @@
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+import config
+from staging import Staging, particionar
+from chaves import COLUNAS_LINHA, chave_linha, como_uuid
+from esquema import ESQUEMA_CHAT, ESQUEMA_TICKET, aplicar_esquema, converter
+from ticket import extrair_custom_ticket, iterar_tickets, split_windows
+from chat import enriquecer_conversas, formatar_coluna2, iterar_conversas, normalizar_conversas
+from formato_longo import separar_dinamicas
+from metricas import medido
+from backfill import paginas_em_janelas
+from pipeline import Estagio, Pipeline
+
+# Colunas da listagem de tickets levadas para a tabela final
+RENAME_MAP_TICKET = {
+    'id': 'uuid',
+    'number': 'n_ticket',
+    'summary': 'titulo',
+    'tags': 'tags_ticket',
+    'createdAt': 'createdAt',
+    'updatedAt': 'updatedAt',
+    'status.name': 'status_ticket',
+    'channel.name': 'channel_ticket',
+    'requester.name': 'autor_ticket',
+    'requester.email': 'email_ticket',
+    'group.id': 'grupo_responsavel_ticket',
+    'lastHumanInteraction.propertiesChanges.status': 'status_ticket2',
+    'customField': 'campo_custom_ticket',
+    'requester.customField': 'campo_custom_ticket2'
+
+}
+
+
+@medido("preparar_tickets")
+def preparar_tickets(df_ticket: pd.DataFrame) -> pd.DataFrame:
+    """Seleciona/renomeia as colunas do ticket e junta os campos customizados."""
+    if df_ticket.empty:
+        df_ticket = pd.DataFrame(columns=list(RENAME_MAP_TICKET.keys()))
+
+    # Colunas ausentes na página/período entram vazias
+    df_ticket_filtro1 = df_ticket.reindex(columns=list(RENAME_MAP_TICKET.keys())).rename(columns=RENAME_MAP_TICKET)
+    df_custom_ticket = extrair_custom_ticket(df_ticket_filtro1)
+    df_ticket_final = df_ticket_filtro1.merge(df_custom_ticket, on="uuid", how="left")
+    return aplicar_esquema(df_ticket_final, ESQUEMA_TICKET)
+
+
+@medido("preparar_chats")
+def preparar_chats(df_chat: pd.DataFrame) -> pd.DataFrame:
+    """Garante as colunas usadas no merge e aplica o esquema de tipos (ESQUEMA_CHAT)."""
+    if df_chat.empty:
+        df_chat = pd.DataFrame(columns=['number'])
+
+    if 'evt_ticket_ticketNumber' not in df_chat:
+        df_chat['evt_ticket_ticketNumber'] = pd.NA
+
+    if 'contact_cf_n_mero_do_ticket' not in df_chat:
+        df_chat['contact_cf_n_mero_do_ticket'] = pd.NA
+
+    return aplicar_esquema(df_chat, ESQUEMA_CHAT)
+
+
+def _chave_int(serie: pd.Series, ausente: int) -> np.ndarray:
+    """Número do ticket como int64; nulos e não numéricos viram `ausente`."""
+    return pd.to_numeric(serie, errors="coerce").fillna(ausente).to_numpy(dtype="int64")
+
+
+def _parte_join(df: pd.DataFrame, posicoes: np.ndarray, nomes: List[str]) -> pd.DataFrame:
+    """Linhas de `df` nas `posicoes` (-1 = linha vazia), com as colunas renomeadas para `nomes`."""
+    unicos = ~pd.Index(nomes).duplicated()
+    if not unicos.all():
+        # Nomes que coincidem depois de padronizados: fica a primeira coluna
+        df = df.iloc[:, unicos]
+        nomes = [n for n, u in zip(nomes, unicos) if u]
+    parte = df.set_axis(pd.RangeIndex(len(df)), axis=0, copy=False).reindex(posicoes)
+    parte.index = pd.RangeIndex(len(posicoes))
+    parte.columns = nomes
+    return parte
+
+
+@medido("juntar_chats_tickets")
+def juntar_chats_tickets(df_chat: pd.DataFrame,
+                         df_ticket_final: pd.DataFrame) -> Tuple[pd.DataFrame, Dict[str, int]]:
+    """
+    Outer join de chats (evt_ticket_ticketNumber) com tickets (n_ticket).
+
+    As chaves são normalizadas uma vez para int64 e o join é feito só entre
+    (chave, posição) de cada lado; as colunas são então montadas por posição
+    com um único reindex de cada lado. Chaves nulas nunca se casam. Os nomes
+    de colunas já saem padronizados (formatar_coluna2), com sufixos _chat e
+    _ticket quando os dois lados têm a mesma coluna.
+
+    Retorna o DataFrame e as contagens {pareadas, so_chat, so_ticket}.
+    """
+    chaves_chat = _chave_int(df_chat["evt_ticket_ticketNumber"], ausente=-1)
+    chaves_ticket = _chave_int(df_ticket_final["n_ticket"], ausente=-2)
+
+    pares = pd.DataFrame({"chave": chaves_chat, "pos_chat": np.arange(len(df_chat))}).merge(
+        pd.DataFrame({"chave": chaves_ticket, "pos_ticket": np.arange(len(df_ticket_final))}),
+        on="chave", how="outer", sort=False
+    )
+    pos_chat = pares["pos_chat"].fillna(-1).to_numpy(dtype="int64")
+    pos_ticket = pares["pos_ticket"].fillna(-1).to_numpy(dtype="int64")
+
+    nomes_chat = [formatar_coluna2(c) for c in df_chat.columns]
+    nomes_ticket = [formatar_coluna2(c) for c in df_ticket_final.columns]
+    comuns = set(nomes_chat) & set(nomes_ticket)
+    nomes_chat = [f"{n}_chat" if n in comuns else n for n in nomes_chat]
+    nomes_ticket = [f"{n}_ticket" if n in comuns else n for n in nomes_ticket]
+
+    df = pd.concat(
+        [_parte_join(df_chat, pos_chat, nomes_chat), _parte_join(df_ticket_final, pos_ticket, nomes_ticket)],
+        axis=1, copy=False
+    )
+
+    tem_chat = pos_chat >= 0
+    tem_ticket = pos_ticket >= 0
+    contagens = {
+        "pareadas": int((tem_chat & tem_ticket).sum()),
+        "so_chat": int((tem_chat & ~tem_ticket).sum()),
+        "so_ticket": int((~tem_chat & tem_ticket).sum()),
+    }
+    return df, contagens
+
+
+def resumo_join(contagens: Dict[str, int]) -> str:
+    return (f"Join ticket × chat: {contagens.get('pareadas', 0)} pareadas, "
+            f"{contagens.get('so_chat', 0)} só chat, {contagens.get('so_ticket', 0)} só ticket")
+
+
+def montar_upload(df_chat: pd.DataFrame, df_ticket_final: pd.DataFrame,
+                  upload: datetime, contagens: Optional[Dict[str, int]] = None,
+                  laterais: Optional[Dict[str, pd.DataFrame]] = None) -> pd.DataFrame:
+    """
+    Junta chats e tickets e aplica as colunas de controle (chave_linha, uuid,
+    upload). A chave_linha é o hash de number + n_ticket e também preenche o
+    uuid das linhas sem ticket, de modo que a mesma linha tem sempre os
+    mesmos ids.
+    As contagens do join são somadas em `contagens` quando informado (para
+    juntar vários lotes); sem ele, o resumo é impresso na hora.
+
+    Com `laterais` (formato longo), os customFields e eventos do chat saem
+    antes do join e `laterais` recebe as tabelas longas deste lote
+    (formato_longo.separar_dinamicas).
+    """
+    if laterais is not None:
+        df_chat, laterais_lote = separar_dinamicas(df_chat, upload)
+        laterais.update(laterais_lote)
+
+    df_upload, contagens_lote = juntar_chats_tickets(df_chat, df_ticket_final)
+    if contagens is None:
+        print(resumo_join(contagens_lote))
+    else:
+        for chave, valor in contagens_lote.items():
+            contagens[chave] = contagens.get(chave, 0) + valor
+
+    df_upload['chave_linha'] = chave_linha(df_upload, COLUNAS_LINHA)
+    sem_uuid = (df_upload['uuid'].isna() | (df_upload['uuid'].astype("string").str.strip() == '')).to_numpy()
+    df_upload['uuid'] = df_upload['uuid'].astype("string")
+    df_upload.loc[sem_uuid, 'uuid'] = como_uuid(df_upload.loc[sem_uuid, 'chave_linha'])
+    df_upload['upload'] = upload
+
+    # Linhas sem par no join ficam com NaN nas listas; ARRAY no BigQuery não aceita nulo
+    for coluna, tipo in {**ESQUEMA_CHAT, **ESQUEMA_TICKET}.items():
+        if tipo == "lista_texto" and coluna in df_upload.columns:
+            df_upload[coluna] = converter(df_upload[coluna], tipo)
+
+    return df_upload
+
+
+def _max_created(df: pd.DataFrame, atual):
+    if "createdAt" not in df.columns:
+        return atual
+    valor = pd.to_datetime(df["createdAt"], utc=True, errors="coerce").max()
+    if pd.isna(valor):
+        return atual
+    return valor if atual is None or valor > atual else atual
+
+
+def _paginas(iterar, inicio: datetime, fim: datetime, janela: Optional[timedelta]) -> Iterator[list]:
+    """Páginas de `iterar(inicio, fim)`; com `janela`, percorridas nas janelas do backfill."""
+    if janela is None:
+        return iter(iterar(inicio, fim))
+    return paginas_em_janelas(iterar, split_windows(inicio, fim, janela))
+
+
+def _paginas_tickets(inicio: datetime, fim: datetime, janela: Optional[timedelta]) -> Iterator[list]:
+    return _paginas(lambda s, e: iterar_tickets("createdAt", s, e), inicio, fim, janela)
+
+
+def extrair_para_staging(start_ticket_dt: datetime,
+                         start_chat_dt: datetime,
+                         end_dt: datetime,
+                         janela: Optional[timedelta] = None) -> Tuple[Staging, Staging, Dict[str, pd.Timestamp]]:
+    """
+    Modo streaming: busca tickets e chats página a página, prepara cada
+    página e grava em partes NDJSON. Com `janela` (backfill), o período é
+    percorrido em janelas, com a divisão em 5xx de backfill.paginas_em_janelas.
+    Retorna os stagings e o maior createdAt de cada entidade (para o watermark).
+    """
+    max_created: Dict[str, pd.Timestamp] = {}
+
+    stg_tickets = Staging("tickets")
+    for pagina in _paginas_tickets(start_ticket_dt, end_dt, janela):
+        df = pd.json_normalize(pagina)
+        max_created["tickets"] = _max_created(df, max_created.get("tickets"))
+        stg_tickets.gravar(preparar_tickets(df))
+
+    stg_chats = Staging("chats")
+    for pagina in _paginas(iterar_conversas, start_chat_dt, end_dt, janela):
+        df = enriquecer_conversas(normalizar_conversas(pagina))
+        max_created["chats"] = _max_created(df, max_created.get("chats"))
+        stg_chats.gravar(preparar_chats(df))
+
+    print(f"Staging: {stg_tickets.linhas} tickets, {stg_chats.linhas} chats")
+    return stg_tickets, stg_chats, max_created
+
+
+def extrair_em_pipeline(start_ticket_dt: datetime,
+                        start_chat_dt: datetime,
+                        end_dt: datetime,
+                        janela: Optional[timedelta] = None) -> Tuple[Staging, Staging, Dict[str, pd.Timestamp]]:
+    """
+    Como extrair_para_staging, mas tickets e chats são paginados ao mesmo
+    tempo e cada página passa por estágios próprios (normalizar/enriquecer,
+    preparar e gravar) assim que chega, com filas limitadas entre eles.
+    `janela` como em extrair_para_staging.
+    """
+    max_created: Dict[str, pd.Timestamp] = {}
+    stg_tickets = Staging("tickets")
+    stg_chats = Staging("chats")
+
+    def gravar_tickets(pagina: list) -> None:
+        df = pd.json_normalize(pagina)
+        max_created["tickets"] = _max_created(df, max_created.get("tickets"))
+        stg_tickets.gravar(preparar_tickets(df))
+
+    def enriquecer(pagina: list) -> pd.DataFrame:
+        return enriquecer_conversas(normalizar_conversas(pagina))
+
+    def gravar_chats(df: pd.DataFrame) -> None:
+        max_created["chats"] = _max_created(df, max_created.get("chats"))
+        stg_chats.gravar(preparar_chats(df))
+
+    (Pipeline()
+     .cadeia("paginas_tickets", _paginas_tickets(start_ticket_dt, end_dt, janela),
+             Estagio("preparar_tickets", gravar_tickets))
+     # Duas páginas em enriquecimento: os últimos chats de uma não seguram a próxima
+     .cadeia("paginas_chats", _paginas(iterar_conversas, start_chat_dt, end_dt, janela),
+             Estagio("enriquecer_chats", enriquecer, workers=2),
+             Estagio("preparar_chats", gravar_chats))
+     .executar())
+
+    print(f"Staging: {stg_tickets.linhas} tickets, {stg_chats.linhas} chats")
+    return stg_tickets, stg_chats, max_created
+
+
+def iterar_upload_staging(stg_tickets: Staging,
+                          stg_chats: Staging,
+                          upload: datetime,
+                          n_buckets: Optional[int] = None,
+                          laterais: Optional[Dict[str, pd.DataFrame]] = None) -> Iterator[pd.DataFrame]:
+    """
+    Particiona os dois lados pelo número do ticket e monta o upload bucket a
+    bucket, de modo que só um bucket de cada lado fica em memória por vez.
+    Com `laterais`, cada item vem acompanhado das tabelas longas do bucket
+    em `laterais` (ver montar_upload).
+    """
+    n_buckets = n_buckets or config.PIPELINE_STREAMING_BUCKETS
+    buckets_t: List[Staging] = particionar(stg_tickets, "n_ticket", n_buckets, "tickets-b")
+    buckets_c: List[Staging] = particionar(stg_chats, "evt_ticket_ticketNumber", n_buckets, "chats-b")
+
+    contagens: Dict[str, int] = {}
+    for bucket_t, bucket_c in zip(buckets_t, buckets_c):
+        df_t = bucket_t.ler()
+        df_c = bucket_c.ler()
+        bucket_t.remover()
+        bucket_c.remover()
+        if df_t.empty and df_c.empty:
+            continue
+        # As partes voltam do NDJSON como texto; o esquema é reaplicado na leitura
+        df_t = preparar_tickets(df_t) if df_t.empty else aplicar_esquema(df_t, ESQUEMA_TICKET)
+        yield montar_upload(preparar_chats(df_c), df_t, upload, contagens, laterais)
+
+    print(resumo_join(contagens))
+
+
+def iterar_lotes_upload(stg_tickets: Staging,
+                        stg_chats: Staging,
+                        upload: datetime,
+                        formato_longo: bool = False) -> Iterator[Tuple[pd.DataFrame, Optional[Dict[str, pd.DataFrame]]]]:
+    """
+    iterar_upload_staging entregando cada bucket junto com as suas tabelas
+    laterais (None fora do formato longo), para o lote poder ser carregado
+    em outra thread enquanto o próximo bucket é montado.
+    """
+    laterais: Optional[Dict[str, pd.DataFrame]] = {} if formato_longo else None
+    for df_upload in iterar_upload_staging(stg_tickets, stg_chats, upload, laterais=laterais):
+        yield df_upload, (dict(laterais) if laterais is not None else None)
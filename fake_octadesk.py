@@ -0,0 +1,328 @@
+"""
+Servidor local que imita a API Octadesk (/tickets, /tickets/{id}, /chat,
+/chat/{id}, /chat/{id}/events) sobre dados sintéticos, para medir os
+fetchers sem acessar o tenant real. Usa só a biblioteca padrão e não
+importa config.py, então pode subir antes de o .env apontar para ele.
+"""
+
+import bisect
+import json
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+STATUS_TICKET = ["Novo", "Aberto", "Pendente", "Resolvido"]
+CANAIS = ["whatsapp", "email", "chat", "instagram"]
+PRODUTOS = ["camiseta", "calça", "jaqueta", "avental", "boné"]
+
+
+def _iso(dt: datetime) -> str:
+    return dt.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+def gerar_dados(n_tickets: int = 1000,
+                n_chats: int = 1000,
+                inicio: Optional[datetime] = None,
+                fim: Optional[datetime] = None,
+                seed: int = 42) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Gera tickets e chats com o formato usado pelo pipeline (campos
+    customizados, requester, eventos). Metade dos chats aponta para um
+    ticket existente via evento 'ticket'.
+    """
+    rnd = random.Random(seed)
+    fim = fim or datetime.now(timezone.utc)
+    inicio = inicio or fim - timedelta(days=30)
+    segundos = max(1, int((fim - inicio).total_seconds()))
+
+    def instante() -> datetime:
+        return inicio + timedelta(seconds=rnd.randrange(segundos))
+
+    tickets = []
+    for i in range(n_tickets):
+        criado = instante()
+        status = rnd.choice(STATUS_TICKET)
+        tickets.append({
+            "id": str(uuid.UUID(int=rnd.getrandbits(128))),
+            "number": 100000 + i,
+            "summary": f"Ticket sintético {i}",
+            "tags": rnd.sample(["troca", "atraso", "defeito", "nf", "vip"], rnd.randint(0, 3)),
+            "createdAt": _iso(criado),
+            "updatedAt": _iso(min(fim, criado + timedelta(hours=rnd.randint(0, 72)))),
+            "status": {"name": status},
+            "channel": {"name": rnd.choice(CANAIS)},
+            "requester": {
+                "name": f"Cliente {i}",
+                "email": f"cliente{i}@exemplo.com",
+                "customField": [{"key": "cidade", "value": rnd.choice(["SP", "RJ", "BH"])}],
+            },
+            "group": {"id": str(rnd.randint(1, 5))},
+            "lastHumanInteraction": {"propertiesChanges": {"status": status}},
+            "customField": [
+                {"key": "produto", "value": rnd.choice(PRODUTOS)},
+                {"key": "n_do_pedido", "value": str(rnd.randint(10000, 99999))},
+                {"key": "n_do_pedido_bling", "value": str(rnd.randint(10000, 99999))},
+                {"key": "cpf", "value": f"{rnd.randint(0, 99999999999):011d}"},
+                {"key": "motivo_de_contatos", "value": rnd.choice(["troca", "dúvida", "reclamação"])},
+            ],
+        })
+
+    chats = []
+    for i in range(n_chats):
+        criado = instante()
+        encerrado = rnd.random() < 0.8
+        eventos = [{"type": "created", "data": {"at": _iso(criado)}}]
+        if tickets and rnd.random() < 0.5:
+            eventos.append({"type": "ticket", "data": {"ticketNumber": rnd.choice(tickets)["number"]}})
+        if encerrado and rnd.random() < 0.3:
+            eventos.append({"type": "satisfaction", "data": {"nota": rnd.randint(1, 5)}})
+        chats.append({
+            "id": str(uuid.UUID(int=rnd.getrandbits(128))),
+            "number": 500000 + i,
+            "createdAt": _iso(criado),
+            "status": "closed" if encerrado else "talking",
+            "closedAt": _iso(criado + timedelta(minutes=rnd.randint(1, 240))) if encerrado else None,
+            "channel": rnd.choice(CANAIS),
+            "department": rnd.choice(["SAC", "Comercial"]),
+            "agent": {"name": f"Agente {rnd.randint(1, 20)}"},
+            "origin": rnd.choice(["cliente", "agente"]),
+            "customFields": [{"key": "produto", "value": rnd.choice(PRODUTOS)}],
+            "contact": {
+                "id": str(rnd.randint(1, 10 ** 9)),
+                "name": f"Contato {i}",
+                "email": f"contato{i}@exemplo.com",
+                "phone": f"+55119{rnd.randint(10000000, 99999999)}",
+                "customFields": [{"key": "n_mero_do_ticket", "value": ""}],
+            },
+            "_eventos": eventos,
+        })
+
+    return {"tickets": tickets, "chats": chats}
+
+
+def _filtros(query: Dict[str, List[str]]) -> List[tuple]:
+    """Lê filters[i][property|operator|value] na ordem do índice."""
+    filtros = []
+    i = 0
+    while f"filters[{i}][property]" in query:
+        filtros.append((query[f"filters[{i}][property]"][0],
+                        query.get(f"filters[{i}][operator]", ["eq"])[0],
+                        query.get(f"filters[{i}][value]", [""])[0]))
+        i += 1
+    return filtros
+
+
+def _comparavel(valor: Any) -> Any:
+    """Datas ISO viram datetime; o resto é comparado como texto."""
+    if isinstance(valor, str):
+        try:
+            return datetime.fromisoformat(valor.replace("Z", "+00:00"))
+        except ValueError:
+            return valor
+    return str(valor)
+
+
+def _aplica_filtros(registros: List[dict], filtros: List[tuple]) -> List[dict]:
+    for propriedade, operador, valor in filtros:
+        alvo = _comparavel(valor)
+        if operador == "eq":
+            registros = [r for r in registros if str(r.get(propriedade)) == valor]
+        elif operador == "ge":
+            registros = [r for r in registros if _comparavel(r.get(propriedade)) >= alvo]
+        elif operador == "le":
+            registros = [r for r in registros if _comparavel(r.get(propriedade)) <= alvo]
+    return registros
+
+
+class FakeOctadesk(ThreadingHTTPServer):
+    """
+    Servidor HTTP com os dados de `gerar_dados`. Injeta falhas com as taxas
+    informadas (500, 409 e 429 com Retry-After) e atraso por página de
+    listagem, e conta as requisições atendidas.
+    """
+
+    daemon_threads = True
+
+    def __init__(self,
+                 dados: Dict[str, List[Dict[str, Any]]],
+                 porta: int = 0,
+                 taxa_500: float = 0.0,
+                 taxa_409: float = 0.0,
+                 taxa_429: float = 0.0,
+                 retry_after: int = 1,
+                 atraso_pagina: float = 0.0,
+                 atraso_detalhe: float = 0.0,
+                 seed: int = 42):
+        super().__init__(("127.0.0.1", porta), _Handler)
+        self.tickets = dados["tickets"]
+        self.chats = dados["chats"]
+        self.tickets_por_numero = {str(t["number"]): t for t in self.tickets}
+        self.chats_por_id = {c["id"]: c for c in self.chats}
+        self.taxa_500 = taxa_500
+        self.taxa_409 = taxa_409
+        self.taxa_429 = taxa_429
+        self.retry_after = retry_after
+        self.atraso_pagina = atraso_pagina
+        self.atraso_detalhe = atraso_detalhe
+        self._rnd = random.Random(seed)
+        self._lock = threading.Lock()
+        self._ordenados: Dict[tuple, tuple] = {}
+        self.requisicoes = 0
+        self.erros = 0
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def ordenados(self, entidade: str, propriedade: str) -> tuple:
+        """(registros, chaves) de `entidade` ordenados por `propriedade`, calculados uma vez."""
+        with self._lock:
+            if (entidade, propriedade) not in self._ordenados:
+                registros = sorted(getattr(self, entidade), key=lambda r: _comparavel(r.get(propriedade)))
+                chaves = [_comparavel(r.get(propriedade)) for r in registros]
+                self._ordenados[(entidade, propriedade)] = (registros, chaves)
+            return self._ordenados[(entidade, propriedade)]
+
+    def sortear_falha(self) -> Optional[int]:
+        with self._lock:
+            self.requisicoes += 1
+            sorteio = self._rnd.random()
+        for status, taxa in ((500, self.taxa_500), (409, self.taxa_409), (429, self.taxa_429)):
+            if sorteio < taxa:
+                with self._lock:
+                    self.erros += 1
+                return status
+            sorteio -= taxa
+        return None
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: FakeOctadesk
+    protocol_version = "HTTP/1.1"
+    # Cabeçalho e corpo saem em writes separados; sem isso o keep-alive para ~40ms (delayed ACK)
+    disable_nagle_algorithm = True
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def _responder(self, status: int, corpo: Any, headers: Optional[Dict[str, str]] = None) -> None:
+        dados = json.dumps(corpo, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(dados)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def _pagina(self, entidade: str, query: Dict[str, List[str]]) -> List[dict]:
+        filtros = _filtros(query)
+        prop = query.get("sort[property]", [None])[0]
+        if prop:
+            registros, chaves = self.server.ordenados(entidade, prop)
+            # Filtros ge/le na propriedade de ordenação viram uma fatia (bisect)
+            ini, fim = 0, len(registros)
+            restantes = []
+            for propriedade, operador, valor in filtros:
+                if propriedade == prop and operador == "ge":
+                    ini = max(ini, bisect.bisect_left(chaves, _comparavel(valor)))
+                elif propriedade == prop and operador == "le":
+                    fim = min(fim, bisect.bisect_right(chaves, _comparavel(valor)))
+                else:
+                    restantes.append((propriedade, operador, valor))
+            registros = _aplica_filtros(registros[ini:fim], restantes)
+            if query.get("sort[direction]", ["asc"])[0] == "desc":
+                registros = registros[::-1]
+        else:
+            registros = _aplica_filtros(getattr(self.server, entidade), filtros)
+        page = int(query.get("page", ["1"])[0])
+        limit = int(query.get("limit", ["100"])[0])
+        if self.server.atraso_pagina:
+            time.sleep(self.server.atraso_pagina)
+        return registros[(page - 1) * limit: page * limit]
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        partes = [p for p in url.path.split("/") if p]
+
+        falha = self.server.sortear_falha()
+        if falha == 429:
+            self._responder(429, {"message": "Too Many Requests"},
+                            {"Retry-After": str(self.server.retry_after)})
+            return
+        if falha is not None:
+            self._responder(falha, {"message": "erro simulado"})
+            return
+
+        if partes == ["tickets"]:
+            self._responder(200, self._pagina("tickets", query))
+        elif len(partes) == 2 and partes[0] == "tickets":
+            ticket = self.server.tickets_por_numero.get(partes[1])
+            if self.server.atraso_detalhe:
+                time.sleep(self.server.atraso_detalhe)
+            if ticket is None:
+                self._responder(404, {"message": "not found"})
+            else:
+                self._responder(200, ticket)
+        elif partes == ["chat"]:
+            pagina = self._pagina("chats", query)
+            self._responder(200, [{k: v for k, v in c.items() if k != "_eventos"} for c in pagina])
+        elif len(partes) in (2, 3) and partes[0] == "chat":
+            chat = self.server.chats_por_id.get(partes[1])
+            if self.server.atraso_detalhe:
+                time.sleep(self.server.atraso_detalhe)
+            if chat is None:
+                self._responder(404, {"message": "not found"})
+            elif len(partes) == 3 and partes[2] == "events":
+                self._responder(200, chat["_eventos"])
+            elif len(partes) == 2:
+                self._responder(200, {k: v for k, v in chat.items() if k != "_eventos"})
+            else:
+                self._responder(404, {"message": "not found"})
+        else:
+            self._responder(404, {"message": "not found"})
+
+
+@contextmanager
+def servidor_fake(dados: Optional[Dict[str, List[Dict[str, Any]]]] = None, **opcoes: Any) -> Iterator[FakeOctadesk]:
+    """Sobe o FakeOctadesk numa thread (porta livre) e o encerra ao sair do bloco."""
+    servidor = FakeOctadesk(dados or gerar_dados(), **opcoes)
+    thread = threading.Thread(target=servidor.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield servidor
+    finally:
+        servidor.shutdown()
+        servidor.server_close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="API Octadesk falsa para testes locais")
+    parser.add_argument("--porta", type=int, default=8089)
+    parser.add_argument("--tickets", type=int, default=1000)
+    parser.add_argument("--chats", type=int, default=1000)
+    parser.add_argument("--taxa-500", type=float, default=0.0)
+    parser.add_argument("--taxa-409", type=float, default=0.0)
+    parser.add_argument("--taxa-429", type=float, default=0.0)
+    parser.add_argument("--atraso-pagina", type=float, default=0.0)
+    args = parser.parse_args()
+
+    servidor = FakeOctadesk(
+        gerar_dados(args.tickets, args.chats),
+        porta=args.porta,
+        taxa_500=args.taxa_500,
+        taxa_409=args.taxa_409,
+        taxa_429=args.taxa_429,
+        atraso_pagina=args.atraso_pagina,
+    )
+    print(f"Octadesk falsa em {servidor.base_url} (OCTA_BASE_URL)")
+    servidor.serve_forever()
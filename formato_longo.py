@@ -0,0 +1,143 @@
+"""
+Formato longo dos campos dinâmicos do chat.
+
+No formato padrão ('largo') cada customField e cada atributo de evento vira
+uma coluna da tabela final (chat_cf_*, contact_cf_*, cf_chat_*,
+evt_{tipo}_{chave}) e a tabela cresce para o lado a cada campo novo. Com
+PIPELINE_FORMATO=longo essas colunas saem do join e vão para duas tabelas
+laterais compactas, uma linha por valor preenchido:
+
+    {tabela}_campos   chat_id, number, origem, chave, valor, upload
+    {tabela}_eventos  chat_id, number, tipo, chave, valor, upload
+
+A tabela principal fica só com as colunas fixas (e as do ESQUEMA_CHAT, como
+evt_ticket_ticketNumber, usadas no join). Cada linha lateral tem também uma
+chave_linha (hash de number + origem/tipo + chave), usada no upsert.
+"""
+
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+import config
+from chaves import chave_linha
+from esquema import ESQUEMA_CHAT, ESQUEMA_LONGO, aplicar_esquema
+from sink import Sink, obter_sink
+
+# Prefixo da coluna → origem gravada em {tabela}_campos
+PREFIXOS_CAMPOS = {
+    "chat_cf_": "chat",
+    "contact_cf_": "contato",
+    "cf_chat_": "listagem",
+}
+PREFIXO_EVENTO = "evt_"
+
+
+def usar_formato_longo() -> bool:
+    formato = config.PIPELINE_FORMATO
+    if formato not in ("largo", "longo"):
+        raise RuntimeError(f"PIPELINE_FORMATO inválido: {formato}")
+    return formato == "longo"
+
+
+def _texto(v: Any) -> str:
+    # Texto fica como veio; números, booleanos, listas e dicts viram JSON
+    if isinstance(v, str):
+        return v
+    if isinstance(v, np.generic):
+        v = v.item()
+    return json.dumps(v, ensure_ascii=False, default=str)
+
+
+def _classificar(colunas: List[str]) -> Tuple[Dict[str, Tuple[str, str]], Dict[str, Tuple[str, Optional[str]]]]:
+    """
+    Separa as colunas dinâmicas em {coluna: (origem, chave)} dos campos e
+    {coluna: (tipo, chave)} dos eventos. A marca do evento (evt_{tipo}) fica
+    com chave None; o tipo de um atributo é o menor evt_{tipo} presente que
+    prefixa a coluna, já que tipo e chave podem ter "_".
+    """
+    campos: Dict[str, Tuple[str, str]] = {}
+    eventos: Dict[str, Tuple[str, Optional[str]]] = {}
+    candidatas = [c for c in colunas if isinstance(c, str) and c not in ESQUEMA_CHAT]
+
+    marcas = sorted((c[len(PREFIXO_EVENTO):] for c in candidatas if c.startswith(PREFIXO_EVENTO)), key=len)
+    for coluna in candidatas:
+        for prefixo, origem in PREFIXOS_CAMPOS.items():
+            if coluna.startswith(prefixo):
+                campos[coluna] = (origem, coluna[len(prefixo):])
+                break
+        else:
+            if not coluna.startswith(PREFIXO_EVENTO):
+                continue
+            resto = coluna[len(PREFIXO_EVENTO):]
+            for tipo in marcas:
+                if resto.startswith(f"{tipo}_"):
+                    eventos[coluna] = (tipo, resto[len(tipo) + 1:])
+                    break
+            else:
+                eventos[coluna] = (resto, None)
+    return campos, eventos
+
+
+def _empilhar(df: pd.DataFrame, colunas: Dict[str, Tuple[str, Optional[str]]],
+              nome_grupo: str, upload: datetime) -> pd.DataFrame:
+    """Uma linha (chat_id, number, grupo, chave, valor, upload) por célula preenchida."""
+    saida = ["chat_id", "number", nome_grupo, "chave", "valor", "upload"]
+    if not colunas:
+        return pd.DataFrame(columns=saida + ["chave_linha"])
+
+    nomes = list(colunas)
+    valores = df[nomes].to_numpy(dtype=object)
+    linhas, posicoes = np.nonzero(pd.notna(valores))
+    grupos = np.array([colunas[n][0] for n in nomes], dtype=object)
+    chaves = np.array([colunas[n][1] for n in nomes], dtype=object)
+
+    def coluna_fixa(nome: str) -> Any:
+        return df[nome].to_numpy(dtype=object)[linhas] if nome in df.columns else None
+
+    longo = pd.DataFrame({
+        "chat_id": coluna_fixa("chat_id"),
+        "number": coluna_fixa("number"),
+        nome_grupo: grupos[posicoes],
+        "chave": chaves[posicoes],
+        "valor": [_texto(v) for v in valores[linhas, posicoes]],
+    }, columns=saida[:-1])
+    longo["upload"] = upload
+    longo = aplicar_esquema(longo, ESQUEMA_LONGO)
+    longo["chave_linha"] = chave_linha(longo, ("number", nome_grupo, "chave"))
+    return longo
+
+
+def separar_dinamicas(df_chat: pd.DataFrame,
+                      upload: datetime) -> Tuple[pd.DataFrame, Dict[str, pd.DataFrame]]:
+    """
+    Tira de df_chat as colunas de customFields e eventos e devolve o df só
+    com as colunas fixas e as tabelas laterais {"campos": ..., "eventos": ...}.
+    """
+    campos, eventos = _classificar(list(df_chat.columns))
+    laterais = {
+        "campos": _empilhar(df_chat, campos, "origem", upload),
+        "eventos": _empilhar(df_chat, eventos, "tipo", upload),
+    }
+    return df_chat.drop(columns=[*campos, *eventos]), laterais
+
+
+def anexar_laterais(sink: Sink, laterais: Dict[str, pd.DataFrame], df_upload: pd.DataFrame,
+                    upsert: bool = False) -> None:
+    """
+    Carrega as tabelas laterais em {sink.tabela}_{nome}, só com os chats que
+    sobraram em df_upload depois da verificação de duplicidade (append) ou
+    com upsert pela chave_linha.
+    """
+    numeros = set(df_upload["number"].dropna()) if "number" in df_upload.columns else set()
+    for nome, df in laterais.items():
+        df = df[df["number"].isin(numeros)]
+        if df.empty:
+            continue
+        destino = obter_sink(f"{sink.tabela}_{nome}", sink.tipo)
+        if upsert:
+            destino.upsert(df.reset_index(drop=True))
+        else:
+            destino.anexar(df.reset_index(drop=True))
+        print(f"Tabela {nome}: {len(df)} linhas")
@@ -0,0 +1,40 @@
+import importlib
+import threading
+from types import ModuleType
+from typing import Any, Optional
+
+
+class ModuloSobDemanda:
+    """
+    Referência a um módulo que só é importado no primeiro acesso a um
+    atributo (`pd.DataFrame`, `bigquery.Client`...).
+
+    Serve para tirar dependências pesadas (pandas, google-cloud-bigquery) do
+    caminho de import: quem só usa uma parte do módulo não paga o import
+    das outras. Anotações que citam o módulo precisam de
+    `from __future__ import annotations` para não disparar o import.
+    """
+
+    def __init__(self, nome: str):
+        self._nome = nome
+        self._modulo: Optional[ModuleType] = None
+        self._lock = threading.Lock()
+
+    def _carregar(self) -> ModuleType:
+        if self._modulo is None:
+            with self._lock:
+                if self._modulo is None:
+                    self._modulo = importlib.import_module(self._nome)
+        return self._modulo
+
+    def __getattr__(self, atributo: str) -> Any:
+        return getattr(self._carregar(), atributo)
+
+    def __repr__(self) -> str:
+        estado = "carregado" if self._modulo is not None else "não carregado"
+        return f"<módulo sob demanda {self._nome!r} ({estado})>"
+
+
+def sob_demanda(nome: str) -> ModuloSobDemanda:
+    """Módulo `nome` importado só no primeiro uso."""
+    return ModuloSobDemanda(nome)
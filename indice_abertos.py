@@ -0,0 +1,115 @@
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import AbstractSet, Any, Dict, Iterable, List, Optional
+import config
+from sink import Sink
+
+# Status que tira o ticket da lista de trabalho da atualização de status
+STATUS_FECHADO = "Resolvido"
+
+_lock = threading.Lock()
+
+
+def _aberto(status: Any) -> bool:
+    # Mesmo critério do SELECT (status_ticket != 'Resolvido'): status nulo não entra
+    return isinstance(status, str) and status != STATUS_FECHADO
+
+
+class IndiceAbertos:
+    """
+    Tickets ainda não resolvidos do destino, guardados num JSON local para
+    a atualização de status não varrer a tabela inteira a cada execução.
+
+    O load acrescenta os tickets abertos que carregou e a atualização de
+    status tira os que chegaram a Resolvido. A lista é reconstruída pelo
+    SELECT DISTINCT do destino (Sink.tickets_abertos) quando ainda não
+    existe, a cada PIPELINE_RECONCILIAR_DIAS ou com --reconciliar-indice.
+    Cada destino (tipo + tabela) tem a sua lista no mesmo arquivo.
+    """
+
+    def __init__(self, sink: Sink, tickets: Iterable[str] = (),
+                 reconciliado_em: Optional[str] = None):
+        self.sink = sink
+        self.chave = f"{sink.tipo}:{sink.tabela}"
+        self.tickets = set(tickets)
+        self.reconciliado_em = reconciliado_em
+
+    @staticmethod
+    def _ler_arquivo() -> Dict[str, Any]:
+        caminho = config.PIPELINE_ABERTOS_PATH
+        if not caminho.exists():
+            return {}
+        with open(caminho, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    @classmethod
+    def carregar(cls, sink: Sink) -> "IndiceAbertos":
+        indice = cls(sink)
+        dados = cls._ler_arquivo().get(indice.chave, {})
+        indice.tickets = set(dados.get("tickets", []))
+        indice.reconciliado_em = dados.get("reconciliado_em")
+        return indice
+
+    def salvar(self, incluir: AbstractSet[str] = frozenset(),
+               remover: AbstractSet[str] = frozenset()) -> None:
+        """
+        Grava a lista. Com `incluir`/`remover` a mudança é aplicada sobre a
+        versão em disco, para que instâncias abertas ao mesmo tempo (load e
+        atualização de status em paralelo) não desfaçam uma à outra.
+        """
+        caminho = config.PIPELINE_ABERTOS_PATH
+        with _lock:
+            dados = self._ler_arquivo()
+            if incluir or remover:
+                atual = dados.get(self.chave)
+                if atual is not None:
+                    self.tickets = set(atual.get("tickets", []))
+                    self.reconciliado_em = atual.get("reconciliado_em")
+                self.tickets = (self.tickets | incluir) - remover
+            dados[self.chave] = {"tickets": sorted(self.tickets), "reconciliado_em": self.reconciliado_em}
+            caminho.parent.mkdir(parents=True, exist_ok=True)
+            tmp = caminho.with_suffix(".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(dados, f, ensure_ascii=False)
+            os.replace(tmp, caminho)
+
+    def vencido(self) -> bool:
+        if self.reconciliado_em is None:
+            return True
+        idade = datetime.now(config.TIMEZONE) - datetime.fromisoformat(self.reconciliado_em)
+        return idade > timedelta(days=config.PIPELINE_RECONCILIAR_DIAS)
+
+    def reconciliar(self) -> None:
+        """Reconstrói a lista pelo SELECT DISTINCT no destino."""
+        self.tickets = {str(t) for t in self.sink.tickets_abertos()}
+        self.reconciliado_em = datetime.now(config.TIMEZONE).isoformat()
+        self.salvar()
+        print(f"Índice de tickets abertos reconciliado: {len(self.tickets)} tickets")
+
+    def registrar_upload(self, df: Any) -> None:
+        """Inclui os tickets abertos de um load concluído."""
+        if "n_ticket" not in df.columns or "status_ticket" not in df.columns:
+            return
+        linhas = df[["n_ticket", "status_ticket"]].dropna()
+        novos = {str(n) for n, status in linhas.itertuples(index=False, name=None) if _aberto(status)}
+        if novos:
+            self.salvar(incluir=novos)
+
+    def aplicar_status(self, linhas: List[dict]) -> None:
+        """Tira da lista os tickets que a atualização de status gravou como fechados."""
+        fechados = {str(l["n_ticket"]) for l in linhas if not _aberto(l.get("status_ticket"))}
+        if fechados:
+            self.salvar(remover=fechados)
+
+
+def tickets_abertos(sink: Sink, reconciliar: bool = False) -> List[str]:
+    """
+    Lista de trabalho da atualização de status, lida do índice local; só
+    consulta o destino quando o índice precisa ser reconstruído.
+    """
+    indice = IndiceAbertos.carregar(sink)
+    if reconciliar or indice.vencido():
+        indice.reconciliar()
+    return sorted(indice.tickets)
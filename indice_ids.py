@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional
+import config
+from estado import carregar_estado, atualizar_estado
+from sink import Sink
+
+# Chaves usadas na verificação de duplicidade
+COLUNAS_INDICE = ("number", "n_ticket")
+
+
+def _como_int(valores: Iterable) -> np.ndarray:
+    """Converte para int64 descartando nulos e valores não numéricos ('nan', '')."""
+    serie = pd.to_numeric(pd.Series(list(valores), dtype="object"), errors="coerce").dropna()
+    return serie.astype("int64").to_numpy()
+
+
+class IndiceIds:
+    """
+    Conjunto local das chaves (number, n_ticket) já carregadas no destino.
+
+    Cada coluna é um array int64 ordenado e sem repetição, salvo em .npz;
+    a pertinência é resolvida com `searchsorted` de forma vetorizada. O
+    índice é sincronizado de forma incremental pela coluna `upload` do
+    destino e, periodicamente, reconstruído por completo.
+    """
+
+    def __init__(self, arrays: Optional[Dict[str, np.ndarray]] = None):
+        self.arrays = {c: np.empty(0, dtype="int64") for c in COLUNAS_INDICE}
+        if arrays:
+            self.arrays.update(arrays)
+
+    @classmethod
+    def carregar(cls) -> "IndiceIds":
+        caminho = config.PIPELINE_INDICE_PATH
+        if not caminho.exists():
+            return cls()
+        with np.load(caminho) as dados:
+            return cls({c: dados[c] for c in COLUNAS_INDICE if c in dados.files})
+
+    def salvar(self) -> None:
+        caminho = config.PIPELINE_INDICE_PATH
+        caminho.parent.mkdir(parents=True, exist_ok=True)
+        tmp = caminho.with_name(caminho.stem + ".tmp.npz")
+        np.savez_compressed(tmp, **self.arrays)
+        tmp.replace(caminho)
+
+    def adicionar(self, coluna: str, valores: Iterable) -> None:
+        novos = _como_int(valores)
+        if len(novos):
+            self.arrays[coluna] = np.union1d(self.arrays[coluna], novos)
+
+    def contem(self, coluna: str, serie: pd.Series) -> pd.Series:
+        """Máscara booleana (alinhada a `serie`) dos valores já presentes no índice."""
+        arr = self.arrays[coluna]
+        numeros = pd.to_numeric(serie, errors="coerce")
+        validos = numeros.notna().to_numpy()
+        mascara = np.zeros(len(serie), dtype=bool)
+        if len(arr) and validos.any():
+            vals = numeros[validos].astype("int64").to_numpy()
+            pos = np.searchsorted(arr, vals)
+            pos_clip = np.minimum(pos, len(arr) - 1)
+            mascara[validos] = (pos < len(arr)) & (arr[pos_clip] == vals)
+        return pd.Series(mascara, index=serie.index)
+
+    def sincronizar(self, sink: Sink, completo: bool = False) -> None:
+        """
+        Atualiza o índice a partir do destino. Incremental: só linhas com
+        `upload` posterior ao último já visto (lido do destino ou de um load
+        deste pipeline). Completo: reconstrói do zero (também acontece sozinho
+        a cada PIPELINE_RECONCILIAR_DIAS).
+        """
+        meta = carregar_estado().get("indice_ids", {})
+        ultimo_upload = meta.get("ultimo_upload")
+        ultima_reconciliacao = meta.get("ultima_reconciliacao")
+        agora = datetime.now(config.TIMEZONE)
+
+        vencida = (ultima_reconciliacao is None or
+                   agora - datetime.fromisoformat(ultima_reconciliacao) > timedelta(days=config.PIPELINE_RECONCILIAR_DIAS))
+        completo = completo or vencida or ultimo_upload is None
+
+        df = sink.ler_chaves(None if completo else datetime.fromisoformat(ultimo_upload))
+        if completo:
+            self.arrays = {c: np.empty(0, dtype="int64") for c in COLUNAS_INDICE}
+        for coluna in COLUNAS_INDICE:
+            if coluna in df.columns:
+                self.adicionar(coluna, df[coluna].dropna().unique())
+
+        # O watermark vem do que foi lido do destino, nunca do relógio local
+        if not df.empty and df["upload"].notna().any():
+            ultimo_upload = pd.Timestamp(df["upload"].max()).isoformat()
+        meta.update({"ultimo_upload": ultimo_upload})
+        if completo:
+            meta["ultima_reconciliacao"] = agora.isoformat()
+            print(f"Índice de ids reconciliado: {', '.join(f'{c}={len(a)}' for c, a in self.arrays.items())}")
+        atualizar_estado("indice_ids", meta)
+        self.salvar()
+
+    def registrar_upload(self, df: pd.DataFrame) -> None:
+        """Inclui as chaves de um load concluído e avança o último `upload` visto pelo do lote."""
+        for coluna in COLUNAS_INDICE:
+            if coluna in df.columns:
+                self.adicionar(coluna, df[coluna].dropna().unique())
+        self.salvar()
+        if "upload" not in df.columns or not df["upload"].notna().any():
+            return
+        upload = pd.Timestamp(df["upload"].max())
+        meta = carregar_estado().get("indice_ids", {})
+        if meta.get("ultimo_upload") is None or upload > pd.Timestamp(meta["ultimo_upload"]):
+            meta["ultimo_upload"] = upload.isoformat()
+            atualizar_estado("indice_ids", meta)
@@ -0,0 +1,97 @@
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+# Status que indicam que estamos acima do limite da API
+STATUS_LIMITE = (429, 409)
+
+
+def segundos_retry_after(valor: Optional[str]) -> Optional[float]:
+    """Converte o header Retry-After (segundos ou data HTTP) em segundos."""
+    if not valor:
+        return None
+    try:
+        return max(0.0, float(valor))
+    except ValueError:
+        pass
+    try:
+        quando = parsedate_to_datetime(valor)
+    except (TypeError, ValueError):
+        return None
+    if quando.tzinfo is None:
+        quando = quando.replace(tzinfo=timezone.utc)
+    return max(0.0, (quando - datetime.now(timezone.utc)).total_seconds())
+
+
+class LimitadorAdaptativo:
+    """
+    Token bucket compartilhado por todas as threads que falam com a API.
+
+    Começa em `rps` requisições por segundo. A cada 429/409 a taxa cai pela
+    metade (até `rps_min`) e um Retry-After pausa todas as threads pelo tempo
+    pedido. Depois de `janela_saudavel` respostas boas seguidas a taxa sobe
+    `incremento` (até `rps_max`). O tempo total gasto esperando fica em
+    `tempo_throttled`.
+    """
+
+    def __init__(self,
+                 rps: float,
+                 rps_min: float = 0.5,
+                 rps_max: Optional[float] = None,
+                 incremento: float = 0.5,
+                 janela_saudavel: int = 20):
+        self.rps = rps
+        self.rps_min = rps_min
+        self.rps_max = rps_max or rps
+        self.incremento = incremento
+        self.janela_saudavel = janela_saudavel
+
+        self.tempo_throttled = 0.0
+        self.reducoes = 0
+        self._tokens = 1.0
+        self._ultimo = time.monotonic()
+        self._pausa_ate = 0.0
+        self._saudaveis = 0
+        self._lock = threading.Lock()
+
+    def adquirir(self) -> None:
+        """Bloqueia até haver um token disponível."""
+        while True:
+            with self._lock:
+                agora = time.monotonic()
+                self._tokens = min(max(1.0, self.rps),
+                                   self._tokens + (agora - self._ultimo) * self.rps)
+                self._ultimo = agora
+
+                if agora < self._pausa_ate:
+                    espera = self._pausa_ate - agora
+                elif self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                else:
+                    espera = (1.0 - self._tokens) / self.rps
+                self.tempo_throttled += espera
+            time.sleep(espera)
+
+    def registrar(self, status: int, retry_after: Optional[str] = None) -> None:
+        """Ajusta a taxa conforme o status (e Retry-After) da resposta."""
+        with self._lock:
+            if status in STATUS_LIMITE:
+                self._saudaveis = 0
+                self.reducoes += 1
+                self.rps = max(self.rps_min, self.rps / 2)
+                self._tokens = min(self._tokens, 0.0)
+                pausa = segundos_retry_after(retry_after)
+                if pausa:
+                    self._pausa_ate = max(self._pausa_ate, time.monotonic() + pausa)
+            elif status < 500:
+                self._saudaveis += 1
+                if self._saudaveis >= self.janela_saudavel:
+                    self._saudaveis = 0
+                    self.rps = min(self.rps_max, self.rps + self.incremento)
+
+    def resumo(self) -> str:
+        return (f"Rate limit Octadesk: {self.tempo_throttled:.1f}s em espera (soma das threads), "
+                f"{self.reducoes} reduções, taxa final {self.rps:.2f} req/s")
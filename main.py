@@ -1,156 +1,290 @@
 import sys
-import json
+import atexit
+import threading
+import argparse
 import pandas as pd
-import uuid
 import pytz
-from pandas import json_normalize
 from datetime import datetime, timezone, timedelta
-from google.oauth2 import service_account
-from pathlib import Path
-from requests.exceptions import HTTPError
-from time import sleep
-from typing import List, Tuple
-from google.cloud import bigquery
-from google.cloud.exceptions import NotFound
-from google.api_core.exceptions import NotFound
-from manutencao import duplicidade_no_df
-from config import OCTA_BASE_URL, OCTA_HEADERS, CONFIG_PATH, SRC_TABLE_SAC_OCTADESK, BQ
+from manutencao import duplicidade_no_df, sincronizar_indice
+from sink import carga_upsert, obter_sink
+from chaves import COLUNAS_LINHA
+from indice_ids import IndiceIds
+from indice_abertos import IndiceAbertos, tickets_abertos
+from backfill import fetch_backfill
+from estado import obter_watermark, salvar_watermark, fim_da_execucao, concluir_execucao
+from cache_local import obter_cache
+from checkpoint import limpar_checkpoints
+from octadesk import obter_cliente
+from metricas import obter_metricas
+from formato_longo import anexar_laterais, usar_formato_longo
+from pipeline import Estagio, Pipeline
+from config import (
+    OCTA_BASE_URL,
+    OCTA_HEADERS,
+    PIPELINE_SOBREPOSICAO_HORAS,
+    validar_octadesk
+)
 from ticket import (
-    format_iso,
     split_windows,
     fetch_all_tickets,
-    extrair_custom_ticket,
-    update_ticket_status_by_ticket_id
+    atualizar_status_em_lote
 )
-from chat import (
-    merge_ou_concat_campo_ticket,
-    padronizar_col,
-    fetch_all_chats
+from chat import fetch_all_chats
+from etapas import (
+    preparar_tickets,
+    preparar_chats,
+    montar_upload,
+    extrair_para_staging,
+    extrair_em_pipeline,
+    iterar_lotes_upload
 )
 
 
-with open(CONFIG_PATH) as f:
-    config = json.load(f)
+parser = argparse.ArgumentParser(description="Pipeline Octadesk → BigQuery")
+modo = parser.add_mutually_exclusive_group()
+modo.add_argument("--backfill", action="store_true",
+                  help="Busca o período em janelas paralelas (carga histórica)")
+modo.add_argument("--incremental", action="store_true",
+                  help="Busca a partir do último createdAt carregado (watermark local)")
+parser.add_argument("--inicio", default="2024-01-01",
+                    help="Data inicial do backfill (YYYY-MM-DD)")
+parser.add_argument("--janela-dias", type=int, default=7,
+                    help="Tamanho de cada janela do backfill, em dias")
+parser.add_argument("--reconciliar-indice", action="store_true",
+                    help="Reconstrói os índices locais (ids e tickets abertos) a partir do destino")
+parser.add_argument("--streaming", action="store_true",
+                    help="Grava as páginas em disco e processa em partes (memória limitada)")
+parser.add_argument("--pipeline", action="store_true",
+                    help="Como --streaming, com extração, join, load e atualização de status em estágios simultâneos")
+args = parser.parse_args()
+validar_octadesk()
 
 # Define o timezone BRT 
 br_tz = timezone(timedelta(hours=-3))
-# Define o fim do período como o momento "agora" no fuso BRT, removendo microssegundos
-end_dt   = datetime.now(br_tz).replace(microsecond=0)
-#start_dt = datetime(2024, 1, 1, tzinfo=br_tz)
-start_dt = datetime.now(br_tz) - timedelta(days=5)
+# Define o fim do período como o momento "agora" no fuso BRT, removendo microssegundos.
+# Se a execução anterior deste modo falhou antes do load, o fim dela é reaproveitado
+# (o intervalo faz parte da chave dos checkpoints de paginação)
+modo_execucao = "backfill" if args.backfill else "incremental" if args.incremental else "padrao"
+end_dt   = fim_da_execucao(modo_execucao, datetime.now(br_tz).replace(microsecond=0))
+if args.backfill:
+    start_dt = datetime.strptime(args.inicio, "%Y-%m-%d").replace(tzinfo=br_tz)
+else:
+    start_dt = end_dt - timedelta(days=5)
 # Usamos a função split_windows, que retorna uma lista de tuplas (início, fim) para cada janela
-windows = split_windows(start_dt, end_dt, timedelta(days=7))
-
-df_ticket = fetch_all_tickets(start_dt, end_dt)
-#print(df_ticket.columns.tolist())
-rename_map = {
-    'id': 'uuid',
-    'number': 'n_ticket',
-    'summary': 'titulo',
-    'tags': 'tags_ticket',
-    'createdAt': 'createdAt',
-    'updatedAt': 'updatedAt',
-    'status.name': 'status_ticket',
-    'channel.name': 'channel_ticket',
-    'requester.name': 'autor_ticket',
-    'requester.email': 'email_ticket',
-    'group.id': 'grupo_responsavel_ticket',
-    'lastHumanInteraction.propertiesChanges.status': 'status_ticket2',
-    'customField': 'campo_custom_ticket',
-    'requester.customField': 'campo_custom_ticket2'
-
-}
-
-df_chat = fetch_all_chats(
-    start_dt,
-    end_dt,
-    base_url=OCTA_BASE_URL,
-    headers=OCTA_HEADERS,
-    limit=100,
-    max_retries=3
-)
-
-if df_ticket.empty and df_chat.empty:
-    print("Nenhum dado, interrompendo execução.")
-    sys.exit(0)
-
-if df_ticket.empty and not df_chat.empty:
-    print("df_ticket vazio")
-    df_ticket = pd.DataFrame(columns=list(rename_map.keys()))
-
-if df_chat.empty and not df_ticket.empty:
-    print("df_chat vazio")
-    df_chat = pd.DataFrame(columns=['number'])
-
-for col in rename_map.keys():
-    if col not in df_ticket.columns:
-        df_ticket[col] = pd.NA
-
-df_ticket_filtro1 = df_ticket[list(rename_map.keys())].rename(columns=rename_map)
-df_custom_ticket = extrair_custom_ticket(df_ticket_filtro1)
-df_ticket_final = df_ticket_filtro1.merge(df_custom_ticket, on="uuid", how="left")
-   
-if 'contact_cf_n_mero_do_ticket	' not in df_chat:
-    df_chat['contact_cf_n_mero_do_ticket'] = ''
-    
-df_chat['number'] = df_chat['number'].astype(str)
-df_chat['contact_cf_n_mero_do_ticket'] = df_chat['contact_cf_n_mero_do_ticket'].astype(str)
-df_ticket_final['n_ticket'] = df_ticket_final['n_ticket'].astype(str)
-
-df_upload = merge_ou_concat_campo_ticket(
-    df_chat,
-    df_ticket_final
-)
+windows = split_windows(start_dt, end_dt, timedelta(days=args.janela_dias))
 
-
-df_upload['uuid'] = df_upload['uuid'].apply(
-    lambda x: x if pd.notna(x) and str(x).strip() != '' else str(uuid.uuid4())
-)
+# No modo incremental cada entidade parte do seu watermark menos uma sobreposição
+start_ticket_dt = start_chat_dt = start_dt
+if args.incremental:
+    sobreposicao = timedelta(hours=PIPELINE_SOBREPOSICAO_HORAS)
+    wm_ticket = obter_watermark("tickets")
+    wm_chat   = obter_watermark("chats")
+    if wm_ticket:
+        start_ticket_dt = wm_ticket - sobreposicao
+    if wm_chat:
+        start_chat_dt = wm_chat - sobreposicao
+    print(f"Incremental: tickets desde {start_ticket_dt}, chats desde {start_chat_dt}")
 
 fuso_brasilia = pytz.timezone('America/Sao_Paulo')
 data_hora_atual = datetime.now(fuso_brasilia)
-df_upload['upload'] = data_hora_atual
 
+# Tempo, linhas e memória de cada etapa; relatório gravado no fim (mesmo em falha)
+metricas = obter_metricas()
 
-creds = service_account.Credentials.from_service_account_file(CONFIG_PATH)
-client = bigquery.Client(credentials=creds, project=creds.project_id)
-df_upload["id"] = df_upload["id"].astype(str)
 
-table_id = "integracoes-infinit.DataLake_2025.Octadesk"
+def gravar_relatorio() -> None:
+    cache = obter_cache()
+    limitador = obter_cliente().limitador
+    metricas.definir("cache_hits", cache.hits)
+    metricas.definir("cache_misses", cache.misses)
+    metricas.definir("octadesk_tempo_throttled_segundos", limitador.tempo_throttled)
+    metricas.definir("octadesk_reducoes_taxa", limitador.reducoes)
+    print(metricas.resumo())
+    print(f"Relatório da execução: {metricas.gravar()}")
 
-df_upload = padronizar_col(df_upload)
 
-df_upload = duplicidade_no_df(df_upload, table_id)
+atexit.register(gravar_relatorio)
 
-df_upload = df_upload.loc[:, ~df_upload.columns.duplicated()].copy()
+# Destino do load (BigQuery ou banco local, conforme PIPELINE_SINK)
+sink = obter_sink()
+# Formato longo: customFields e eventos do chat vão para tabelas laterais
+laterais = {} if usar_formato_longo() else None
+# Upsert: lotes com MERGE pela chave_linha, sem a verificação de duplicidade antes
+upsert = carga_upsert()
 
-try:
-    client.get_table(table_id)
-except NotFound:
-    schema = [
-        bigquery.SchemaField("chat_id", "STRING"),
-        bigquery.SchemaField("n_ticket", "STRING"),
-    ]
-    client.create_table(bigquery.Table(table_id, schema=schema))
 
-job_config = bigquery.LoadJobConfig(
-    write_disposition=bigquery.WriteDisposition.WRITE_APPEND,
-    schema_update_options=[bigquery.SchemaUpdateOption.ALLOW_FIELD_ADDITION]
-)
+def carregar(df_upload: pd.DataFrame, laterais_lote=None) -> None:
+    """Grava um lote (append ou upsert) e as suas tabelas laterais."""
+    if upsert:
+        sink.upsert(df_upload, legado=COLUNAS_LINHA)
+    else:
+        sink.anexar(df_upload)
+    if laterais_lote is not None:
+        anexar_laterais(sink, laterais_lote, df_upload, upsert=upsert)
+
+
+# Mensagens da atualização de status (no modo pipeline, feita junto com o load)
+mensagens = None
+
+if args.streaming or args.pipeline:
+    # Páginas vão para partes NDJSON em disco; o join e o load são feitos por bucket
+    extrair = extrair_em_pipeline if args.pipeline else extrair_para_staging
+    with metricas.etapa("extracao") as etapa:
+        # Com --backfill o período é percorrido nas mesmas janelas do modo em memória
+        janela = timedelta(days=args.janela_dias) if args.backfill else None
+        stg_tickets, stg_chats, max_created = extrair(start_ticket_dt, start_chat_dt, end_dt, janela)
+        etapa.linhas_saida = stg_tickets.linhas + stg_chats.linhas
+
+    if stg_tickets.linhas == 0 and stg_chats.linhas == 0:
+        print("Nenhum dado, interrompendo execução.")
+        limpar_checkpoints()
+        concluir_execucao(modo_execucao)
+        sys.exit(0)
+
+    indice = None
+    if not upsert:
+        with metricas.etapa("indice"):
+            indice = sincronizar_indice(sink, reconciliar=args.reconciliar_indice)
+
+    abertos = IndiceAbertos.carregar(sink)
+    contagem = {"entrada": 0, "saida": 0}
+    contagem_lock = threading.Lock()
+
+    def carregar_bucket(df_upload: pd.DataFrame, laterais_bucket=None) -> None:
+        entrada = len(df_upload)
+        if indice is not None:
+            with metricas.cronometrar("upload_bucket_segundos", parte="duplicidade"):
+                df_upload = duplicidade_no_df(df_upload, sink, indice=indice)
+        if not df_upload.empty:
+            with metricas.cronometrar("upload_bucket_segundos", parte="load"):
+                carregar(df_upload, laterais_bucket)
+            if indice is not None:
+                indice.registrar_upload(df_upload)
+            abertos.registrar_upload(df_upload)
+        with contagem_lock:
+            contagem["entrada"] += entrada
+            contagem["saida"] += len(df_upload)
+
+    lotes = iterar_lotes_upload(stg_tickets, stg_chats, data_hora_atual, formato_longo=laterais is not None)
+    with metricas.etapa("upload") as etapa:
+        if args.pipeline:
+            # O join do próximo bucket roda durante o load do anterior, e a
+            # atualização de status dos tickets que já estavam abertos roda junto.
+            # Lotes de upsert são idempotentes e podem ser carregados dois a dois
+            tickets_list = tickets_abertos(sink, reconciliar=args.reconciliar_indice)
+            load = Estagio("load", lambda lote: carregar_bucket(*lote), workers=2 if upsert else 1)
+            resultados = (Pipeline()
+                          .cadeia("join", lotes, load)
+                          .tarefa("status", lambda: atualizar_status_em_lote(tickets_list, sink=sink))
+                          .executar())
+            mensagens = resultados["status"]
+        else:
+            for df_upload, laterais_bucket in lotes:
+                carregar_bucket(df_upload, laterais_bucket)
+        etapa.linhas_entrada, etapa.linhas_saida = contagem["entrada"], contagem["saida"]
+
+    stg_tickets.remover()
+    stg_chats.remover()
+    print(f"Upload feito ({contagem['saida']} linhas)")
+
+else:
+    if args.backfill:
+        with metricas.etapa("extracao_backfill") as etapa:
+            df_ticket, df_chat = fetch_backfill(
+                windows,
+                fetch_tickets=lambda s, e: fetch_all_tickets(s, e, raise_on_error=True),
+                fetch_chats=lambda s, e: fetch_all_chats(
+                    s,
+                    e,
+                    base_url=OCTA_BASE_URL,
+                    headers=OCTA_HEADERS,
+                    limit=100,
+                    max_retries=3
+                )
+            )
+            etapa.linhas_saida = len(df_ticket) + len(df_chat)
+    else:
+        with metricas.etapa("extracao_tickets") as etapa:
+            # Falha na paginação interrompe a execução antes do load: as páginas
+            # já baixadas ficam no checkpoint para a próxima execução continuar
+            df_ticket = fetch_all_tickets(start_ticket_dt, end_dt, raise_on_error=True)
+            etapa.linhas_saida = len(df_ticket)
+        #print(df_ticket.columns.tolist())
+        with metricas.etapa("extracao_chats") as etapa:
+            df_chat = fetch_all_chats(
+                start_chat_dt,
+                end_dt,
+                base_url=OCTA_BASE_URL,
+                headers=OCTA_HEADERS,
+                limit=100,
+                max_retries=3
+            )
+            etapa.linhas_saida = len(df_chat)
+
+    if df_ticket.empty and df_chat.empty:
+        print("Nenhum dado, interrompendo execução.")
+        limpar_checkpoints()
+        concluir_execucao(modo_execucao)
+        sys.exit(0)
+
+    # Maior createdAt de cada entidade; só vira watermark depois do load
+    max_created = {
+        entidade: pd.to_datetime(df["createdAt"], utc=True, errors="coerce").max()
+        for entidade, df in (("tickets", df_ticket), ("chats", df_chat))
+        if "createdAt" in df.columns
+    }
+
+    if df_ticket.empty and not df_chat.empty:
+        print("df_ticket vazio")
+
+    if df_chat.empty and not df_ticket.empty:
+        print("df_chat vazio")
+
+    with metricas.etapa("preparacao") as etapa:
+        etapa.linhas_entrada = len(df_ticket) + len(df_chat)
+        df_ticket_final = preparar_tickets(df_ticket)
+        df_chat = preparar_chats(df_chat)
+        etapa.linhas_saida = len(df_ticket_final) + len(df_chat)
+
+    with metricas.etapa("join") as etapa:
+        etapa.linhas_entrada = len(df_ticket_final) + len(df_chat)
+        df_upload = montar_upload(df_chat, df_ticket_final, data_hora_atual, laterais=laterais)
+        etapa.linhas_saida = len(df_upload)
+
+    if not upsert:
+        with metricas.etapa("duplicidade") as etapa:
+            etapa.linhas_entrada = len(df_upload)
+            df_upload = duplicidade_no_df(df_upload, sink, reconciliar=args.reconciliar_indice)
+            etapa.linhas_saida = len(df_upload)
+
+    with metricas.etapa("load") as etapa:
+        etapa.linhas_entrada = etapa.linhas_saida = len(df_upload)
+        carregar(df_upload, laterais)
+
+    print("Upload feito")
+
+    if not upsert:
+        IndiceIds.carregar().registrar_upload(df_upload)
+    IndiceAbertos.carregar(sink).registrar_upload(df_upload)
+
+for entidade, valor in max_created.items():
+    if pd.notna(valor):
+        salvar_watermark(entidade, valor.to_pydatetime())
 
-job = client.load_table_from_dataframe(df_upload, table_id, job_config=job_config)
-job.result()
+# Dados carregados: as páginas guardadas para retomada não são mais necessárias
+limpar_checkpoints()
+concluir_execucao(modo_execucao)
 
-print("Upload feito")
+if mensagens is None:
+    with metricas.etapa("status") as etapa:
+        tickets_list = tickets_abertos(sink, reconciliar=args.reconciliar_indice)
+        etapa.linhas_entrada = len(tickets_list)
 
-sql = f"""
-SELECT DISTINCT n_ticket
-FROM {SRC_TABLE_SAC_OCTADESK}
-WHERE (n_ticket is not null) AND (status_ticket != 'Resolvido')
-"""
+        mensagens = atualizar_status_em_lote(tickets_list, sink=sink)
+        etapa.linhas_saida = sum(1 for m in mensagens if not m.startswith("Erro"))
 
-df_tabela = BQ.query(sql).to_dataframe()
-tickets_list = df_tabela["n_ticket"].tolist()
+for mensagem in mensagens:
+    print(mensagem)
 
-for ticket in tickets_list:
-    print(update_ticket_status_by_ticket_id(ticket))
+print(obter_cache().resumo())
+print(obter_cliente().limitador.resumo())
@@ -1,24 +1,44 @@
-import json
-from pathlib import Path
 import pandas as pd
-from google.cloud import bigquery
-from google.oauth2 import service_account
+from typing import Optional
+from indice_ids import COLUNAS_INDICE, IndiceIds
+from sink import Sink, obter_sink
+
+def sincronizar_indice(sink: Optional[Sink] = None, reconciliar: bool = False) -> IndiceIds:
+    """Carrega o índice local de ids e o atualiza a partir do destino (obter_sink() por padrão)."""
+    indice = IndiceIds.carregar()
+    indice.sincronizar(sink or obter_sink(), completo=reconciliar)
+    return indice
+
+def duplicidade_no_df(df: pd.DataFrame, sink: Optional[Sink] = None, reconciliar: bool = False,
+                      indice: Optional[IndiceIds] = None) -> pd.DataFrame:
+    """
+    Remove do df as linhas cujo number/n_ticket já existe no destino,
+    consultando o índice local de ids (indice_ids.IndiceIds). O índice é
+    atualizado só com as linhas novas do destino; `reconciliar=True` força
+    a reconstrução completa. Passe `indice` já sincronizado para filtrar
+    vários lotes sem consultar o destino de novo.
+    """
+    if indice is None:
+        indice = sincronizar_indice(sink, reconciliar)
 
-# Carrega o config.json que está na mesma pasta deste script
-config_path = Path(__file__).parent / "config.json"
-with open(config_path, "r", encoding="utf-8") as f:
-    config = json.load(f)
+    original_len = len(df)
+    df_filtrado = df
+    for coluna in COLUNAS_INDICE:
+        if coluna in df_filtrado.columns:
+            df_filtrado = df_filtrado[~indice.contem(coluna, df_filtrado[coluna])]
+
+    removidas = original_len - len(df_filtrado)
+    print(f"{removidas} linhas excluídas")
 
-def duplicidade_no_df(df: pd.DataFrame, nome_tabela: str) -> pd.DataFrame:
-    # Cria cliente BigQuery usando credenciais do config.json
-    key_info = config  # dict com as credenciais da service-account
-    creds = service_account.Credentials.from_service_account_info(key_info)
-    client = bigquery.Client(credentials=creds, project=creds.project_id)
+    return df_filtrado.reset_index(drop=True)
 
+def duplicidade_via_consulta(df: pd.DataFrame, sink: Optional[Sink] = None) -> pd.DataFrame:
+    """Verificação antiga: consulta o destino (IN UNNEST no BigQuery) a cada chamada."""
+    sink = sink or obter_sink()
     original_len = len(df)
     df_filtrado = df.copy()
 
-    # Para cada coluna, faz consulta parametrizada de acordo com o tipo
+    # Para cada coluna, consulta quais valores já existem no destino
     for coluna in ('number', 'n_ticket'):
         if coluna not in df_filtrado.columns:
             continue
@@ -28,30 +48,7 @@ def duplicidade_no_df(df: pd.DataFrame, nome_tabela: str) -> pd.DataFrame:
         if not valores:
             continue
 
-        # Detecta tipo de BigQuery e converte valores
-        if coluna == 'number':
-            param_type = 'INT64'
-            valores = [int(v) for v in valores]
-        else:
-            param_type = 'STRING'
-
-        # Monta a query
-        query = f"""
-            SELECT {coluna}
-            FROM `{nome_tabela}`
-            WHERE {coluna} IN UNNEST(@valores)
-        """
-
-        # Configura parâmetros tipados
-        job_config = bigquery.QueryJobConfig(
-            query_parameters=[
-                bigquery.ArrayQueryParameter("valores", param_type, valores)
-            ]
-        )
-
-        # Executa consulta e obtém valores existentes
-        resultado = client.query(query, job_config=job_config).result()
-        existentes = {row[coluna] for row in resultado}
+        existentes = sink.existentes(coluna, valores)
 
         # Filtra DataFrame removendo duplicados
         df_filtrado = df_filtrado[~df_filtrado[coluna].isin(existentes)]
@@ -59,4 +56,4 @@ def duplicidade_no_df(df: pd.DataFrame, nome_tabela: str) -> pd.DataFrame:
     removidas = original_len - len(df_filtrado)
     print(f"{removidas} linhas excluídas")
 
-    return df_filtrado.reset_index(drop=True)
+    return df_filtrado.reset_index(drop=True)
\ No newline at end of file
@@ -0,0 +1,320 @@
+"""
+Métricas da execução do pipeline.
+
+Contadores (requisições por status, linhas, bytes), histogramas de latência
+(chamadas à Octadesk e ao destino, duração das etapas) e um registro por
+etapa do main.py com tempo, linhas de entrada/saída e pico de memória. No
+fim da execução vira um relatório JSON e, opcionalmente, um arquivo no
+formato texto do Prometheus (textfile collector do node_exporter).
+
+Etapas listadas em PIPELINE_PERFIL (ou "*") também são perfiladas com
+cProfile ou, se PIPELINE_PERFILADOR=pyinstrument e o pacote estiver
+instalado, com pyinstrument. Os dois só enxergam a thread que abriu a
+etapa; o trabalho feito nos pools aparece como espera.
+"""
+
+import bisect
+import functools
+import json
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import config
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Limites (s) dos buckets de latência, como nos histogramas do Prometheus
+LIMITES_LATENCIA: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+Rotulos = Tuple[Tuple[str, str], ...]
+
+
+def pico_rss_mb() -> Optional[float]:
+    """Maior RSS do processo até agora (MB), ou None onde não há `resource`."""
+    if resource is None:
+        return None
+    # ru_maxrss vem em KB no Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _arredondar(valor: Optional[float]) -> Optional[float]:
+    return round(valor, 6) if valor is not None else None
+
+
+class Histograma:
+    def __init__(self, limites: Tuple[float, ...] = LIMITES_LATENCIA):
+        self.limites = limites
+        self.contagens = [0] * (len(limites) + 1)
+        self.total = 0
+        self.soma = 0.0
+        self.maximo = 0.0
+
+    def observar(self, valor: float) -> None:
+        self.contagens[bisect.bisect_left(self.limites, valor)] += 1
+        self.total += 1
+        self.soma += valor
+        self.maximo = max(self.maximo, valor)
+
+    def quantil(self, q: float) -> Optional[float]:
+        """Estimativa do quantil `q` pelo limite superior do bucket."""
+        if not self.total:
+            return None
+        alvo = q * self.total
+        acumulado = 0
+        for limite, contagem in zip(self.limites, self.contagens):
+            acumulado += contagem
+            if acumulado >= alvo:
+                return min(limite, self.maximo)
+        return self.maximo
+
+    def como_dict(self) -> Dict[str, Any]:
+        return {
+            "total": self.total,
+            "soma": round(self.soma, 6),
+            "media": round(self.soma / self.total, 6) if self.total else None,
+            **{f"p{int(q * 100)}": _arredondar(self.quantil(q)) for q in (0.5, 0.95, 0.99)},
+            "max": round(self.maximo, 6),
+        }
+
+
+class RegistroEtapa:
+    """Medidas de uma etapa; `linhas_entrada`/`linhas_saida` são preenchidas por quem a executa."""
+
+    def __init__(self, nome: str):
+        self.nome = nome
+        self.inicio = datetime.now(timezone.utc)
+        self.segundos: Optional[float] = None
+        self.linhas_entrada: Optional[int] = None
+        self.linhas_saida: Optional[int] = None
+        self.pico_rss_mb: Optional[float] = None
+        self.erro: Optional[str] = None
+
+    def como_dict(self) -> Dict[str, Any]:
+        return {
+            "etapa": self.nome,
+            "inicio": self.inicio.isoformat(timespec="seconds"),
+            "segundos": round(self.segundos, 3) if self.segundos is not None else None,
+            "linhas_entrada": self.linhas_entrada,
+            "linhas_saida": self.linhas_saida,
+            "pico_rss_mb": round(self.pico_rss_mb, 1) if self.pico_rss_mb is not None else None,
+            "erro": self.erro,
+        }
+
+
+class Metricas:
+    def __init__(self):
+        self.execucao = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        self._inicio = time.perf_counter()
+        self._lock = threading.Lock()
+        self._contadores: Dict[Tuple[str, Rotulos], float] = {}
+        self._valores: Dict[Tuple[str, Rotulos], float] = {}
+        self._histogramas: Dict[Tuple[str, Rotulos], Histograma] = {}
+        self.etapas: List[RegistroEtapa] = []
+        self._perfilando = False
+
+    @staticmethod
+    def _chave(nome: str, rotulos: Dict[str, Any]) -> Tuple[str, Rotulos]:
+        return nome, tuple(sorted((k, str(v)) for k, v in rotulos.items()))
+
+    def contar(self, nome: str, valor: float = 1, **rotulos: Any) -> None:
+        chave = self._chave(nome, rotulos)
+        with self._lock:
+            self._contadores[chave] = self._contadores.get(chave, 0) + valor
+
+    def definir(self, nome: str, valor: float, **rotulos: Any) -> None:
+        """Valor instantâneo (gauge), ex.: hits do cache no fim da execução."""
+        with self._lock:
+            self._valores[self._chave(nome, rotulos)] = valor
+
+    def observar(self, nome: str, valor: float, **rotulos: Any) -> None:
+        chave = self._chave(nome, rotulos)
+        with self._lock:
+            if chave not in self._histogramas:
+                self._histogramas[chave] = Histograma()
+            self._histogramas[chave].observar(valor)
+
+    @contextmanager
+    def cronometrar(self, nome: str, **rotulos: Any) -> Iterator[None]:
+        """Observa no histograma `nome` a duração do bloco (inclusive quando ele falha)."""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(nome, time.perf_counter() - t0, **rotulos)
+
+    @contextmanager
+    def etapa(self, nome: str) -> Iterator[RegistroEtapa]:
+        """
+        Mede uma etapa do pipeline: duração, pico de memória ao final e,
+        se pedido em PIPELINE_PERFIL, o perfil de CPU da thread atual.
+        """
+        registro = RegistroEtapa(nome)
+        t0 = time.perf_counter()
+        try:
+            with self._perfil(nome):
+                yield registro
+        except BaseException as err:
+            registro.erro = f"{type(err).__name__}: {err}"
+            raise
+        finally:
+            registro.segundos = time.perf_counter() - t0
+            registro.pico_rss_mb = pico_rss_mb()
+            with self._lock:
+                self.etapas.append(registro)
+            self.observar("etapa_segundos", registro.segundos, etapa=nome)
+
+    @contextmanager
+    def _perfil(self, etapa: str) -> Iterator[None]:
+        pedidas = {e.strip() for e in config.PIPELINE_PERFIL.split(",") if e.strip()}
+        if self._perfilando or not (pedidas & {etapa, "*"}):
+            yield
+            return
+
+        destino = config.PIPELINE_RELATORIO_DIR / "perfis"
+        destino.mkdir(parents=True, exist_ok=True)
+        base = destino / f"{self.execucao}-{etapa}"
+        perfilador = None
+        if config.PIPELINE_PERFILADOR == "pyinstrument":
+            try:
+                from pyinstrument import Profiler
+                perfilador = Profiler()
+            except ImportError:
+                print("pyinstrument não instalado; usando cProfile")
+
+        self._perfilando = True
+        try:
+            if perfilador is not None:
+                perfilador.start()
+                try:
+                    yield
+                finally:
+                    perfilador.stop()
+                    caminho = base.with_suffix(".html")
+                    caminho.write_text(perfilador.output_html(), encoding="utf-8")
+            else:
+                import cProfile
+                perfilador = cProfile.Profile()
+                perfilador.enable()
+                try:
+                    yield
+                finally:
+                    perfilador.disable()
+                    caminho = base.with_suffix(".prof")
+                    perfilador.dump_stats(caminho)
+            print(f"Perfil da etapa {etapa}: {caminho}")
+        finally:
+            self._perfilando = False
+
+    def relatorio(self) -> Dict[str, Any]:
+        """Relatório estruturado da execução (serializável em JSON)."""
+        def como_lista(itens):
+            return [{"nome": nome, "rotulos": dict(rotulos), "valor": valor}
+                    for (nome, rotulos), valor in sorted(itens)]
+
+        with self._lock:
+            return {
+                "execucao": self.execucao,
+                "segundos": round(time.perf_counter() - self._inicio, 3),
+                "pico_rss_mb": pico_rss_mb(),
+                "etapas": [e.como_dict() for e in self.etapas],
+                "contadores": como_lista(self._contadores.items()),
+                "valores": como_lista(self._valores.items()),
+                "histogramas": [
+                    {"nome": nome, "rotulos": dict(rotulos), **hist.como_dict()}
+                    for (nome, rotulos), hist in sorted(self._histogramas.items(), key=lambda i: i[0])
+                ],
+            }
+
+    def prometheus(self, prefixo: str = "octadesk_pipeline_") -> str:
+        """Métricas no formato texto de exposição do Prometheus."""
+        def rotulos_texto(rotulos: Rotulos, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+            todos = rotulos + extra
+            if not todos:
+                return ""
+            return "{" + ",".join(f'{k}="{v}"' for k, v in todos) + "}"
+
+        linhas: List[str] = []
+        with self._lock:
+            tipos: Dict[str, str] = {}
+            amostras: List[str] = []
+            for (nome, rotulos), valor in sorted(self._contadores.items()):
+                tipos[nome] = "counter"
+                amostras.append(f"{prefixo}{nome}{rotulos_texto(rotulos)} {valor}")
+            for (nome, rotulos), valor in sorted(self._valores.items()):
+                tipos[nome] = "gauge"
+                amostras.append(f"{prefixo}{nome}{rotulos_texto(rotulos)} {valor}")
+            for (nome, rotulos), hist in sorted(self._histogramas.items(), key=lambda i: i[0]):
+                tipos[nome] = "histogram"
+                acumulado = 0
+                for limite, contagem in zip(hist.limites, hist.contagens):
+                    acumulado += contagem
+                    amostras.append(f"{prefixo}{nome}_bucket{rotulos_texto(rotulos, (('le', str(limite)),))} {acumulado}")
+                amostras.append(f"{prefixo}{nome}_bucket{rotulos_texto(rotulos, (('le', '+Inf'),))} {hist.total}")
+                amostras.append(f"{prefixo}{nome}_sum{rotulos_texto(rotulos)} {hist.soma}")
+                amostras.append(f"{prefixo}{nome}_count{rotulos_texto(rotulos)} {hist.total}")
+        linhas += [f"# TYPE {prefixo}{nome} {tipo}" for nome, tipo in sorted(tipos.items())]
+        return "\n".join(linhas + amostras) + "\n"
+
+    def gravar(self) -> Path:
+        """
+        Grava o relatório JSON em PIPELINE_RELATORIO_DIR e, se
+        PIPELINE_PROMETHEUS_PATH estiver definido, o arquivo do Prometheus.
+        """
+        destino = config.PIPELINE_RELATORIO_DIR
+        destino.mkdir(parents=True, exist_ok=True)
+        caminho = destino / f"execucao-{self.execucao}.json"
+        with open(caminho, "w", encoding="utf-8") as f:
+            json.dump(self.relatorio(), f, ensure_ascii=False, indent=2, default=str)
+
+        if config.PIPELINE_PROMETHEUS_PATH:
+            prom = Path(config.PIPELINE_PROMETHEUS_PATH)
+            prom.parent.mkdir(parents=True, exist_ok=True)
+            tmp = prom.with_suffix(".tmp")
+            tmp.write_text(self.prometheus(), encoding="utf-8")
+            tmp.replace(prom)
+        return caminho
+
+    def resumo(self) -> str:
+        """Uma linha por etapa (tempo, linhas e memória)."""
+        linhas = []
+        for e in self.etapas:
+            texto = f"{e.nome:<22} {e.segundos or 0:8.2f}s"
+            if e.linhas_entrada is not None or e.linhas_saida is not None:
+                texto += f"  linhas {e.linhas_entrada if e.linhas_entrada is not None else '-'}"
+                texto += f" → {e.linhas_saida if e.linhas_saida is not None else '-'}"
+            if e.pico_rss_mb is not None:
+                texto += f"  pico RSS {e.pico_rss_mb:.0f} MB"
+            if e.erro:
+                texto += f"  ERRO {e.erro}"
+            linhas.append(texto)
+        return "\n".join(linhas)
+
+
+def medido(funcao: str):
+    """Decorador: observa em funcao_segundos{funcao} a duração de cada chamada."""
+    def decorar(f):
+        @functools.wraps(f)
+        def envolvido(*args, **kwargs):
+            with obter_metricas().cronometrar("funcao_segundos", funcao=funcao):
+                return f(*args, **kwargs)
+        return envolvido
+    return decorar
+
+
+_metricas: Optional[Metricas] = None
+_metricas_lock = threading.Lock()
+
+
+def obter_metricas() -> Metricas:
+    """Métricas únicas do processo, criadas no primeiro uso."""
+    global _metricas
+    with _metricas_lock:
+        if _metricas is None:
+            _metricas = Metricas()
+        return _metricas
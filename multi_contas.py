@@ -0,0 +1,207 @@
+"""
+Roda o pipeline (main.py) para várias contas Octadesk em paralelo.
+
+As contas ficam num JSON (PIPELINE_CONTAS_PATH, não versionado), uma por
+item, com o nome e as variáveis de ambiente daquela conta:
+
+    [
+      {"nome": "loja_sp",
+       "OCTA_BASE_URL": "https://...", "OCTA_API_KEY": "...", "OCTA_AGENT_EMAIL": "...",
+       "PIPELINE_TABELA": "integracoes-infinit.DataLake_2025.Octadesk_sp",
+       "OCTA_RPS": "3"}
+    ]
+
+Cada conta roda num processo próprio do main.py. O processo tem o seu
+limitador de taxa (OCTA_RPS da conta), a sua tabela de destino
+(PIPELINE_TABELA) e o seu diretório de estado em PIPELINE_CONTAS_DIR/<nome>
+(watermarks, índices, cache, staging, checkpoints e relatórios). No máximo
+PIPELINE_CONTAS_PARALELAS contas rodam ao mesmo tempo, e a falha de uma
+não interrompe as outras. No fim sai um resumo combinado, impresso e
+gravado em PIPELINE_CONTAS_DIR/execucao-<data>.json.
+
+    python multi_contas.py --incremental --pipeline
+    python multi_contas.py --contas contas.json --paralelas 3 --contas-filtro loja_sp loja_rj
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import config
+
+MAIN_PATH = Path(__file__).parent / "main.py"
+
+# Caminhos do estado local que cada conta precisa ter separados
+_ESTADO_POR_CONTA = {
+    "PIPELINE_ESTADO_PATH": "estado.json",
+    "PIPELINE_INDICE_PATH": "indice_ids.npz",
+    "PIPELINE_ABERTOS_PATH": "tickets_abertos.json",
+    "PIPELINE_CHECKPOINT_DIR": "checkpoints",
+    "PIPELINE_RELATORIO_DIR": "relatorios",
+    "PIPELINE_STAGING_DIR": "staging",
+    "OCTA_CACHE_PATH": "cache.sqlite",
+    "PIPELINE_LOCAL_DB": "local.sqlite",
+}
+_OBRIGATORIAS = ("nome", "OCTA_BASE_URL", "OCTA_API_KEY", "OCTA_AGENT_EMAIL", "PIPELINE_TABELA")
+
+_saida_lock = threading.Lock()
+
+
+def _avisar(conta: Dict[str, Any], mensagem: str) -> None:
+    # Uma linha inteira por vez: as contas avisam de threads diferentes
+    with _saida_lock:
+        print(f"[{conta['nome']}] {mensagem}", flush=True)
+
+
+def carregar_contas(caminho: Optional[Path] = None) -> List[Dict[str, str]]:
+    """Lê e valida o arquivo de contas (nomes e tabelas não podem se repetir)."""
+    caminho = caminho or config.PIPELINE_CONTAS_PATH
+    with open(caminho, "r", encoding="utf-8") as f:
+        contas = json.load(f)
+
+    nomes, tabelas = set(), set()
+    for i, conta in enumerate(contas):
+        faltando = [c for c in _OBRIGATORIAS if not conta.get(c)]
+        if faltando:
+            raise RuntimeError(f"Conta {conta.get('nome') or i} sem {faltando} em {caminho}")
+        if not re.fullmatch(r"[0-9A-Za-z_-]+", conta["nome"]):
+            raise RuntimeError(f"Nome de conta inválido: {conta['nome']!r} (use letras, números, _ e -)")
+        if conta["nome"] in nomes:
+            raise RuntimeError(f"Conta repetida em {caminho}: {conta['nome']}")
+        if conta["PIPELINE_TABELA"] in tabelas:
+            raise RuntimeError(f"Tabela usada por mais de uma conta: {conta['PIPELINE_TABELA']}")
+        nomes.add(conta["nome"])
+        tabelas.add(conta["PIPELINE_TABELA"])
+    return contas
+
+
+def ambiente_conta(conta: Dict[str, Any]) -> Dict[str, str]:
+    """
+    Ambiente do processo da conta: o do runner, mais o estado local em
+    PIPELINE_CONTAS_DIR/<nome>, mais as variáveis da própria conta (que
+    têm prioridade).
+    """
+    raiz = config.PIPELINE_CONTAS_DIR / conta["nome"]
+    env = dict(os.environ)
+    env.update({nome: str(raiz / arquivo) for nome, arquivo in _ESTADO_POR_CONTA.items()})
+    env.update({nome: str(valor) for nome, valor in conta.items() if nome != "nome"})
+    return env
+
+
+def _ler_relatorio(log: Path) -> Optional[Dict[str, Any]]:
+    """Relatório de métricas cujo caminho o main.py imprimiu no log."""
+    caminho = None
+    with open(log, "r", encoding="utf-8", errors="replace") as f:
+        for linha in f:
+            if linha.startswith("Relatório da execução: "):
+                caminho = linha.split(": ", 1)[1].strip()
+    if caminho is None or not Path(caminho).exists():
+        return None
+    with open(caminho, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _somar(itens: List[Dict[str, Any]], nome: str, **rotulos: Any) -> float:
+    return sum(
+        item["valor"] for item in itens
+        if item["nome"] == nome and all(item["rotulos"].get(k) in v for k, v in rotulos.items())
+    )
+
+
+def rodar_conta(conta: Dict[str, Any], argumentos: List[str]) -> Dict[str, Any]:
+    """Roda o main.py para a conta, com a saída em <estado da conta>/execucao.log."""
+    env = ambiente_conta(conta)
+    raiz = config.PIPELINE_CONTAS_DIR / conta["nome"]
+    raiz.mkdir(parents=True, exist_ok=True)
+    log = raiz / "execucao.log"
+
+    _avisar(conta, f"iniciando (log em {log})")
+    inicio = time.perf_counter()
+    with open(log, "w", encoding="utf-8") as saida:
+        processo = subprocess.run([sys.executable, str(MAIN_PATH), *argumentos], env=env,
+                                  stdout=saida, stderr=subprocess.STDOUT, cwd=MAIN_PATH.parent)
+    segundos = time.perf_counter() - inicio
+
+    resumo: Dict[str, Any] = {
+        "conta": conta["nome"],
+        "tabela": env.get("PIPELINE_TABELA"),
+        "codigo_saida": processo.returncode,
+        "segundos": round(segundos, 3),
+        "log": str(log),
+    }
+    relatorio = _ler_relatorio(log)
+    if relatorio is not None:
+        contadores = relatorio.get("contadores", [])
+        resumo.update({
+            "relatorio": relatorio.get("execucao"),
+            "requisicoes_octadesk": int(_somar(contadores, "octadesk_requisicoes_total")),
+            "linhas_gravadas": int(_somar(contadores, "destino_linhas_total", operacao=("anexar", "upsert"))),
+            "status_atualizados": int(_somar(contadores, "destino_linhas_total", operacao=("merge",))),
+            "pico_rss_mb": relatorio.get("pico_rss_mb"),
+            "etapas_com_erro": [e["etapa"] for e in relatorio.get("etapas", []) if e.get("erro")],
+        })
+    situacao = "ok" if processo.returncode == 0 else f"falhou (código {processo.returncode})"
+    _avisar(conta, f"{situacao} em {segundos:.1f}s")
+    return resumo
+
+
+def rodar_contas(contas: List[Dict[str, Any]], argumentos: List[str],
+                 paralelas: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Roda as contas com no máximo `paralelas` processos ao mesmo tempo, na ordem do arquivo."""
+    paralelas = max(1, paralelas or config.PIPELINE_CONTAS_PARALELAS)
+    with ThreadPoolExecutor(max_workers=paralelas) as pool:
+        return list(pool.map(lambda conta: rodar_conta(conta, argumentos), contas))
+
+
+def resumo_contas(resultados: List[Dict[str, Any]]) -> str:
+    linhas = []
+    for r in resultados:
+        situacao = "ok" if r["codigo_saida"] == 0 else f"ERRO ({r['codigo_saida']})"
+        linha = f"{r['conta']:<20} {situacao:<10} {r['segundos']:8.1f}s"
+        if "requisicoes_octadesk" in r:
+            linha += (f"  {r['requisicoes_octadesk']:>7} req  {r['linhas_gravadas']:>8} linhas"
+                      f"  {r['status_atualizados']:>6} status")
+        linhas.append(linha)
+    ok = sum(1 for r in resultados if r["codigo_saida"] == 0)
+    linhas.append(f"{ok}/{len(resultados)} contas concluídas; "
+                  f"{sum(r.get('linhas_gravadas', 0) for r in resultados)} linhas gravadas no total")
+    return "\n".join(linhas)
+
+
+def gravar_resumo(resultados: List[Dict[str, Any]], argumentos: List[str]) -> Path:
+    destino = config.PIPELINE_CONTAS_DIR
+    destino.mkdir(parents=True, exist_ok=True)
+    caminho = destino / f"execucao-{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}.json"
+    with open(caminho, "w", encoding="utf-8") as f:
+        json.dump({"argumentos": argumentos, "contas": resultados}, f, ensure_ascii=False, indent=2)
+    return caminho
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Roda o main.py para cada conta Octadesk do arquivo de contas; "
+                    "os demais argumentos são repassados ao main.py")
+    parser.add_argument("--contas", type=Path, help="Arquivo de contas (padrão PIPELINE_CONTAS_PATH)")
+    parser.add_argument("--paralelas", type=int, help="Contas ao mesmo tempo (padrão PIPELINE_CONTAS_PARALELAS)")
+    parser.add_argument("--contas-filtro", nargs="+", metavar="NOME", help="Roda só estas contas")
+    args, argumentos_main = parser.parse_known_args()
+
+    contas = carregar_contas(args.contas)
+    if args.contas_filtro:
+        desconhecidas = set(args.contas_filtro) - {c["nome"] for c in contas}
+        if desconhecidas:
+            raise RuntimeError(f"Contas não encontradas: {sorted(desconhecidas)}")
+        contas = [c for c in contas if c["nome"] in args.contas_filtro]
+
+    resultados = rodar_contas(contas, argumentos_main, args.paralelas)
+    print(resumo_contas(resultados))
+    print(f"Resumo das contas: {gravar_resumo(resultados, argumentos_main)}")
+    sys.exit(0 if all(r["codigo_saida"] == 0 for r in resultados) else 1)
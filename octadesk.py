@@ -0,0 +1,128 @@
+import re
+import threading
+import time
+import requests
+from time import sleep
+from typing import Any, Dict, List, Optional, Tuple
+from requests.adapters import HTTPAdapter
+import config
+from limitador import LimitadorAdaptativo
+from metricas import obter_metricas
+
+# Status que indicam limite, conflito ou instabilidade momentânea da API
+RETRY_STATUS = (409, 429, 500)
+
+# Segmentos do caminho com dígitos (número do ticket, id do chat) viram {id}
+_SEGMENTO_ID = re.compile(r"/[^/]*\d[^/]*")
+
+
+def rota(path: str) -> str:
+    """Caminho sem os ids, para agrupar as métricas (/chat/{id}/events)."""
+    return _SEGMENTO_ID.sub("/{id}", path)
+
+
+class OctadeskClient:
+    """
+    Cliente HTTP único para a API Octadesk.
+
+    Mantém uma `requests.Session` com pool de conexões (keep-alive), pede
+    respostas comprimidas (gzip), aplica timeouts de conexão/leitura e
+    concentra o retry com backoff exponencial para 409/429/500 e falhas de
+    rede. Toda requisição passa antes pelo `limitador` da conta.
+    """
+
+    def __init__(self,
+                 base_url: str,
+                 headers: Dict[str, str],
+                 pool_size: Optional[int] = None,
+                 timeout: Optional[Tuple[float, float]] = None,
+                 max_retries: int = 3,
+                 limitador: Optional[LimitadorAdaptativo] = None):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout or (config.OCTA_TIMEOUT_CONNECT, config.OCTA_TIMEOUT_READ)
+        self.max_retries = max_retries
+        self.limitador = limitador or LimitadorAdaptativo(config.OCTA_RPS, config.OCTA_RPS_MIN, config.OCTA_RPS_MAX)
+        pool_size = pool_size or config.OCTA_POOL_SIZE
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update(headers)
+        self.session.headers["Accept-Encoding"] = "gzip, deflate"
+
+    def get(self, path: str, params: Optional[Dict[str, Any]] = None,
+            max_retries: Optional[int] = None) -> requests.Response:
+        """
+        GET em `base_url + path`. Repete com espera de 1s, 2s, 4s... em
+        409/429/500 e erros de conexão; demais erros HTTP sobem na hora.
+        """
+        tentativas = max_retries or self.max_retries
+        url = f"{self.base_url}{path}"
+        metricas = obter_metricas()
+        rota_path = rota(path)
+
+        attempt = 1
+        while True:
+            backoff = 2 ** (attempt - 1)
+            self.limitador.adquirir()
+            t0 = time.perf_counter()
+            try:
+                resp = self.session.get(url, params=params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                metricas.observar("octadesk_requisicao_segundos", time.perf_counter() - t0, rota=rota_path)
+                metricas.contar("octadesk_requisicoes_total", rota=rota_path, status=type(e).__name__)
+                if attempt >= tentativas:
+                    raise
+                print(f"⚠️ {type(e).__name__} em {path}, retry em {backoff}s (tentativa {attempt})")
+                sleep(backoff)
+                attempt += 1
+                continue
+
+            metricas.observar("octadesk_requisicao_segundos", time.perf_counter() - t0, rota=rota_path)
+            metricas.contar("octadesk_requisicoes_total", rota=rota_path, status=resp.status_code)
+            metricas.contar("octadesk_bytes_recebidos_total", len(resp.content), rota=rota_path)
+            self.limitador.registrar(resp.status_code, resp.headers.get("Retry-After"))
+            if resp.status_code in RETRY_STATUS and attempt < tentativas:
+                print(f"⚠️ {resp.status_code} em {path}, retry em {backoff}s (tentativa {attempt})")
+                sleep(backoff)
+                attempt += 1
+                continue
+
+            resp.raise_for_status()
+            return resp
+
+    def get_json(self, path: str, params: Optional[Dict[str, Any]] = None,
+                 max_retries: Optional[int] = None) -> Any:
+        return self.get(path, params=params, max_retries=max_retries).json()
+
+
+def resultados(payload: Any) -> List[Any]:
+    """Extrai a lista de registros de uma resposta (dict com 'results' ou lista)."""
+    if isinstance(payload, dict):
+        return payload.get("results", [])
+    if isinstance(payload, list):
+        return payload
+    return []
+
+
+_clientes: Dict[Tuple, OctadeskClient] = {}
+_clientes_lock = threading.Lock()
+
+
+def obter_cliente(base_url: Optional[str] = None,
+                  headers: Optional[Dict[str, str]] = None) -> OctadeskClient:
+    """
+    Retorna o cliente compartilhado para (base_url, headers), criando-o no
+    primeiro uso. Sem argumentos, usa a conta configurada no .env.
+    """
+    if base_url is None or headers is None:
+        config.validar_octadesk()
+    base_url = (base_url or config.OCTA_BASE_URL).rstrip("/")
+    headers = headers or config.OCTA_HEADERS
+    chave = (base_url, tuple(sorted(headers.items())))
+
+    with _clientes_lock:
+        if chave not in _clientes:
+            _clientes[chave] = OctadeskClient(base_url, headers)
+        return _clientes[chave]
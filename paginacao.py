@@ -0,0 +1,81 @@
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional
+import config
+
+if TYPE_CHECKING:
+    from checkpoint import CheckpointPaginas
+
+
+def iterar_paginas(
+    buscar_pagina: Callable[[int], List[Any]],
+    limit: int,
+    concorrencia: Optional[int] = None,
+    pagina_inicial: int = 1,
+    checkpoint: Optional["CheckpointPaginas"] = None
+) -> Iterator[List[Any]]:
+    """
+    Percorre uma listagem paginada mantendo até `concorrencia` páginas em voo.
+
+    As páginas são entregues na ordem (1, 2, 3...), então a ordenação pedida
+    à API (ex.: createdAt asc) é preservada. A iteração para na primeira
+    página vazia ou com menos de `limit` registros; as páginas seguintes que
+    já estavam em voo são descartadas.
+
+    Parâmetros:
+    - buscar_pagina: função que recebe o número da página e retorna a lista
+      de registros (o retry/backoff fica a cargo dela).
+    - limit: tamanho de página pedido à API.
+    - concorrencia: quantidade de requisições simultâneas (padrão OCTA_CONCORRENCIA).
+    - pagina_inicial: primeira página a ser buscada.
+    - checkpoint: se informado, as páginas já gravadas nele são relidas do
+      disco e a busca continua a partir da seguinte; cada página nova é
+      gravada antes de ser entregue.
+    """
+    if checkpoint is not None:
+        yield from checkpoint.paginas_gravadas()
+        if checkpoint.concluido:
+            return
+        pagina_inicial = checkpoint.paginas + 1
+
+    concorrencia = max(1, concorrencia or config.OCTA_CONCORRENCIA)
+    pool = ThreadPoolExecutor(max_workers=concorrencia)
+    pendentes: Dict[int, Future] = {}
+    proxima = pagina_inicial
+
+    try:
+        for _ in range(concorrencia):
+            pendentes[proxima] = pool.submit(buscar_pagina, proxima)
+            proxima += 1
+
+        pagina = pagina_inicial
+        while True:
+            dados = pendentes.pop(pagina).result()
+            if not dados:
+                break
+
+            if checkpoint is not None:
+                checkpoint.gravar_pagina(pagina, dados)
+            yield dados
+            if len(dados) < limit:
+                break
+
+            pendentes[proxima] = pool.submit(buscar_pagina, proxima)
+            proxima += 1
+            pagina += 1
+        if checkpoint is not None:
+            checkpoint.concluir()
+    finally:
+        # Cancela o que ainda não começou e aguarda as requisições em andamento
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def buscar_paginas(
+    buscar_pagina: Callable[[int], List[Any]],
+    limit: int,
+    concorrencia: Optional[int] = None
+) -> List[Any]:
+    """Coleta todas as páginas de `iterar_paginas` numa única lista ordenada."""
+    registros: List[Any] = []
+    for dados in iterar_paginas(buscar_pagina, limit, concorrencia):
+        registros.extend(dados)
+    return registros
@@ -0,0 +1,226 @@
+"""
+Execução em estágios ligados por filas limitadas (produtor/consumidor).
+
+Cada cadeia tem uma origem (iterável, ex.: páginas da API) e estágios que
+consomem a fila anterior e alimentam a seguinte; cada estágio tem as suas
+threads. As filas têm no máximo PIPELINE_FILA_MAX itens: quando um estágio
+atrasa, quem o alimenta fica parado no put (backpressure) e a memória fica
+limitada a poucas páginas/lotes por fila. Cadeias e tarefas avulsas do
+mesmo Pipeline rodam ao mesmo tempo.
+
+Por estágio ficam registrados o tempo ocupado, a espera por entrada (fila
+vazia) e a espera por saída (fila cheia); a utilização é ocupado / (duração
+× threads). Falha em qualquer estágio cancela os demais e é relançada em
+executar().
+"""
+
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+import config
+from metricas import obter_metricas
+
+# Marca de fim de fluxo nas filas
+_FIM = object()
+
+
+class _Cancelado(Exception):
+    pass
+
+
+class Estagio:
+    """Função aplicada a cada item da fila de entrada; o retorno (se não None) segue para a próxima fila."""
+
+    def __init__(self, nome: str, funcao: Callable[[Any], Any], workers: int = 1):
+        self.nome = nome
+        self.funcao = funcao
+        self.workers = max(1, workers)
+        self.itens = 0
+        self.ocupado = 0.0
+        self.espera_entrada = 0.0
+        self.espera_saida = 0.0
+        self.inicio: Optional[float] = None
+        self.fim: Optional[float] = None
+        self._lock = threading.Lock()
+        self._ativos = self.workers
+
+    def _somar(self, ocupado: float = 0.0, entrada: float = 0.0, saida: float = 0.0, itens: int = 0) -> None:
+        with self._lock:
+            self.ocupado += ocupado
+            self.espera_entrada += entrada
+            self.espera_saida += saida
+            self.itens += itens
+
+    def _encerrar_worker(self) -> bool:
+        """True para o último worker a terminar (é ele quem avisa o estágio seguinte)."""
+        with self._lock:
+            self._ativos -= 1
+            if self._ativos == 0:
+                self.fim = time.perf_counter()
+                return True
+            return False
+
+    @property
+    def duracao(self) -> float:
+        if self.inicio is None:
+            return 0.0
+        return (self.fim or time.perf_counter()) - self.inicio
+
+    @property
+    def utilizacao(self) -> float:
+        duracao = self.duracao
+        return self.ocupado / (duracao * self.workers) if duracao > 0 else 0.0
+
+
+class Pipeline:
+    def __init__(self, fila_max: Optional[int] = None):
+        self.fila_max = fila_max or config.PIPELINE_FILA_MAX
+        self.estagios: List[Estagio] = []
+        self.resultados: Dict[str, Any] = {}
+        self._threads: List[threading.Thread] = []
+        self._cancelado = threading.Event()
+        self._erro: Optional[BaseException] = None
+        self._erro_lock = threading.Lock()
+
+    def _falhar(self, erro: BaseException) -> None:
+        with self._erro_lock:
+            if self._erro is None:
+                self._erro = erro
+        self._cancelado.set()
+
+    def _put(self, fila: queue.Queue, item: Any) -> float:
+        """Put que desiste se o pipeline for cancelado; devolve o tempo bloqueado."""
+        inicio = time.perf_counter()
+        while True:
+            try:
+                fila.put(item, timeout=0.1)
+                return time.perf_counter() - inicio
+            except queue.Full:
+                if self._cancelado.is_set():
+                    raise _Cancelado()
+
+    def _get(self, fila: queue.Queue) -> Any:
+        while True:
+            try:
+                return fila.get(timeout=0.1)
+            except queue.Empty:
+                if self._cancelado.is_set():
+                    raise _Cancelado()
+
+    def _thread(self, nome: str, alvo: Callable[[], None]) -> None:
+        def executar() -> None:
+            try:
+                alvo()
+            except _Cancelado:
+                pass
+            except BaseException as e:
+                self._falhar(e)
+        self._threads.append(threading.Thread(target=executar, name=nome, daemon=True))
+
+    def cadeia(self, nome: str, origem: Iterable[Any], *estagios: Estagio) -> "Pipeline":
+        """
+        Registra a cadeia origem → estagios[0] → estagios[1] → ... A origem
+        conta como um estágio de 1 thread chamado `nome` (o tempo ocupado é
+        o gasto produzindo cada item).
+        """
+        fonte = Estagio(nome, lambda item: item)
+        self.estagios.extend([fonte, *estagios])
+        filas = [queue.Queue(maxsize=self.fila_max) for _ in estagios]
+
+        def produzir() -> None:
+            fonte.inicio = time.perf_counter()
+            iterador = iter(origem)
+            while True:
+                if self._cancelado.is_set():
+                    raise _Cancelado()
+                t0 = time.perf_counter()
+                try:
+                    item = next(iterador)
+                except StopIteration:
+                    break
+                ocupado = time.perf_counter() - t0
+                espera = self._put(filas[0], item) if filas else 0.0
+                fonte._somar(ocupado=ocupado, saida=espera, itens=1)
+
+            fonte._encerrar_worker()
+            for _ in range(estagios[0].workers if filas else 0):
+                self._put(filas[0], _FIM)
+
+        self._thread(nome, produzir)
+
+        for i, estagio in enumerate(estagios):
+            entrada = filas[i]
+            saida = filas[i + 1] if i + 1 < len(filas) else None
+            proximo = estagios[i + 1] if i + 1 < len(estagios) else None
+            for w in range(estagio.workers):
+                self._thread(f"{estagio.nome}-{w}", self._consumidor(estagio, entrada, saida, proximo))
+        return self
+
+    def _consumidor(self, estagio: Estagio, entrada: queue.Queue,
+                    saida: Optional[queue.Queue], proximo: Optional[Estagio]) -> Callable[[], None]:
+        def consumir() -> None:
+            if estagio.inicio is None:
+                estagio.inicio = time.perf_counter()
+            while True:
+                if self._cancelado.is_set():
+                    raise _Cancelado()
+                t0 = time.perf_counter()
+                item = self._get(entrada)
+                espera = time.perf_counter() - t0
+                if item is _FIM:
+                    estagio._somar(entrada=espera)
+                    break
+                t0 = time.perf_counter()
+                resultado = estagio.funcao(item)
+                ocupado = time.perf_counter() - t0
+                bloqueado = self._put(saida, resultado) if saida is not None and resultado is not None else 0.0
+                estagio._somar(ocupado=ocupado, entrada=espera, saida=bloqueado, itens=1)
+
+            # O último worker a sair avisa o estágio seguinte
+            if estagio._encerrar_worker() and saida is not None:
+                for _ in range(proximo.workers):
+                    self._put(saida, _FIM)
+        return consumir
+
+    def tarefa(self, nome: str, funcao: Callable[[], Any]) -> "Pipeline":
+        """Função avulsa rodando junto com as cadeias; o retorno fica em resultados[nome]."""
+        estagio = Estagio(nome, funcao)
+        self.estagios.append(estagio)
+
+        def executar() -> None:
+            estagio.inicio = time.perf_counter()
+            self.resultados[nome] = funcao()
+            estagio._somar(ocupado=time.perf_counter() - estagio.inicio, itens=1)
+            estagio._encerrar_worker()
+
+        self._thread(nome, executar)
+        return self
+
+    def executar(self) -> Dict[str, Any]:
+        """Roda tudo, espera o fim e registra a utilização de cada estágio nas métricas."""
+        for thread in self._threads:
+            thread.start()
+        for thread in self._threads:
+            thread.join()
+
+        metricas = obter_metricas()
+        for estagio in self.estagios:
+            metricas.definir("estagio_utilizacao", estagio.utilizacao, estagio=estagio.nome)
+            metricas.definir("estagio_ocupado_segundos", estagio.ocupado, estagio=estagio.nome)
+            metricas.definir("estagio_espera_entrada_segundos", estagio.espera_entrada, estagio=estagio.nome)
+            metricas.definir("estagio_espera_saida_segundos", estagio.espera_saida, estagio=estagio.nome)
+        print(self.resumo())
+
+        if self._erro is not None:
+            raise self._erro
+        return self.resultados
+
+    def resumo(self) -> str:
+        linhas = []
+        for e in self.estagios:
+            linhas.append(
+                f"{e.nome:<22} {e.utilizacao:>6.0%} ocupado  {e.itens:>5} itens  "
+                f"espera entrada {e.espera_entrada:6.2f}s  espera saída {e.espera_saida:6.2f}s"
+            )
+        return "\n".join(linhas)
@@ -0,0 +1,516 @@
+from __future__ import annotations
+
+import functools
+import json
+import sqlite3
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+import config
+from importacao import sob_demanda
+from metricas import obter_metricas
+
+# Importados no primeiro uso: quem só atualiza status num destino local não
+# paga o import do google-cloud-bigquery (nem o do pandas, se não ler chaves)
+np = sob_demanda("numpy")
+pd = sob_demanda("pandas")
+bigquery = sob_demanda("google.cloud.bigquery")
+excecoes_google = sob_demanda("google.api_core.exceptions")
+
+
+def _medido(operacao: str):
+    """Registra a latência de cada chamada em destino_segundos{destino, operacao}."""
+    def decorar(metodo):
+        @functools.wraps(metodo)
+        def envolvido(self, *args, **kwargs):
+            with obter_metricas().cronometrar("destino_segundos", destino=self.tipo, operacao=operacao):
+                return metodo(self, *args, **kwargs)
+        return envolvido
+    return decorar
+
+
+class Sink(ABC):
+    """
+    Destino da tabela final do pipeline.
+
+    Concentra as operações usadas pelo load (anexar ou upsert), pela
+    verificação de duplicidade (ler_chaves/existentes) e pela atualização de
+    status (merge e tickets_abertos), para que o pipeline rode contra o
+    BigQuery ou contra um banco local sem mudar o resto do código.
+    """
+
+    tipo = ""
+
+    def __init__(self, tabela: str):
+        self.tabela = tabela
+
+    def _contar_linhas(self, operacao: str, linhas: int) -> None:
+        obter_metricas().contar("destino_linhas_total", linhas, destino=self.tipo, operacao=operacao)
+
+    @abstractmethod
+    def anexar(self, df: pd.DataFrame) -> None:
+        """Append de df, criando a tabela/colunas que faltarem."""
+
+    @abstractmethod
+    def upsert(self, df: pd.DataFrame, chave: str = "chave_linha", legado: Sequence[str] = ()) -> str:
+        """
+        Grava df como um lote (coluna `lote`, derivada das chaves): linhas
+        cuja `chave` já existe no destino são substituídas, as demais são
+        inseridas, numa única operação. Repetir o mesmo lote, ou carregar
+        lotes em paralelo, não duplica linhas. `legado` são as colunas que
+        identificam linhas gravadas antes de existir a `chave` (chave nula).
+        Chaves repetidas dentro do lote ficam só com a última linha.
+        Retorna o id do lote.
+        """
+
+    @abstractmethod
+    def ler_chaves(self, desde: Optional[datetime] = None) -> pd.DataFrame:
+        """(number, n_ticket, upload) das linhas carregadas depois de `desde` (todas se None)."""
+
+    @abstractmethod
+    def existentes(self, coluna: str, valores: List[Any]) -> Set[Any]:
+        """Valores de `coluna` que já existem no destino."""
+
+    @abstractmethod
+    def merge(self, linhas: List[dict], chave: str, colunas: List[str],
+              repetidos: Iterable[str] = ()) -> None:
+        """Atualiza `colunas` das linhas do destino cuja `chave` aparece em `linhas`.
+        `repetidos` são as colunas de lista (ARRAY<STRING> no BigQuery)."""
+
+    @abstractmethod
+    def tickets_abertos(self) -> List[str]:
+        """n_ticket distintos ainda não resolvidos."""
+
+
+class BigQuerySink(Sink):
+    tipo = "bigquery"
+
+    def __init__(self, tabela: Optional[str] = None, client: Optional[bigquery.Client] = None):
+        super().__init__(tabela or config.SRC_TABLE_SAC_OCTADESK)
+        self.client = client or config.obter_bq()
+
+    def _registrar_job(self, job: Any, operacao: str) -> None:
+        """Bytes processados (consultas) ou gravados (loads) pelo job."""
+        processados = getattr(job, "total_bytes_processed", None) or getattr(job, "output_bytes", None)
+        if processados:
+            obter_metricas().contar("destino_bytes_total", processados, destino=self.tipo, operacao=operacao)
+
+    def _obter_tabela(self) -> bigquery.Table:
+        try:
+            return self.client.get_table(self.tabela)
+        except excecoes_google.NotFound:
+            schema = [
+                bigquery.SchemaField("chat_id", "STRING"),
+                bigquery.SchemaField("n_ticket", "STRING"),
+            ]
+            return self.client.create_table(bigquery.Table(self.tabela, schema=schema))
+
+    @_medido("anexar")
+    def anexar(self, df: pd.DataFrame) -> None:
+        tabela = self._obter_tabela()
+        df, schema = _schema_load(df, {campo.name: campo for campo in tabela.schema})
+        job_config = bigquery.LoadJobConfig(
+            schema=schema,
+            write_disposition=bigquery.WriteDisposition.WRITE_APPEND,
+            schema_update_options=[bigquery.SchemaUpdateOption.ALLOW_FIELD_ADDITION]
+        )
+
+        job = self.client.load_table_from_dataframe(df, self.tabela, job_config=job_config)
+        job.result()
+        self._registrar_job(job, "anexar")
+        self._contar_linhas("anexar", len(df))
+
+    @_medido("upsert")
+    def upsert(self, df: pd.DataFrame, chave: str = "chave_linha", legado: Sequence[str] = ()) -> str:
+        """
+        Carrega o lote em {tabela}_lote_{id} e aplica um MERGE pela `chave`.
+        Colunas novas do lote são acrescentadas ao schema do destino antes.
+        """
+        if df.empty:
+            return ""
+        from chaves import id_lote
+
+        # A mesma linha pode vir duas vezes (sobreposição do incremental, empates
+        # de createdAt entre páginas): o MERGE precisa de uma linha por chave
+        df = df.drop_duplicates(chave, keep="last")
+
+        lote = id_lote(df[chave])
+        df = df.assign(lote=lote)
+        tabela = self._obter_tabela()
+        df, schema = _schema_load(df, {campo.name: campo for campo in tabela.schema})
+
+        stage_id = f"{self.tabela}_lote_{lote}"
+        job_config = bigquery.LoadJobConfig(
+            schema=schema,
+            write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE,
+        )
+        try:
+            job = self.client.load_table_from_dataframe(df, stage_id, job_config=job_config)
+            job.result()
+            self._registrar_job(job, "upsert")
+
+            # Colunas que o destino ainda não tem entram com o tipo do stage
+            stage = self.client.get_table(stage_id)
+            nomes = {campo.name for campo in tabela.schema}
+            novas = [campo for campo in stage.schema if campo.name not in nomes]
+            if novas:
+                tabela.schema = list(tabela.schema) + novas
+                self.client.update_table(tabela, ["schema"])
+
+            colunas = [campo.name for campo in stage.schema]
+            condicao = f"T.{chave} = S.{chave}"
+            if legado:
+                iguais = " AND ".join(f"T.{c} IS NOT DISTINCT FROM S.{c}" for c in legado)
+                condicao = f"{condicao} OR (T.{chave} IS NULL AND {iguais})"
+            set_clause = ",\n          ".join(f"{c} = S.{c}" for c in colunas)
+            sql = f"""
+            MERGE `{self.tabela}` T
+            USING `{stage_id}` S
+            ON {condicao}
+            WHEN MATCHED THEN UPDATE SET
+              {set_clause}
+            WHEN NOT MATCHED THEN
+              INSERT ({", ".join(colunas)}) VALUES ({", ".join(f"S.{c}" for c in colunas)})
+            """
+            job = self.client.query(sql)
+            job.result()
+            self._registrar_job(job, "upsert")
+        finally:
+            self.client.delete_table(stage_id, not_found_ok=True)
+
+        self._contar_linhas("upsert", len(df))
+        return lote
+
+    @_medido("ler_chaves")
+    def ler_chaves(self, desde: Optional[datetime] = None) -> pd.DataFrame:
+        if desde is None:
+            query = f"SELECT number, n_ticket, MAX(upload) AS upload FROM `{self.tabela}` GROUP BY number, n_ticket"
+            job_config = None
+        else:
+            query = f"SELECT number, n_ticket, upload FROM `{self.tabela}` WHERE upload > @ultimo"
+            job_config = bigquery.QueryJobConfig(query_parameters=[
+                bigquery.ScalarQueryParameter("ultimo", "TIMESTAMP", desde)
+            ])
+        job = self.client.query(query, job_config=job_config)
+        df = job.to_dataframe()
+        self._registrar_job(job, "ler_chaves")
+        self._contar_linhas("ler_chaves", len(df))
+        return df
+
+    @_medido("existentes")
+    def existentes(self, coluna: str, valores: List[Any]) -> Set[Any]:
+        # Detecta tipo de BigQuery e converte valores
+        if coluna == 'number':
+            param_type = 'INT64'
+            valores = [int(v) for v in valores]
+        else:
+            param_type = 'STRING'
+
+        query = f"""
+            SELECT {coluna}
+            FROM `{self.tabela}`
+            WHERE {coluna} IN UNNEST(@valores)
+        """
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[
+                bigquery.ArrayQueryParameter("valores", param_type, valores)
+            ]
+        )
+        job = self.client.query(query, job_config=job_config)
+        existentes = {row[coluna] for row in job.result()}
+        self._registrar_job(job, "existentes")
+        return existentes
+
+    @_medido("merge")
+    def merge(self, linhas: List[dict], chave: str, colunas: List[str],
+              repetidos: Iterable[str] = ()) -> None:
+        """
+        Uma linha: UPDATE parametrizado. Várias: carrega em {tabela}_{chave}_stage
+        com um único load job e aplica um só MERGE.
+        """
+        repetidos = set(repetidos)
+        self._contar_linhas("merge", len(linhas))
+
+        if len(linhas) == 1:
+            linha = linhas[0]
+            set_clause = ",\n          ".join(f"{campo} = @{campo}" for campo in colunas)
+            sql = f"""
+            UPDATE `{self.tabela}`
+            SET
+              {set_clause}
+            WHERE {chave} = @_chave
+            """
+            job_config = bigquery.QueryJobConfig(
+                query_parameters=[
+                    bigquery.ArrayQueryParameter(campo, "STRING", linha[campo]) if campo in repetidos
+                    else bigquery.ScalarQueryParameter(campo, "STRING", linha[campo])
+                    for campo in colunas
+                ] + [bigquery.ScalarQueryParameter("_chave", "STRING", linha[chave])]
+            )
+            job = self.client.query(sql, job_config=job_config)
+            job.result()
+            self._registrar_job(job, "merge")
+            return
+
+        # Nome único por chamada: execuções simultâneas na mesma tabela
+        # (main.py e update_tickets.py, ou contas diferentes) não dividem o stage
+        stage_id = f"{self.tabela}_{chave}_stage_{uuid.uuid4().hex[:12]}"
+        schema = [bigquery.SchemaField(chave, "STRING")] + [
+            bigquery.SchemaField(campo, "STRING", mode="REPEATED" if campo in repetidos else "NULLABLE")
+            for campo in colunas
+        ]
+        job_config = bigquery.LoadJobConfig(
+            schema=schema,
+            write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE,
+        )
+        set_clause = ",\n          ".join(f"{campo} = S.{campo}" for campo in colunas)
+        sql = f"""
+        MERGE `{self.tabela}` T
+        USING `{stage_id}` S
+        ON T.{chave} = S.{chave}
+        WHEN MATCHED THEN UPDATE SET
+          {set_clause}
+        """
+        try:
+            self.client.load_table_from_json(linhas, stage_id, job_config=job_config).result()
+            job = self.client.query(sql)
+            job.result()
+            self._registrar_job(job, "merge")
+        finally:
+            self.client.delete_table(stage_id, not_found_ok=True)
+
+    @_medido("tickets_abertos")
+    def tickets_abertos(self) -> List[str]:
+        sql = f"""
+        SELECT DISTINCT n_ticket
+        FROM {self.tabela}
+        WHERE (n_ticket is not null) AND (status_ticket != 'Resolvido')
+        """
+        job = self.client.query(sql)
+        tickets = job.to_dataframe()["n_ticket"].tolist()
+        self._registrar_job(job, "tickets_abertos")
+        return tickets
+
+
+# Nomes antigos (legacy SQL) devolvidos pela API para os tipos padrão
+_TIPOS_EQUIVALENTES = {"INTEGER": "INT64", "FLOAT": "FLOAT64", "BOOLEAN": "BOOL"}
+
+
+def _schema_load(df: pd.DataFrame,
+                 existentes: Dict[str, bigquery.SchemaField]) -> Tuple[pd.DataFrame, List[bigquery.SchemaField]]:
+    """
+    Schema explícito do load a partir dos dtypes (esquema.tipo_bigquery).
+    Colunas que já existem no destino com outro tipo (ex.: createdAt criada
+    como STRING antes do esquema) são convertidas para o tipo do destino,
+    para o append continuar compatível. Colunas sem tipo definido ficam para
+    a inferência do client.
+    """
+    from esquema import para_tipo_bigquery, tipo_bigquery
+
+    schema: List[bigquery.SchemaField] = []
+    convertidas: Dict[str, pd.Series] = {}
+    for coluna in df.columns:
+        tipo = tipo_bigquery(df[coluna])
+        if tipo is None:
+            continue
+        modo = "NULLABLE"
+        if tipo == "ARRAY<STRING>":
+            tipo, modo = "STRING", "REPEATED"
+
+        atual = existentes.get(coluna)
+        if atual is not None:
+            tipo_atual = _TIPOS_EQUIVALENTES.get(atual.field_type, atual.field_type)
+            if tipo_atual != tipo and modo != "REPEATED":
+                convertidas[coluna] = para_tipo_bigquery(df[coluna], tipo_atual)
+            schema.append(atual)
+        else:
+            schema.append(bigquery.SchemaField(coluna, tipo, mode=modo))
+
+    if convertidas:
+        df = df.assign(**convertidas)
+    return df, schema
+
+
+def _valor_sqlite(v: Any) -> Any:
+    """Converte um valor do DataFrame para um tipo aceito pelo sqlite3."""
+    if v is None or isinstance(v, (str, bytes)):
+        return v
+    if isinstance(v, np.ndarray):
+        v = v.tolist()
+    if isinstance(v, (list, dict)):
+        return json.dumps(v, ensure_ascii=False, default=str)
+    if pd.isna(v):
+        return None
+    if isinstance(v, (datetime, pd.Timestamp)):
+        return pd.Timestamp(v).isoformat()
+    if isinstance(v, np.generic):
+        return v.item()
+    if isinstance(v, (int, float)):
+        return v
+    return str(v)
+
+
+class LocalSink(Sink):
+    """
+    Destino local em SQLite, para rodar/perfilar o pipeline sem GCP.
+
+    A tabela cresce com ALTER TABLE a cada coluna nova (como o
+    ALLOW_FIELD_ADDITION do BigQuery); listas e dicts são gravados como JSON
+    e datas como texto ISO.
+    """
+
+    tipo = "local"
+
+    def __init__(self, tabela: Optional[str] = None, caminho: Optional[Path] = None):
+        super().__init__(tabela or config.SRC_TABLE_SAC_OCTADESK)
+        caminho = caminho or config.PIPELINE_LOCAL_DB
+        caminho.parent.mkdir(parents=True, exist_ok=True)
+        self.nome = self.tabela.split(".")[-1]
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(caminho), check_same_thread=False)
+        self._conn.execute(f'CREATE TABLE IF NOT EXISTS "{self.nome}" (chat_id TEXT, n_ticket TEXT)')
+        self._conn.commit()
+
+    def _colunas(self) -> List[str]:
+        return [r[1] for r in self._conn.execute(f'PRAGMA table_info("{self.nome}")')]
+
+    def _garantir_colunas(self, colunas: Iterable[str]) -> None:
+        atuais = set(self._colunas())
+        for col in colunas:
+            if col not in atuais:
+                self._conn.execute(f'ALTER TABLE "{self.nome}" ADD COLUMN "{col}"')
+                atuais.add(col)
+
+    @_medido("anexar")
+    def anexar(self, df: pd.DataFrame) -> None:
+        if df.empty:
+            return
+        colunas = list(df.columns)
+        linhas = [tuple(_valor_sqlite(v) for v in row) for row in df.itertuples(index=False, name=None)]
+        marcadores = ", ".join("?" for _ in colunas)
+        nomes = ", ".join(f'"{c}"' for c in colunas)
+        with self._lock:
+            self._garantir_colunas(colunas)
+            self._conn.executemany(f'INSERT INTO "{self.nome}" ({nomes}) VALUES ({marcadores})', linhas)
+            self._conn.commit()
+        self._contar_linhas("anexar", len(linhas))
+
+    @_medido("upsert")
+    def upsert(self, df: pd.DataFrame, chave: str = "chave_linha", legado: Sequence[str] = ()) -> str:
+        """DELETE das linhas com a mesma chave (ou, sem chave, mesmas colunas `legado`) + INSERT, numa transação."""
+        if df.empty:
+            return ""
+        from chaves import id_lote
+
+        # A mesma linha pode vir duas vezes (sobreposição do incremental, empates
+        # de createdAt entre páginas): o MERGE precisa de uma linha por chave
+        df = df.drop_duplicates(chave, keep="last")
+
+        lote = id_lote(df[chave])
+        df = df.assign(lote=lote)
+        colunas = list(df.columns)
+        linhas = [tuple(_valor_sqlite(v) for v in row) for row in df.itertuples(index=False, name=None)]
+        chaves = [(_valor_sqlite(v),) for v in df[chave]]
+        marcadores = ", ".join("?" for _ in colunas)
+        nomes = ", ".join(f'"{c}"' for c in colunas)
+        with self._lock:
+            self._garantir_colunas(colunas + list(legado))
+            self._conn.execute(f'CREATE INDEX IF NOT EXISTS "{self.nome}_{chave}" ON "{self.nome}" ("{chave}")')
+            with self._conn:
+                self._conn.executemany(f'DELETE FROM "{self.nome}" WHERE "{chave}" = ?', chaves)
+                if legado:
+                    iguais = " AND ".join(f'"{c}" IS ?' for c in legado)
+                    self._conn.executemany(
+                        f'DELETE FROM "{self.nome}" WHERE "{chave}" IS NULL AND {iguais}',
+                        [tuple(_valor_sqlite(v) for v in row)
+                         for row in df.reindex(columns=list(legado)).itertuples(index=False, name=None)]
+                    )
+                self._conn.executemany(f'INSERT INTO "{self.nome}" ({nomes}) VALUES ({marcadores})', linhas)
+        self._contar_linhas("upsert", len(linhas))
+        return lote
+
+    @_medido("ler_chaves")
+    def ler_chaves(self, desde: Optional[datetime] = None) -> pd.DataFrame:
+        with self._lock:
+            colunas = set(self._colunas())
+            if not {"number", "n_ticket", "upload"} <= colunas:
+                return pd.DataFrame(columns=["number", "n_ticket", "upload"])
+            if desde is None:
+                sql, params = f'SELECT number, n_ticket, upload FROM "{self.nome}"', ()
+            else:
+                sql, params = f'SELECT number, n_ticket, upload FROM "{self.nome}" WHERE upload > ?', (desde.isoformat(),)
+            df = pd.read_sql_query(sql, self._conn, params=params)
+        df["upload"] = pd.to_datetime(df["upload"], utc=True, errors="coerce")
+        self._contar_linhas("ler_chaves", len(df))
+        return df
+
+    @_medido("existentes")
+    def existentes(self, coluna: str, valores: List[Any]) -> Set[Any]:
+        with self._lock:
+            if coluna not in self._colunas():
+                return set()
+            encontrados: Set[Any] = set()
+            # SQLite limita a quantidade de parâmetros por consulta
+            for i in range(0, len(valores), 500):
+                lote = [_valor_sqlite(v) for v in valores[i:i + 500]]
+                marcadores = ", ".join("?" for _ in lote)
+                rows = self._conn.execute(
+                    f'SELECT DISTINCT "{coluna}" FROM "{self.nome}" WHERE "{coluna}" IN ({marcadores})', lote
+                ).fetchall()
+                encontrados.update(r[0] for r in rows)
+        return encontrados
+
+    @_medido("merge")
+    def merge(self, linhas: List[dict], chave: str, colunas: List[str],
+              repetidos: Iterable[str] = ()) -> None:
+        set_clause = ", ".join(f'"{c}" = ?' for c in colunas)
+        valores = [
+            tuple(_valor_sqlite(linha.get(c)) for c in colunas) + (_valor_sqlite(linha[chave]),)
+            for linha in linhas
+        ]
+        with self._lock:
+            self._garantir_colunas([chave] + colunas)
+            self._conn.executemany(f'UPDATE "{self.nome}" SET {set_clause} WHERE "{chave}" = ?', valores)
+            self._conn.commit()
+        self._contar_linhas("merge", len(linhas))
+
+    @_medido("tickets_abertos")
+    def tickets_abertos(self) -> List[str]:
+        with self._lock:
+            if "status_ticket" not in self._colunas():
+                return []
+            rows = self._conn.execute(
+                f'SELECT DISTINCT n_ticket FROM "{self.nome}" '
+                f"WHERE n_ticket IS NOT NULL AND status_ticket != 'Resolvido'"
+            ).fetchall()
+        return [r[0] for r in rows]
+
+
+_sinks = {}
+_sinks_lock = threading.Lock()
+
+
+def carga_upsert() -> bool:
+    """True quando PIPELINE_CARGA=upsert (lotes com MERGE pela chave_linha, sem verificação de duplicidade)."""
+    carga = config.PIPELINE_CARGA
+    if carga not in ("append", "upsert"):
+        raise RuntimeError(f"PIPELINE_CARGA inválido: {carga}")
+    return carga == "upsert"
+
+
+def obter_sink(tabela: Optional[str] = None, tipo: Optional[str] = None) -> Sink:
+    """Sink compartilhado para `tabela`, conforme PIPELINE_SINK ('bigquery' ou 'local')."""
+    tabela = tabela or config.SRC_TABLE_SAC_OCTADESK
+    tipo = tipo or config.PIPELINE_SINK
+    with _sinks_lock:
+        if (tipo, tabela) not in _sinks:
+            if tipo == "local":
+                _sinks[(tipo, tabela)] = LocalSink(tabela)
+            elif tipo == "bigquery":
+                _sinks[(tipo, tabela)] = BigQuerySink(tabela)
+            else:
+                raise RuntimeError(f"PIPELINE_SINK inválido: {tipo}")
+        return _sinks[(tipo, tabela)]
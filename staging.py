@@ -0,0 +1,82 @@
+import shutil
+import threading
+import pandas as pd
+from pathlib import Path
+from typing import Iterator, List, Optional
+import config
+
+
+class Staging:
+    """
+    Diretório de partes NDJSON (gzip) usado pelo modo streaming.
+
+    Cada página normalizada vira um arquivo `part-NNNNN.ndjson.gz`; as etapas
+    seguintes leem as partes uma a uma, então a memória fica limitada ao
+    tamanho da parte e não ao tamanho do período.
+    """
+
+    def __init__(self, nome: str, raiz: Optional[Path] = None, limpar: bool = True):
+        self.dir = (raiz or config.PIPELINE_STAGING_DIR) / nome
+        if limpar and self.dir.exists():
+            shutil.rmtree(self.dir)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._proxima = len(self.partes())
+        self.linhas = 0
+
+    def gravar(self, df: pd.DataFrame) -> Optional[Path]:
+        """Grava `df` como uma nova parte (DataFrames vazios são ignorados)."""
+        if df.empty:
+            return None
+        with self._lock:
+            caminho = self.dir / f"part-{self._proxima:05d}.ndjson.gz"
+            self._proxima += 1
+            self.linhas += len(df)
+        df.to_json(caminho, orient="records", lines=True, date_format="iso",
+                   force_ascii=False, compression="gzip")
+        return caminho
+
+    def partes(self) -> List[Path]:
+        return sorted(self.dir.glob("part-*.ndjson.gz"))
+
+    def iterar(self) -> Iterator[pd.DataFrame]:
+        """Lê as partes uma por vez, na ordem em que foram gravadas."""
+        for caminho in self.partes():
+            yield ler_parte(caminho)
+
+    def ler(self) -> pd.DataFrame:
+        """Concatena todas as partes (use só quando o volume couber em memória)."""
+        partes = list(self.iterar())
+        return pd.concat(partes, ignore_index=True) if partes else pd.DataFrame()
+
+    def remover(self) -> None:
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+
+def ler_parte(caminho: Path) -> pd.DataFrame:
+    # dtype/convert_dates desligados: os valores voltam exatamente como no JSON
+    return pd.read_json(caminho, orient="records", lines=True, dtype=False,
+                        convert_dates=False, compression="gzip")
+
+
+def particionar(origem: Staging, coluna: str, n_buckets: int, prefixo: str) -> List[Staging]:
+    """
+    Redistribui as linhas de `origem` em `n_buckets` stagings pelo valor
+    numérico de `coluna` (número do ticket) módulo n_buckets, para que o join
+    de cada bucket caiba em memória. Linhas com `coluna` nula ou não numérica
+    vão para um bucket extra, o último da lista.
+    """
+    buckets = [Staging(f"{prefixo}-{i:03d}", raiz=origem.dir.parent) for i in range(n_buckets + 1)]
+    for df in origem.iterar():
+        if coluna not in df.columns:
+            buckets[-1].gravar(df)
+            continue
+        chave = pd.to_numeric(df[coluna], errors="coerce")
+        nulos = chave.isna()
+        buckets[-1].gravar(df[nulos])
+        if nulos.all():
+            continue
+        destino = chave[~nulos].astype("int64") % n_buckets
+        for i, grupo in df[~nulos].groupby(destino.to_numpy()):
+            buckets[int(i)].gravar(grupo)
+    return buckets
@@ -0,0 +1,55 @@
+import pandas as pd
+
+from chaves import chave_linha, id_lote
+from sink import LocalSink
+
+
+def test_chave_linha_normaliza_tipos():
+    df = pd.DataFrame({"number": [123, "123", 123.0], "n_ticket": [7, "7", 7.0]}, dtype="object")
+    chaves = chave_linha(df, ["number", "n_ticket"])
+    assert chaves.nunique() == 1
+    assert len(chaves.iloc[0]) == 32
+
+
+def test_chave_linha_muda_com_cada_coluna():
+    df = pd.DataFrame({"number": [123, 124, 123, 123], "n_ticket": [7, 7, 8, None]}, dtype="object")
+    chaves = chave_linha(df, ["number", "n_ticket"])
+    assert chaves.nunique() == 4
+
+
+def test_chave_linha_estavel_entre_chamadas():
+    df = pd.DataFrame({"number": [1, 2], "n_ticket": [10, None]})
+    assert chave_linha(df, ["number", "n_ticket"]).tolist() == chave_linha(df.copy(), ["number", "n_ticket"]).tolist()
+
+
+def _lote() -> pd.DataFrame:
+    df = pd.DataFrame({
+        "number": ["1", "2", "3", "3"],
+        "n_ticket": ["10", "20", None, None],
+        "status_ticket": ["Aberto", "Novo", "Aberto", "Resolvido"],
+        "upload": pd.Timestamp("2025-01-31T12:00:00Z"),
+    })
+    return df.assign(chave_linha=chave_linha(df, ["number", "n_ticket"]))
+
+
+def test_upsert_repetido_nao_duplica(tmp_path):
+    sink = LocalSink("projeto.dataset.octadesk", tmp_path / "local.sqlite")
+    lote = _lote()
+
+    primeiro = sink.upsert(lote, legado=("number", "n_ticket"))
+    linhas = len(sink.ler_chaves())
+    segundo = sink.upsert(lote, legado=("number", "n_ticket"))
+
+    # A chave repetida dentro do lote fica só com a última linha
+    assert linhas == 3
+    assert len(sink.ler_chaves()) == linhas
+    assert primeiro == segundo == id_lote(lote["chave_linha"].drop_duplicates())
+
+
+def test_upsert_substitui_linha_legada(tmp_path):
+    sink = LocalSink("projeto.dataset.octadesk", tmp_path / "local.sqlite")
+    legada = _lote().drop(columns="chave_linha").iloc[:1]
+    sink.anexar(legada)
+
+    sink.upsert(_lote(), legado=("number", "n_ticket"))
+    assert len(sink.ler_chaves()) == 3
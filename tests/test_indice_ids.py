@@ -0,0 +1,38 @@
+import pandas as pd
+import pytest
+
+import config
+from indice_ids import IndiceIds
+from sink import LocalSink
+
+
+@pytest.fixture
+def sink(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "PIPELINE_ESTADO_PATH", tmp_path / "estado.json", raising=False)
+    monkeypatch.setattr(config, "PIPELINE_INDICE_PATH", tmp_path / "indice_ids.npz", raising=False)
+    return LocalSink("projeto.dataset.octadesk", tmp_path / "local.sqlite")
+
+
+def _lote(numeros, upload) -> pd.DataFrame:
+    return pd.DataFrame({
+        "number": [str(n) for n in numeros],
+        "n_ticket": [str(n * 10) for n in numeros],
+        "upload": pd.Timestamp(upload),
+    })
+
+
+def test_sincronizar_le_cargas_de_outro_processo(sink):
+    indice = IndiceIds.carregar()
+    indice.sincronizar(sink)
+
+    # Load deste pipeline (append) e registro no índice
+    lote = _lote([1, 2], "2025-01-31T12:00:00+00:00")
+    sink.anexar(lote)
+    indice.registrar_upload(lote)
+
+    # Outro escritor (ex.: execução em upsert) sem registrar_upload
+    sink.anexar(_lote([3], "2025-01-31T13:00:00+00:00"))
+
+    indice = IndiceIds.carregar()
+    indice.sincronizar(sink)
+    assert indice.contem("number", pd.Series(["1", "2", "3", "4"])).tolist() == [True, True, True, False]
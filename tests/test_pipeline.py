@@ -0,0 +1,71 @@
+import itertools
+import threading
+
+import pytest
+
+from pipeline import Estagio, Pipeline
+
+
+def _executar(pipeline: Pipeline, limite: float = 10.0):
+    """executar() numa thread: um _FIM perdido vira falha do teste em vez de travar a suíte."""
+    saida = {}
+
+    def rodar():
+        try:
+            saida["resultados"] = pipeline.executar()
+        except BaseException as e:
+            saida["erro"] = e
+
+    thread = threading.Thread(target=rodar, daemon=True)
+    thread.start()
+    thread.join(limite)
+    assert not thread.is_alive(), "pipeline não terminou"
+    if "erro" in saida:
+        raise saida["erro"]
+    return saida["resultados"]
+
+
+def test_erro_em_estagio_cancela_e_e_relancado():
+    def falhar(item):
+        if item == 3:
+            raise ValueError("página inválida")
+        return item
+
+    # Origem infinita: só termina se a falha cancelar o produtor
+    pipeline = Pipeline(fila_max=2).cadeia("origem", itertools.count(),
+                                           Estagio("falha", falhar),
+                                           Estagio("destino", lambda item: None))
+    with pytest.raises(ValueError, match="página inválida"):
+        _executar(pipeline)
+
+
+def test_erro_em_tarefa_cancela_a_cadeia():
+    def tarefa():
+        raise RuntimeError("status falhou")
+
+    pipeline = (Pipeline(fila_max=2)
+                .cadeia("origem", itertools.count(), Estagio("destino", lambda item: None))
+                .tarefa("status", tarefa))
+    with pytest.raises(RuntimeError, match="status falhou"):
+        _executar(pipeline)
+
+
+def test_fim_chega_a_todos_os_workers():
+    processados = []
+    lock = threading.Lock()
+
+    def registrar(item):
+        with lock:
+            processados.append(item)
+
+    pipeline = Pipeline(fila_max=1).cadeia("origem", range(50),
+                                           Estagio("dobrar", lambda item: item * 2, workers=3),
+                                           Estagio("registrar", registrar, workers=2))
+    _executar(pipeline)
+    assert sorted(processados) == [i * 2 for i in range(50)]
+    assert all(estagio.fim is not None for estagio in pipeline.estagios)
+
+
+def test_resultado_da_tarefa():
+    resultados = _executar(Pipeline().tarefa("status", lambda: ["ok"]))
+    assert resultados == {"status": ["ok"]}
@@ -1,26 +1,33 @@
+from __future__ import annotations
+
 import requests 
 import json
-import pandas as pd
-from google.cloud import bigquery
-from time import sleep  
+import hashlib
 from datetime import datetime, timedelta 
-from typing import List, Tuple
-from config import OCTA_BASE_URL, OCTA_HEADERS, BQ, SRC_TABLE_SAC_OCTADESK, TIMEZONE
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+import config
+from octadesk import obter_cliente, resultados
+from paginacao import iterar_paginas
+from checkpoint import obter_checkpoint
+from campos_custom import expandir_campos_custom
+from cache_local import obter_cache
+from estado import carregar_estado, atualizar_estado
+from sink import Sink, obter_sink
+from indice_abertos import IndiceAbertos
+from importacao import sob_demanda
+from metricas import medido, obter_metricas
+
+pd = sob_demanda("pandas")
+
 
 def fetch_octadesk_tickets(params: dict) -> pd.DataFrame:
-    url  = f"{OCTA_BASE_URL}/tickets"
-    resp = requests.get(url, headers=OCTA_HEADERS, params=params)
-    if resp.status_code != 200:
-        print(f"Erro status: {resp.status_code}\n{resp.text}")
-        resp.raise_for_status()
-    payload = resp.json()
-    if isinstance(payload, dict) and "results" in payload:
-        data = payload["results"]
-    elif isinstance(payload, list):
-        data = payload
-    else:
-        data = []
-    return pd.json_normalize(data)
+    try:
+        payload = obter_cliente().get_json("/tickets", params=params)
+    except requests.HTTPError as err:
+        print(f"Erro status: {err.response.status_code}\n{err.response.text}")
+        raise
+    return pd.json_normalize(resultados(payload))
 
 
 def format_iso(dt: datetime) -> str:
@@ -57,7 +64,7 @@ def fetch_tickets_with_split(start: datetime,
             "filters[1][value]": e_iso
         })
     except requests.exceptions.HTTPError as err:
-        code = err.response.status_code if err.response else None
+        code = err.response.status_code if err.response is not None else None
         if code and 500 <= code < 600 and (end - start) > min_delta:
             mid   = start + (end - start) / 2
             left  = fetch_tickets_with_split(start, mid,  min_delta, limit)
@@ -66,143 +73,234 @@ def fetch_tickets_with_split(start: datetime,
         print(f"Pulando janela {s_iso}→{e_iso}: {err}")
         return pd.DataFrame()
 
+# Campos customizados do ticket levados para colunas ticket_*
+CHAVES_CUSTOM_TICKET = [
+    "codigo_de_rastreio", "cpf", "data_de_pagamento",
+    "email_do_cliente", "motivo_de_contatos",
+    "n_da_nota_fiscal", "n_do_pedido",
+    "n_do_pedido_bling", "produto", "tipo_do_problema"
+]
+
 def extrair_custom_ticket(df_ticket_filtro1: pd.DataFrame) -> pd.DataFrame:
-    
-    keys = [
-        "codigo_de_rastreio", "cpf", "data_de_pagamento",
-        "email_do_cliente", "motivo_de_contatos",
-        "n_da_nota_fiscal", "n_do_pedido",
-        "n_do_pedido_bling", "produto", "tipo_do_problema"
-    ]
-    
-    def filtrar_custom(lista):
-        return {
-            item['key']: item['value']
-            for item in lista
-            if item['key'] in keys
-        }  
-    
-    custom_dicts = df_ticket_filtro1['campo_custom_ticket'].apply(filtrar_custom)  
-    custom_df = pd.DataFrame(custom_dicts.tolist())                                  
-
-    rename_map = {k: f"ticket_{k}" for k in custom_df.columns}                      
-    custom_df = custom_df.rename(columns=rename_map)                                
+    """
+    uuid + uma coluna ticket_<chave> por campo de CHAVES_CUSTOM_TICKET em
+    `campo_custom_ticket`. Tickets sem campos (NaN) ficam com as colunas vazias.
+    """
+    custom_df = expandir_campos_custom(
+        df_ticket_filtro1['campo_custom_ticket'],
+        prefixo="ticket_",
+        chaves=CHAVES_CUSTOM_TICKET
+    )
 
     resultado = pd.concat(
-        [df_ticket_filtro1[['uuid']].reset_index(drop=True), custom_df],
+        [df_ticket_filtro1[['uuid']], custom_df],
         axis=1
-    )  
+    ).reset_index(drop=True)
 
     return resultado
 
+def iterar_tickets(propriedade: str, inicio: datetime, fim: Optional[datetime] = None,
+                   limit: int = 100, max_retries: int = 3,
+                   concorrencia: Optional[int] = None) -> Iterator[list]:
+    """
+    Pagina /tickets filtrando `propriedade` (createdAt ou updatedAt) em
+    [inicio, fim] e ordenando por ela de forma crescente, entregando uma
+    página por vez. Sem `fim`, traz tudo a partir de `inicio`.
+
+    Com `fim`, as páginas ficam num checkpoint em disco: se a paginação
+    falhar, rodar de novo o mesmo intervalo continua da página seguinte.
+    """
+    filtros = [("ge", inicio)] + ([("le", fim)] if fim is not None else [])
+    base_params = {}
+    for i, (operador, valor) in enumerate(filtros):
+        # Remove microssegundos e força ISO sem frações
+        base_params[f"filters[{i}][property]"] = propriedade
+        base_params[f"filters[{i}][operator]"] = operador
+        base_params[f"filters[{i}][value]"]    = valor.replace(microsecond=0).isoformat()
+
+    cliente = obter_cliente()
+
+    def buscar_pagina(page: int) -> list:
+        params = {
+            **base_params,
+            "page":            page,
+            "limit":           limit,
+            "sort[property]":  propriedade,
+            "sort[direction]": "asc"
+        }
+
+        # Retry/backoff em 409/500 fica a cargo do cliente
+        try:
+            return resultados(cliente.get_json("/tickets", params=params, max_retries=max_retries))
+        except requests.RequestException:
+            print(f"Todas as tentativas falharam na página {page}.")
+            raise
+
+    checkpoint = None
+    if fim is not None:
+        checkpoint = obter_checkpoint("tickets", {"base_url": cliente.base_url, "limit": limit,
+                                                  "propriedade": propriedade, **base_params})
+    return iterar_paginas(buscar_pagina, limit, concorrencia, checkpoint=checkpoint)
+
+@medido("listar_tickets")
+def listar_tickets(propriedade: str, inicio: datetime, fim: Optional[datetime] = None,
+                   limit: int = 100, max_retries: int = 3,
+                   concorrencia: Optional[int] = None) -> list:
+    """Todos os tickets de `iterar_tickets` numa única lista."""
+    return [t for pagina in iterar_tickets(propriedade, inicio, fim, limit, max_retries, concorrencia)
+            for t in pagina]
+
 def fetch_all_tickets(start_dt: datetime, end_dt: datetime,
-                      limit: int = 100, max_retries: int = 3) -> pd.DataFrame:
-    all_tickets = []
-    page = 1
+                      limit: int = 100, max_retries: int = 3,
+                      concorrencia: Optional[int] = None,
+                      raise_on_error: bool = False) -> pd.DataFrame:
+    try:
+        all_tickets = listar_tickets("createdAt", start_dt, end_dt, limit, max_retries, concorrencia)
+    except requests.RequestException as err:
+        if raise_on_error:
+            raise
+        print(f"Falha definitiva na paginação de tickets: {err} "
+              f"(páginas já baixadas ficam no checkpoint; rode de novo para continuar)")
+        return pd.DataFrame()
+
+    return pd.json_normalize(all_tickets)
+
+def tickets_atualizados(desde: datetime) -> Optional[Dict[str, dict]]:
+    """
+    Tickets com updatedAt >= `desde` (número → payload da listagem), via
+    listagem paginada. Retorna None se a listagem falhar (o chamador deve
+    então verificar todos).
+    """
+    try:
+        return {str(t.get("number")): t for t in listar_tickets("updatedAt", desde)}
+    except requests.RequestException as err:
+        print(f"Não foi possível listar tickets atualizados: {err}")
+        return None
+
+def numeros_tickets_atualizados(desde: datetime) -> Optional[Set[str]]:
+    """Números dos tickets com updatedAt >= `desde` (None se a listagem falhar)."""
+    atualizados = tickets_atualizados(desde)
+    return set(atualizados) if atualizados is not None else None
+
+def faixas_de_numeros(numeros: List[str], limit: int = 100) -> Tuple[List[Tuple[int, int]], List[str]]:
+    """
+    Agrupa números de ticket em faixas [ini, fim] que compensam ser lidas
+    pela listagem: uma faixa só é usada se cobrir mais tickets do que as
+    páginas que custa (ceil((fim - ini + 1) / limit)). Devolve as faixas e
+    os números que ficam para o GET individual.
+    """
+    inteiros = sorted({int(n) for n in numeros if str(n).isdigit()})
+    avulsos = [n for n in numeros if not str(n).isdigit()]
+    faixas: List[Tuple[int, int]] = []
 
-    # Remove microssegundos e força ISO sem frações
-    start_iso = start_dt.replace(microsecond=0).isoformat()
-    end_iso   = end_dt  .replace(microsecond=0).isoformat()
+    grupo: List[int] = []
+    for n in inteiros + [None]:
+        # Um buraco maior que uma página sempre abre uma faixa nova
+        if grupo and (n is None or n - grupo[-1] > limit):
+            paginas = -(-(grupo[-1] - grupo[0] + 1) // limit)
+            if len(grupo) > paginas:
+                faixas.append((grupo[0], grupo[-1]))
+            else:
+                avulsos.extend(str(x) for x in grupo)
+            grupo = []
+        if n is not None:
+            grupo.append(n)
+    return faixas, avulsos
 
-    while True:
-        # Monta filtros como array de objetos
+def listar_tickets_por_faixa(inicio: int, fim: int, limit: int = 100,
+                             concorrencia: Optional[int] = None) -> List[dict]:
+    """
+    Tickets com número em [inicio, fim], pela listagem ordenada por número.
+    Se a API devolver tickets fora da faixa (filtro ignorado), a leitura é
+    interrompida com ValueError para não percorrer a base inteira.
+    """
+    cliente = obter_cliente()
+
+    def buscar_pagina(page: int) -> list:
         params = {
-            "filters[0][property]": "createdAt",
+            "filters[0][property]": "number",
             "filters[0][operator]": "ge",
-            "filters[0][value]":    start_iso,
-            "filters[1][property]": "createdAt",
+            "filters[0][value]":    inicio,
+            "filters[1][property]": "number",
             "filters[1][operator]": "le",
-            "filters[1][value]":    end_iso,
-            "page":                 page,
-            "limit":                limit,
-            "sort[property]":       "createdAt",
-            "sort[direction]":      "asc"
+            "filters[1][value]":    fim,
+            "page":            page,
+            "limit":           limit,
+            "sort[property]":  "number",
+            "sort[direction]": "asc"
         }
+        return resultados(cliente.get_json("/tickets", params=params))
 
-        # Retry em caso de 409/500 ou outros HTTPError
-        for attempt in range(1, max_retries + 1):
-            resp = requests.get(f"{OCTA_BASE_URL}/tickets",
-                                headers=OCTA_HEADERS,
-                                params=params)
-            print(f"Tentativa {attempt} — status {resp.status_code}")  # ajuda no debug
-            if resp.status_code in (409, 500):
-                sleep(2 ** (attempt - 1))
-                continue
-            try:
-                resp.raise_for_status()
-            except requests.HTTPError:
-                if attempt == max_retries:
-                    print(f"Todas as tentativas falharam na página {page}.")
-                    return pd.DataFrame()
-                continue
-            break
-
-        data = resp.json()
-        if not data:
-            break
-
-        all_tickets.extend(data)
-        if len(data) < limit:
-            break
-        page += 1
+    tickets = []
+    for pagina in iterar_paginas(buscar_pagina, limit, concorrencia):
+        for t in pagina:
+            if not inicio <= int(t.get("number", -1)) <= fim:
+                raise ValueError(f"Listagem por número devolveu o ticket {t.get('number')} "
+                                 f"fora da faixa {inicio}-{fim}")
+        tickets.extend(pagina)
+    return tickets
 
-    return pd.json_normalize(all_tickets)
+def _tickets_por_faixas(numeros: List[str]) -> Dict[str, dict]:
+    """Payloads dos `numeros` lidos em lote pelas faixas que compensam; os demais ficam de fora."""
+    faixas, _ = faixas_de_numeros(numeros)
+    procurados = set(numeros)
+    encontrados: Dict[str, dict] = {}
+    for inicio, fim in faixas:
+        try:
+            for t in listar_tickets_por_faixa(inicio, fim):
+                if str(t.get("number")) in procurados:
+                    encontrados[str(t.get("number"))] = t
+        except (requests.RequestException, ValueError) as err:
+            print(f"Listagem da faixa {inicio}-{fim} falhou ({err}); usando GET por ticket")
+    return encontrados
+
+def _buscar_detalhe_ticket(ticket_id: str) -> dict:
+    return obter_cliente().get_json(f"/tickets/{ticket_id}")
+
+# Colunas da tabela de destino reescritas pela atualização de status
+CAMPOS_STATUS = [
+    "ticket_produto",
+    "ticket_n_do_pedido",
+    "ticket_n_do_pedido_bling",
+    "tags",
+    "ticket_cpf",
+    "status_ticket",
+    "status_ticket2",
+]
+
+def extrair_status_ticket(ticket_id: str, data: dict) -> dict:
+    """Monta a linha de atualização (n_ticket + CAMPOS_STATUS) a partir do JSON do ticket."""
+    custom = {item["key"]: item["value"] for item in data.get("customField") or []}
+    return {
+        "n_ticket":                 str(ticket_id),
+        "ticket_produto":           custom.get("produto"),
+        "ticket_n_do_pedido":       custom.get("n_do_pedido"),
+        "ticket_n_do_pedido_bling": custom.get("n_do_pedido_bling"),
+        "tags":                     data.get("tags") or [],  # Lista de strings do Python
+        "ticket_cpf":               custom.get("cpf"),
+        "status_ticket":            (data.get("status") or {}).get("name"),
+        "status_ticket2": (
+            ((data.get("lastHumanInteraction") or {})
+                .get("propertiesChanges") or {})
+                .get("status")
+        ),
+    }
 
 def update_ticket_status_by_ticket_id(ticket_id: str) -> str:
     try:
-        # 1. Busca dados do ticket na API Octadesk
-        resp = requests.get(f"{OCTA_BASE_URL}/tickets/{ticket_id}", headers=OCTA_HEADERS)
-        resp.raise_for_status()
-        data = resp.json()
+        # 1. Busca dados atuais do ticket na API Octadesk (sem ler do cache:
+        #    a gravação precisa do status de agora) e atualiza o cache
+        data = _buscar_detalhe_ticket(ticket_id)
+        obter_cache().gravar("ticket", ticket_id, data)
 
         # 2. Extrai campos customizados e status
-        custom = {item["key"]: item["value"] for item in data.get("customField", [])}
-        tipo_produto   = custom.get("produto")
-        n_pedido       = custom.get("n_do_pedido")
-        n_pedido_bling = custom.get("n_do_pedido_bling")
-        tags_list      = data.get("tags", [])  # Lista de strings do Python
-        cpf            = custom.get("cpf")
-        status1        = data.get("status", {}).get("name")
-        status2        = (
-            data.get("lastHumanInteraction", {})
-                .get("propertiesChanges", {})
-                .get("status")
-        )
-
-        # 3. Monta a query usando parâmetro de array
-        sql = f"""
-        UPDATE `{SRC_TABLE_SAC_OCTADESK}`
-        SET
-          ticket_produto           = @tipo_produto,
-          ticket_n_do_pedido       = @n_pedido,
-          ticket_n_do_pedido_bling = @n_pedido_bling,
-          tags                     = @tags,
-          ticket_cpf               = @cpf,
-          status_ticket            = @status1,
-          status_ticket2           = @status2
-        WHERE n_ticket = @ticket_id
-        """
-
-        # 4. Prepara parâmetros, incluindo ArrayQueryParameter para tags
-        job_config = bigquery.QueryJobConfig(
-            query_parameters=[
-                bigquery.ScalarQueryParameter("tipo_produto", "STRING", tipo_produto),
-                bigquery.ScalarQueryParameter("n_pedido", "STRING", n_pedido),
-                bigquery.ScalarQueryParameter("n_pedido_bling", "STRING", n_pedido_bling),
-                bigquery.ArrayQueryParameter("tags", "STRING", tags_list),
-                bigquery.ScalarQueryParameter("cpf", "STRING", cpf),
-                bigquery.ScalarQueryParameter("status1", "STRING", status1),
-                bigquery.ScalarQueryParameter("status2", "STRING", status2),
-                bigquery.ScalarQueryParameter("ticket_id", "STRING", ticket_id),
-            ]
-        )  # :contentReference[oaicite:2]{index=2}
-
-        # 5. Executa a query e aguarda a conclusão
-        query_job = BQ.query(sql, job_config=job_config)
-        query_job.result()
-
-        # 6. Retorna confirmação com timestamp
-        date = datetime.now(TIMEZONE)
+        linha = extrair_status_ticket(ticket_id, data)
+
+        # 3. Grava no destino (no BigQuery, um UPDATE parametrizado com tags como ARRAY)
+        aplicar_status_merge([linha])
+
+        # 4. Retorna confirmação com timestamp
+        date = datetime.now(config.TIMEZONE)
         return f"Update realizado com sucesso para o ticket {ticket_id} - {date}"
 
     except requests.RequestException as e:
@@ -210,3 +308,145 @@ def update_ticket_status_by_ticket_id(ticket_id: str) -> str:
     except Exception as e:
         # Captura erros do BigQuery, incluindo tipo de parâmetro incorreto
         return f"Erro ao atualizar ticket {ticket_id}: {e}"
+
+def impressao_status(linha: dict) -> str:
+    """Fingerprint (sha1) dos campos gravados pela atualização de status."""
+    conteudo = json.dumps({campo: linha.get(campo) for campo in CAMPOS_STATUS},
+                          sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(conteudo.encode("utf-8")).hexdigest()
+
+def atualizar_status_em_lote(tickets: List[str],
+                             max_workers: Optional[int] = None,
+                             sink: Optional[Sink] = None) -> List[str]:
+    """
+    Versão em lote de update_ticket_status_by_ticket_id: busca todos os
+    tickets e aplica um só MERGE por n_ticket no destino (sink.Sink; no
+    BigQuery, via tabela de staging carregada num único load job).
+
+    Os payloads vêm em lote das listagens: a de updatedAt desde a última
+    atualização (que já traz customField, tags e status) e, para os demais,
+    a listagem por faixas de número (faixas_de_numeros). Só os tickets
+    avulsos, fora de qualquer faixa que compense, usam GET /tickets/{id}.
+
+    Só são gravados tickets cujo fingerprint (impressao_status) mudou desde a
+    última atualização. Se já houve uma atualização anterior, tickets com
+    fingerprint conhecido e sem updatedAt novo na listagem nem são baixados.
+    Retorna uma mensagem de sucesso/erro por ticket, como a versão unitária.
+    """
+    mensagens: Dict[str, str] = {}
+    inicio_execucao = datetime.now(config.TIMEZONE)
+    estado = carregar_estado()
+    impressoes: Dict[str, str] = estado.get("impressoes_status", {})
+
+    def coletar(ticket_id: str) -> Optional[dict]:
+        try:
+            data = _buscar_detalhe_ticket(ticket_id)
+            obter_cache().gravar("ticket", ticket_id, data)
+            return extrair_status_ticket(ticket_id, data)
+        except requests.RequestException as e:
+            mensagens[ticket_id] = f"Erro na requisição à API Octadesk: {e}"
+            return None
+        except Exception as e:
+            # Payload inesperado não derruba o lote: só este ticket fica com erro
+            mensagens[ticket_id] = f"Erro ao atualizar ticket {ticket_id}: {e}"
+            return None
+
+    def extrair(ticket_id: str) -> Optional[dict]:
+        try:
+            return extrair_status_ticket(ticket_id, payloads[ticket_id])
+        except Exception as e:
+            mensagens[ticket_id] = f"Erro ao atualizar ticket {ticket_id}: {e}"
+            return None
+
+    tickets = list(dict.fromkeys(str(t) for t in tickets))
+
+    # 1. Descarta sem baixar os tickets que não tiveram updatedAt novo; os
+    #    que tiveram já vêm completos na própria listagem por updatedAt
+    a_baixar = tickets
+    payloads: Dict[str, dict] = {}
+    ultima = estado.get("ultima_atualizacao_status")
+    if ultima:
+        alterados = tickets_atualizados(datetime.fromisoformat(ultima))
+        if alterados is not None:
+            a_baixar = [t for t in tickets if t in alterados or t not in impressoes]
+            for t, data in alterados.items():
+                obter_cache().gravar("ticket", t, data)
+            payloads = {t: alterados[t] for t in a_baixar if t in alterados}
+            for t in tickets:
+                if t not in alterados and t in impressoes:
+                    mensagens[t] = f"Ticket {t} sem alterações desde {ultima}"
+
+    # 2. Os que faltam: listagem por faixas de número onde compensa e GET
+    #    individual só para os avulsos. Sem cache: um payload antigo gravaria um
+    #    status que a próxima listagem por updatedAt (desde inicio_execucao) não corrige
+    faltando = [t for t in a_baixar if t not in payloads]
+    if config.OCTA_STATUS_POR_FAIXA and faltando:
+        por_faixa = _tickets_por_faixas(faltando)
+        for t, data in por_faixa.items():
+            obter_cache().gravar("ticket", t, data)
+        payloads.update(por_faixa)
+    avulsos = [t for t in a_baixar if t not in payloads]
+
+    metricas = obter_metricas()
+    metricas.contar("status_fonte_total", len(a_baixar) - len(faltando), fonte="listagem_updatedAt")
+    metricas.contar("status_fonte_total", len(faltando) - len(avulsos), fonte="listagem_faixa")
+    metricas.contar("status_fonte_total", len(avulsos), fonte="detalhe")
+
+    # 3. Coleta os payloads e mantém só os que mudaram
+    coletadas = [l for l in (extrair(t) for t in a_baixar if t in payloads) if l is not None]
+    workers = max(1, max_workers or config.OCTA_ENRIQUECIMENTO_WORKERS)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        coletadas += [l for l in pool.map(coletar, avulsos) if l is not None]
+
+    linhas: List[dict] = []
+    novas_impressoes: Dict[str, str] = {}
+    for linha in coletadas:
+        impressao = impressao_status(linha)
+        if impressoes.get(linha["n_ticket"]) == impressao:
+            mensagens[linha["n_ticket"]] = f"Ticket {linha['n_ticket']} sem alterações"
+            continue
+        linhas.append(linha)
+        novas_impressoes[linha["n_ticket"]] = impressao
+
+    # 4. Staging + MERGE único
+    falhou = False
+    if linhas:
+        try:
+            aplicar_status_merge(linhas, sink)
+            date = datetime.now(config.TIMEZONE)
+            for linha in linhas:
+                mensagens[linha["n_ticket"]] = (
+                    f"Update realizado com sucesso para o ticket {linha['n_ticket']} - {date}"
+                )
+        except Exception as e:
+            # Captura erros do destino (load ou MERGE); nenhum ticket do lote foi gravado
+            falhou = True
+            for linha in linhas:
+                mensagens[linha["n_ticket"]] = f"Erro ao atualizar ticket {linha['n_ticket']}: {e}"
+
+    metricas.contar("status_tickets_total", len(tickets) - len(a_baixar), resultado="nao_baixado")
+    metricas.contar("status_tickets_total", len(coletadas) - len(linhas), resultado="sem_alteracao")
+    metricas.contar("status_tickets_total", 0 if falhou else len(linhas), resultado="atualizado")
+    metricas.contar("status_tickets_total", sum(1 for m in mensagens.values() if m.startswith("Erro")),
+                    resultado="erro")
+
+    # 5. Fingerprints e marca de tempo só avançam se o MERGE foi aplicado
+    if not falhou:
+        # Tickets fora da lista (ex.: já resolvidos) saem do estado
+        ativos = set(tickets)
+        impressoes = {t: h for t, h in impressoes.items() if t in ativos}
+        impressoes.update(novas_impressoes)
+        atualizar_estado("impressoes_status", impressoes)
+        if not any(m.startswith("Erro") for m in mensagens.values()):
+            atualizar_estado("ultima_atualizacao_status", inicio_execucao.isoformat())
+
+    return [mensagens[t] for t in tickets]
+
+def aplicar_status_merge(linhas: List[dict], sink: Optional[Sink] = None) -> None:
+    """
+    Aplica `linhas` no destino com um único MERGE por n_ticket (via staging
+    no BigQuery) e tira do índice de abertos os tickets que fecharam.
+    """
+    sink = sink or obter_sink()
+    sink.merge(linhas, "n_ticket", CAMPOS_STATUS, repetidos=("tags",))
+    IndiceAbertos.carregar(sink).aplicar_status(linhas)
@@ -1,14 +1,22 @@
-from config import SRC_TABLE_SAC_OCTADESK, BQ
-from ticket import update_ticket_status_by_ticket_id
+from ticket import atualizar_status_em_lote
+from cache_local import obter_cache
+from octadesk import obter_cliente
+from sink import obter_sink
+from indice_abertos import tickets_abertos
+from metricas import obter_metricas
 
-sql = f"""
-SELECT DISTINCT n_ticket
-FROM {SRC_TABLE_SAC_OCTADESK}
-WHERE (n_ticket is not null) AND (status_ticket != 'Resolvido')
-"""
+sink = obter_sink()
+metricas = obter_metricas()
 
-df_tabela = BQ.query(sql).to_dataframe()
-tickets_list = df_tabela["n_ticket"].tolist()
+with metricas.etapa("status") as etapa:
+    tickets_list = tickets_abertos(sink)
+    etapa.linhas_entrada = len(tickets_list)
 
-for ticket in tickets_list:
-    print(update_ticket_status_by_ticket_id(ticket))
+    mensagens = atualizar_status_em_lote(tickets_list, sink=sink)
+    for mensagem in mensagens:
+        print(mensagem)
+    etapa.linhas_saida = sum(1 for m in mensagens if not m.startswith("Erro"))
+
+print(obter_cache().resumo())
+print(obter_cliente().limitador.resumo())
+print(f"Relatório da execução: {metricas.gravar()}")